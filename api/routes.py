@@ -1,5 +1,5 @@
 
-from fastapi import APIRouter, Depends, HTTPException, status, Body
+from fastapi import APIRouter, Depends, HTTPException, status, Body, Query
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.responses import RedirectResponse
 from datetime import timedelta
@@ -307,6 +307,53 @@ class ChatRequest(BaseModel):
 # Bot Logic Integration
 # -----------------------------------------------------------------------------
 from modules import sop_chatbot, insw_chatbot, others_chatbot
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Dedicated bounded pool for chatbot generation, so a burst of chat requests
+# cannot starve the shared threadpool used by every other endpoint
+GEN_WORKERS = int(os.getenv("GEN_WORKERS", "8"))
+GEN_MAX_PENDING = int(os.getenv("GEN_MAX_PENDING", str(GEN_WORKERS * 8)))
+_gen_pool = ThreadPoolExecutor(max_workers=GEN_WORKERS, thread_name_prefix="chat-gen")
+_gen_pending = 0
+
+def _check_gen_capacity():
+    """Reject new chat requests when the generation queue is full"""
+    if _gen_pending >= GEN_MAX_PENDING:
+        raise HTTPException(status_code=503, detail="Server is busy, please try again shortly")
+
+def _save_user_message_in_background(username, chatbot_type, content, session_id):
+    """
+    Start saving the user's message on a worker thread so the write overlaps the
+    LLM call; await the returned task before saving the reply to keep their order.
+    """
+    return asyncio.ensure_future(
+        run_in_threadpool(database.save_message, username, chatbot_type, "user", content, session_id)
+    )
+
+def _generate_session_title(session_id, user_message, response_text):
+    """Generate and store a session title; runs on the generation pool after the reply is sent"""
+    try:
+        client = chatbot_utils.init_gemini_client()
+        if client:
+            title = chatbot_utils.generate_chat_title(client, user_message, response_text)
+            if title:
+                database.update_session_title(session_id, title)
+    except Exception as e:
+        print(f"Error generating title: {e}")
+
+async def run_in_gen_pool(func, *args):
+    """Run a blocking chatbot call on the generation pool"""
+    global _gen_pending
+    _gen_pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_gen_pool, functools.partial(func, *args))
+    finally:
+        _gen_pending -= 1
 
 @router.post("/chat/sop")
 async def chat_sop(
@@ -321,8 +368,10 @@ async def chat_sop(
     elif session["username"] != current_user["username"]:
          raise HTTPException(status_code=403, detail="Not authorized for this session")
 
+    _check_gen_capacity()
+
     # Save User Message
-    database.save_message(current_user["username"], "SOP", "user", request.message.content, request.session_id)
+    user_saved = _save_user_message_in_background(current_user["username"], "SOP", request.message.content, request.session_id)
     
     # Generate Response with logging
     from fastapi.concurrency import run_in_threadpool
@@ -330,7 +379,7 @@ async def chat_sop(
     
     start_time = time.time()
     try:
-        response_text = await run_in_threadpool(sop_chatbot.search_sop_exim, request.message.content, request.session_id)
+        response_text = await run_in_gen_pool(sop_chatbot.search_sop_exim, request.message.content, request.session_id)
         latency_ms = int((time.time() - start_time) * 1000)
         
         # Log successful response to developer dashboard
@@ -360,20 +409,13 @@ async def chat_sop(
             query=request.message.content[:200]
         )
 
-    # Save Assistant Message
+    # Save Assistant Message (after the user's message has landed)
+    await user_saved
     database.save_message(current_user["username"], "SOP", "assistant", response_text, request.session_id)
     
-    # Auto-generate title if this is the first message (session has title "New Chat")
+    # Auto-generate title in the background so the reply is not held up by a second LLM call
     if session and session.get("title") == "New Chat":
-        try:
-            from modules.chatbot_utils import generate_chat_title, init_gemini_client
-            client = init_gemini_client()
-            if client:
-                title = await run_in_threadpool(generate_chat_title, client, request.message.content, response_text)
-                if title:
-                    database.update_session_title(request.session_id, title)
-        except Exception as e:
-            print(f"Error generating title: {e}")
+        _gen_pool.submit(_generate_session_title, request.session_id, request.message.content, response_text)
     
     return {"role": "assistant", "content": response_text}
 
@@ -389,15 +431,17 @@ async def chat_insw(
     elif session["username"] != current_user["username"]:
          raise HTTPException(status_code=403, detail="Not authorized for this session")
 
+    _check_gen_capacity()
+
     # Save User Message
-    database.save_message(current_user["username"], "INSW", "user", request.message.content, request.session_id)
+    user_saved = _save_user_message_in_background(current_user["username"], "INSW", request.message.content, request.session_id)
     
     # Generate Response with logging
     import time
     start_time = time.time()
     
     try:
-        response_text = await run_in_threadpool(insw_chatbot.search_insw_regulation, request.message.content)
+        response_text = await run_in_gen_pool(insw_chatbot.search_insw_regulation, request.message.content)
         latency_ms = int((time.time() - start_time) * 1000)
         
         # Log successful response
@@ -424,23 +468,87 @@ async def chat_insw(
             query=request.message.content[:200]
         )
         
-    # Save Assistant Message
+    # Save Assistant Message (after the user's message has landed)
+    await user_saved
     database.save_message(current_user["username"], "INSW", "assistant", response_text, request.session_id)
     
-    # Auto-generate title if this is the first message (session has title "New Chat")
+    # Auto-generate title in the background so the reply is not held up by a second LLM call
     if session and session.get("title") == "New Chat":
-        try:
-            from modules.chatbot_utils import generate_chat_title, init_gemini_client
-            client = init_gemini_client()
-            if client:
-                title = await run_in_threadpool(generate_chat_title, client, request.message.content, response_text)
-                if title:
-                    database.update_session_title(request.session_id, title)
-        except Exception as e:
-            print(f"Error generating title: {e}")
+        _gen_pool.submit(_generate_session_title, request.session_id, request.message.content, response_text)
     
     return {"role": "assistant", "content": response_text}
 
+@router.post("/chat/insw/stream")
+async def chat_insw_stream(
+    request: ChatRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """Same as /chat/insw, but the answer is streamed as plain text while it is generated"""
+    session = database.get_session_by_id(request.session_id)
+    if not session:
+        request.session_id = database.create_session(current_user["username"], "INSW", request.session_id)
+    elif session["username"] != current_user["username"]:
+         raise HTTPException(status_code=403, detail="Not authorized for this session")
+
+    _check_gen_capacity()
+
+    user_saved = _save_user_message_in_background(current_user["username"], "INSW", request.message.content, request.session_id)
+    
+    import time
+    start_time = time.time()
+    chunks = insw_chatbot.stream_insw_regulation(request.message.content)
+    # Serializes next() and close(): a disconnect can land while a chunk is being pulled
+    chunks_lock = threading.Lock()
+
+    def next_chunk():
+        with chunks_lock:
+            return next(chunks, None)
+
+    def finish(response_text, status):
+        """Close the generator, then log and save whatever was produced; runs on the generation pool"""
+        with chunks_lock:
+            chunks.close()
+        llm_logger.log_call(
+            session_id=request.session_id,
+            username=current_user["username"],
+            chatbot_type="INSW",
+            status=status,
+            input_tokens=len(request.message.content.split()) * 2,
+            output_tokens=len(response_text.split()) * 2,
+            latency_ms=int((time.time() - start_time) * 1000),
+            error_message=response_text if status == "error" else None,
+            query=request.message.content[:200]
+        )
+        database.save_message(current_user["username"], "INSW", "assistant", response_text, request.session_id)
+        
+        if session and session.get("title") == "New Chat":
+            _generate_session_title(request.session_id, request.message.content, response_text)
+
+    async def body():
+        # Pull each chunk on the generation pool so the event loop never blocks on Gemini
+        parts = []
+        errored = False
+        try:
+            while True:
+                chunk = await run_in_gen_pool(next_chunk)
+                if chunk is None:
+                    break
+                if chunk.startswith("❌ Error:"):
+                    errored = True
+                parts.append(chunk)
+                yield chunk
+        finally:
+            # Also reached on client disconnect, where awaiting is no longer possible:
+            # the reply is saved once the user's message has landed, off the event loop
+            response_text = "".join(parts)
+            status = "error" if errored else ("answered" if response_text else "unanswered")
+            user_saved.add_done_callback(
+                lambda _: _gen_pool.submit(finish, response_text, status)
+            )
+
+    from fastapi.responses import StreamingResponse
+    return StreamingResponse(body(), media_type="text/plain; charset=utf-8")
+
 @router.post("/chat/others")
 async def chat_others(
     request: ChatRequest,
@@ -453,15 +561,17 @@ async def chat_others(
     elif session["username"] != current_user["username"]:
          raise HTTPException(status_code=403, detail="Not authorized for this session")
 
+    _check_gen_capacity()
+
     # Save User Message
-    database.save_message(current_user["username"], "OTHERS", "user", request.message.content, request.session_id)
+    user_saved = _save_user_message_in_background(current_user["username"], "OTHERS", request.message.content, request.session_id)
     
     from fastapi.concurrency import run_in_threadpool
     import time
     start_time = time.time()
     
     try:
-        response_text = await run_in_threadpool(others_chatbot.search_others, request.message.content, request.session_id)
+        response_text = await run_in_gen_pool(others_chatbot.search_others, request.message.content, request.session_id)
         latency_ms = int((time.time() - start_time) * 1000)
         
         # Log successful response
@@ -488,20 +598,13 @@ async def chat_others(
             query=request.message.content[:200]
         )
         
-    # Save Assistant Message
+    # Save Assistant Message (after the user's message has landed)
+    await user_saved
     database.save_message(current_user["username"], "OTHERS", "assistant", response_text, request.session_id)
     
-    # Auto-generate title
+    # Auto-generate title in the background so the reply is not held up by a second LLM call
     if session and session.get("title") == "New Chat":
-        try:
-            from modules.chatbot_utils import generate_chat_title, init_gemini_client
-            client = init_gemini_client()
-            if client:
-                title = await run_in_threadpool(generate_chat_title, client, request.message.content, response_text)
-                if title:
-                    database.update_session_title(request.session_id, title)
-        except Exception as e:
-            print(f"Error generating title: {e}")
+        _gen_pool.submit(_generate_session_title, request.session_id, request.message.content, response_text)
     
     return {"role": "assistant", "content": response_text}
 
@@ -524,7 +627,7 @@ async def get_download_link(
         raise HTTPException(status_code=400, detail="Filename is required")
     
     # Get OneDrive download URL (this is a temporary pre-authenticated URL)
-    download_url = chatbot_utils.get_onedrive_download_link(filename, chatbot_type)
+    download_url = await run_in_threadpool(chatbot_utils.get_onedrive_download_link, filename, chatbot_type)
     if not download_url:
         raise HTTPException(status_code=404, detail=f"File not found: {filename}")
     
@@ -557,20 +660,23 @@ from modules.llm_logger import llm_logger
 
 @router.get("/dev/logs")
 async def get_llm_logs(
-    limit: int = 50,
-    offset: int = 0,
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
     status: Optional[str] = None,
     chatbot_type: Optional[str] = None,
+    before_id: Optional[int] = None,
     current_user: dict = Depends(get_current_admin_user)
 ):
-    """Get paginated LLM logs for developer dashboard"""
+    """Get paginated LLM logs for developer dashboard (before_id = keyset cursor)"""
     logs = llm_logger.get_logs(
         limit=limit,
         offset=offset,
         status_filter=status,
-        chatbot_type_filter=chatbot_type
+        chatbot_type_filter=chatbot_type,
+        before_id=before_id
     )
-    return {"logs": logs, "limit": limit, "offset": offset}
+    next_before_id = logs[-1]["id"] if logs and len(logs) == limit else None
+    return {"logs": logs, "limit": limit, "offset": offset, "next_before_id": next_before_id}
 
 @router.get("/dev/stats")
 async def get_llm_stats(current_user: dict = Depends(get_current_admin_user)):
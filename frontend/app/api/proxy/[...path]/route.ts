@@ -67,6 +67,15 @@ async function proxyRequest(request: NextRequest, method: string) {
             responseHeaders.set(key, value);
         });
 
+        // Streaming endpoints: pass the body through chunk by chunk instead of buffering it
+        if (path.endsWith('/stream') && response.body) {
+            return new NextResponse(response.body, {
+                status: response.status,
+                statusText: response.statusText,
+                headers: responseHeaders,
+            });
+        }
+
         const responseBody = await response.text();
 
         return new NextResponse(responseBody, {
@@ -16,6 +16,48 @@ interface Message {
     timestamp?: string;
 }
 
+const CASE_DATA_TAG = '<CASE_DATA>';
+
+// Split a message into its markdown text and the optional case-data JSON.
+// Most messages carry no case data, so a single indexOf scan decides the branch.
+function splitCaseData(content: string): { textPart: string; caseDataStr: string } {
+    const idx = content.indexOf(CASE_DATA_TAG);
+    if (idx === -1) {
+        return { textPart: content, caseDataStr: '' };
+    }
+    return {
+        textPart: content.slice(0, idx),
+        caseDataStr: content.slice(idx + CASE_DATA_TAG.length),
+    };
+}
+
+// Parsed case data keyed by its raw JSON, so re-renders of the same message
+// (every keystroke and every new message) do not parse it again.
+const CASE_DATA_CACHE_LIMIT = 200;
+// eslint-disable-next-line @typescript-eslint/no-explicit-any
+const caseDataCache = new Map<string, any>();
+
+function parseCaseData(caseDataStr: string) {
+    if (!caseDataStr) return null;
+    if (caseDataCache.has(caseDataStr)) {
+        return caseDataCache.get(caseDataStr);
+    }
+
+    let caseData = null;
+    try {
+        caseData = JSON.parse(caseDataStr);
+    } catch (e) {
+        console.error("Failed to parse case data", e);
+    }
+
+    if (caseDataCache.size >= CASE_DATA_CACHE_LIMIT) {
+        const oldestKey = caseDataCache.keys().next().value;
+        if (oldestKey !== undefined) caseDataCache.delete(oldestKey);
+    }
+    caseDataCache.set(caseDataStr, caseData);
+    return caseData;
+}
+
 interface ChatInterfaceProps {
     chatbotType: 'SOP' | 'INSW' | 'OTHERS';
     sessionId: string;
@@ -53,6 +95,39 @@ export function ChatInterface({ chatbotType, sessionId, initialMessages, onMessa
         adjustTextareaHeight();
     }, [input, adjustTextareaHeight]);
 
+    // Read a plain-text streamed answer and grow the assistant bubble as chunks arrive
+    const streamReply = async (endpoint: string, userMsg: string) => {
+        const res = await fetchAPI(endpoint, {
+            method: 'POST',
+            body: JSON.stringify({
+                message: { role: 'user', content: userMsg },
+                session_id: sessionId
+            })
+        });
+
+        if (!res.ok || !res.body) throw new Error('Failed to send message');
+
+        const reader = res.body.getReader();
+        const decoder = new TextDecoder();
+        let content = '';
+        let started = false;
+
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            content += decoder.decode(value, { stream: true });
+            const snapshot = content;
+
+            if (!started) {
+                started = true;
+                setLoading(false);
+                setMessages(prev => [...prev, { role: 'assistant', content: snapshot }]);
+            } else {
+                setMessages(prev => [...prev.slice(0, -1), { role: 'assistant', content: snapshot }]);
+            }
+        }
+    };
+
     const handleSend = async (e?: React.FormEvent) => {
         e?.preventDefault();
         if (!input.trim() || loading || !sessionId) return;
@@ -64,8 +139,13 @@ export function ChatInterface({ chatbotType, sessionId, initialMessages, onMessa
         setMessages(prev => [...prev, { role: 'user', content: userMsg }]);
 
         try {
+            if (chatbotType === 'INSW') {
+                await streamReply('/chat/insw/stream', userMsg);
+                if (onMessageSent) onMessageSent();
+                return;
+            }
+
             let endpoint = '/chat/sop';
-            if (chatbotType === 'INSW') endpoint = '/chat/insw';
             if (chatbotType === 'OTHERS') endpoint = '/chat/others';
 
             const res = await fetchAPI(endpoint, {
@@ -99,18 +179,9 @@ export function ChatInterface({ chatbotType, sessionId, initialMessages, onMessa
 
     // Render markdown content with special handling for links
     const renderContent = (content: string) => {
-        const parts = content.split('<CASE_DATA>');
-        const textPart = parts[0];
-        const caseDataStr = parts[1];
-
-        let caseData = null;
-        if (caseDataStr) {
-            try {
-                caseData = JSON.parse(caseDataStr);
-            } catch (e) {
-                console.error("Failed to parse case data", e);
-            }
-        }
+        const { textPart, caseDataStr } = splitCaseData(content);
+
+        const caseData = parseCaseData(caseDataStr);
 
         return (
             <div className="prose prose-neutral dark:prose-invert prose-sm max-w-none">
@@ -6,17 +6,41 @@ from qdrant_client.models import (
     Distance, VectorParams, PointStruct, 
     SparseVectorParams, SparseIndexParams,
     NamedVector, NamedSparseVector,
-    Prefetch, FusionQuery, SparseVector
+    Prefetch, FusionQuery, SparseVector, QueryRequest,
+    BinaryQuantization, BinaryQuantizationConfig,
+    SearchParams, QuantizationSearchParams
 )
 from typing import List, Dict, Any, Optional
+import os
 import json
 import hashlib
+import zlib
+import numpy as np
+
+# gRPC is noticeably faster than REST for single small queries
+INSW_QDRANT_PREFER_GRPC = os.getenv("INSW_QDRANT_PREFER_GRPC", "true").lower() == "true"
+INSW_QDRANT_GRPC_PORT = int(os.getenv("INSW_QDRANT_GRPC_PORT", "6334"))
+
+# Dense search runs on 1-bit quantized vectors, then rescores an oversampled
+# candidate set with the full float vectors (ignored on unquantized collections)
+_DENSE_SEARCH_PARAMS = SearchParams(
+    quantization=QuantizationSearchParams(rescore=True, oversampling=2.0)
+)
+
+# 3072-dim float vectors are 12KB each; binary codes are 384 bytes
+_BINARY_QUANTIZATION = BinaryQuantization(
+    binary=BinaryQuantizationConfig(always_ram=True)
+)
+
+# Sparse (bm25) vector dimension: token hashes are folded into this index range
+SPARSE_INDEX_SPACE = 10**6
 
 
 class INSWQdrantStore:
     """Qdrant vector store for INSW documents with hybrid search"""
     
-    def __init__(self, url: str, api_key: str, collection_name: str = "insw_documents"):
+    def __init__(self, url: str, api_key: str, collection_name: str = "insw_documents",
+                 prefer_grpc: bool = INSW_QDRANT_PREFER_GRPC, grpc_port: int = INSW_QDRANT_GRPC_PORT):
         """
         Initialize Qdrant store for INSW documents
         
@@ -24,9 +48,37 @@ class INSWQdrantStore:
             url: Qdrant server URL
             api_key: Qdrant API key
             collection_name: Collection name
+            prefer_grpc: Use the gRPC interface where the client supports it
+            grpc_port: Qdrant gRPC port
         """
-        self.client = QdrantClient(url=url, api_key=api_key)
+        self.client = QdrantClient(url=url, api_key=api_key, prefer_grpc=prefer_grpc, grpc_port=grpc_port)
         self.collection_name = collection_name
+        # Vector layout of the existing collection, read on the first search
+        self._inspected = False
+        self._dense_using: Optional[str] = None
+        self._hybrid = True
+    
+    def _inspect_collection(self):
+        """
+        Read the collection's vector layout once (read-only). Collections built by
+        the generic QdrantStore have one unnamed vector and no bm25 sparse vector,
+        so they are searched dense-only on that unnamed vector.
+        """
+        if self._inspected:
+            return
+        # Inspected even if the read fails: a broken collection is not probed on every query
+        self._inspected = True
+        try:
+            info = self.client.get_collection(self.collection_name)
+            vectors = info.config.params.vectors
+            if isinstance(vectors, dict):
+                self._dense_using = "dense" if "dense" in vectors else next(iter(vectors), None)
+            else:
+                self._dense_using = None
+            sparse = info.config.params.sparse_vectors or {}
+            self._hybrid = self._dense_using == "dense" and "bm25" in sparse
+        except Exception as e:
+            print(f"Could not inspect collection '{self.collection_name}': {e}")
     
     def create_collection(self, vector_size: int = 3072):
         """
@@ -42,6 +94,13 @@ class INSWQdrantStore:
         if exists:
             info = self.client.get_collection(self.collection_name)
             print(f"Collection '{self.collection_name}' already exists with {info.points_count} points")
+            # Collections created before quantization was added get it switched on once
+            if info.config.quantization_config is None:
+                self.client.update_collection(
+                    collection_name=self.collection_name,
+                    quantization_config=_BINARY_QUANTIZATION
+                )
+                print(f"Enabled binary quantization on {self.collection_name}")
             return
         
         # Create collection with named vectors
@@ -57,7 +116,8 @@ class INSWQdrantStore:
                 "bm25": SparseVectorParams(
                     index=SparseIndexParams()
                 )
-            }
+            },
+            quantization_config=_BINARY_QUANTIZATION
         )
         print(f"Created collection '{self.collection_name}' with hybrid vectors")
     
@@ -72,24 +132,20 @@ class INSWQdrantStore:
         Returns:
             Sparse vector dict with indices and values
         """
-        # Tokenize and count words
-        words = text.lower().split()
-        word_freq = {}
-        for word in words:
-            if len(word) > 2:  # Skip short words
-                word_freq[word] = word_freq.get(word, 0) + 1
+        # Tokenize, skipping short words
+        words = [w for w in text.lower().split() if len(w) > 2]
+        if not words:
+            return {"indices": [], "values": []}
         
-        # Convert to sparse format (use hash of word as index)
-        indices = []
-        values = []
-        for word, freq in word_freq.items():
-            idx = abs(hash(word)) % (10**6)  # Use hash as index
-            indices.append(idx)
-            values.append(freq)
+        # crc32 is stable across processes (built-in hash() is salted per run),
+        # so query and ingestion agree on indices; unique() also merges collisions
+        hashes = np.fromiter((zlib.crc32(w.encode("utf-8")) for w in words),
+                             dtype=np.uint32, count=len(words)) % SPARSE_INDEX_SPACE
+        indices, counts = np.unique(hashes, return_counts=True)
         
         return {
-            "indices": indices,
-            "values": values
+            "indices": indices.tolist(),
+            "values": counts.tolist()
         }
     
     def upsert_document(self, doc_id: int, text: str, dense_vector: List[float], metadata: Dict[str, Any]):
@@ -151,6 +207,59 @@ class INSWQdrantStore:
             ]
         )
     
+    def _hybrid_prefetch(self, query_text: str, dense_vector: List[float], limit: int) -> List[Prefetch]:
+        """Dense + sparse candidate queries that RRF fusion combines"""
+        sparse_data = self._create_sparse_vector(query_text)
+        sparse_vector = SparseVector(
+            indices=sparse_data["indices"],
+            values=sparse_data["values"]
+        )
+        return [
+            Prefetch(query=dense_vector, using="dense", limit=limit * 2, params=_DENSE_SEARCH_PARAMS),
+            Prefetch(query=sparse_vector, using="bm25", limit=limit * 2)
+        ]
+    
+    @staticmethod
+    def _format_points(points) -> List[Dict[str, Any]]:
+        return [{"id": p.id, "payload": p.payload, "score": p.score} for p in points]
+    
+    def search_hybrid_batch(self, query_texts: List[str], dense_vectors: List[List[float]],
+                            limit: int = 5) -> List[List[Dict[str, Any]]]:
+        """
+        Run several hybrid searches in one round-trip with query_batch_points
+        
+        Args:
+            query_texts: Query texts (one per search)
+            dense_vectors: Dense query embeddings, aligned with query_texts
+            limit: Number of results per search
+            
+        Returns:
+            One result list per query, in input order
+        """
+        self._inspect_collection()
+        if not self._hybrid:
+            return [self._search_dense(vector, limit) for vector in dense_vectors]
+        requests = [
+            QueryRequest(
+                prefetch=self._hybrid_prefetch(text, vector, limit),
+                query=FusionQuery(fusion="rrf"),
+                limit=limit,
+                with_payload=True
+            )
+            for text, vector in zip(query_texts, dense_vectors)
+        ]
+        try:
+            responses = self.client.query_batch_points(
+                collection_name=self.collection_name,
+                requests=requests
+            )
+            return [self._format_points(r.points) for r in responses]
+        except Exception as e:
+            print(f"Batched hybrid search failed: {e}")
+            # Fall back to one search per query (each with its own dense-only fallback)
+            return [self.search_hybrid(text, vector, limit=limit)
+                    for text, vector in zip(query_texts, dense_vectors)]
+    
     def search_hybrid(self, query_text: str, dense_vector: List[float], limit: int = 5) -> List[Dict[str, Any]]:
         """
         Hybrid search using both dense and sparse vectors with RRF fusion
@@ -163,13 +272,9 @@ class INSWQdrantStore:
         Returns:
             List of search results with scores and full payload
         """
-        # Create sparse query vector
-        sparse_data = self._create_sparse_vector(query_text)
-        sparse_vector = SparseVector(
-            indices=sparse_data["indices"],
-            values=sparse_data["values"]
-        )
-        
+        self._inspect_collection()
+        if not self._hybrid:
+            return self._search_dense(dense_vector, limit)
         try:
             # Perform hybrid search with RRF fusion
             results = self.client.query_points(
@@ -177,51 +282,29 @@ class INSWQdrantStore:
                 query=FusionQuery(
                     fusion="rrf"
                 ),
-                prefetch=[
-                    Prefetch(
-                        query=dense_vector,
-                        using="dense",
-                        limit=limit * 2
-                    ),
-                    Prefetch(
-                        query=sparse_vector,
-                        using="bm25",
-                        limit=limit * 2
-                    )
-                ],
+                prefetch=self._hybrid_prefetch(query_text, dense_vector, limit),
                 limit=limit
             )
             
             # Format results - return full payload for INSW data
-            search_results = []
-            for point in results.points:
-                search_results.append({
-                    "id": point.id,
-                    "payload": point.payload,  # Return full payload
-                    "score": point.score
-                })
-            
-            return search_results
+            return self._format_points(results.points)
             
         except Exception as e:
             print(f"Hybrid search failed: {e}")
             # Fallback to dense-only search
-            try:
-                results = self.client.search(
-                    collection_name=self.collection_name,
-                    query_vector=dense_vector,
-                    limit=limit
-                )
-                
-                search_results = []
-                for point in results:
-                    search_results.append({
-                        "id": point.id,
-                        "payload": point.payload,
-                        "score": point.score
-                    })
-                
-                return search_results
-            except Exception as e2:
-                print(f"Dense search also failed: {e2}")
-                return []
+            return self._search_dense(dense_vector, limit)
+    
+    def _search_dense(self, dense_vector: List[float], limit: int) -> List[Dict[str, Any]]:
+        """Dense-only search on the collection's dense vector (named or unnamed)"""
+        query_vector = (self._dense_using, dense_vector) if self._dense_using else dense_vector
+        try:
+            results = self.client.search(
+                collection_name=self.collection_name,
+                query_vector=query_vector,
+                search_params=_DENSE_SEARCH_PARAMS,
+                limit=limit
+            )
+            return self._format_points(results)
+        except Exception as e:
+            print(f"Dense search failed: {e}")
+            return []
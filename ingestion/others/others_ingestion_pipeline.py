@@ -14,10 +14,12 @@ from typing import Dict, Any, Optional, List
 from datetime import datetime
 from zoneinfo import ZoneInfo
 import os
+import asyncio
 import shutil
 import tempfile
 import time
 import uuid
+import httpx
 # from langchain.text_splitter import RecursiveCharacterTextSplitter
 import pypdf
 
@@ -26,12 +28,21 @@ from ingestion.sop.sop_onedrive_sync import SOPOneDriveSync
 from ingestion.vectorizer import Vectorizer
 
 # Custom Qdrant store for Others (simple schema)
-from qdrant_client import QdrantClient
+from qdrant_client import QdrantClient, AsyncQdrantClient
 from qdrant_client.http import models
 
 # New modules
 from modules.ppt_converter import convert_ppt_to_pdf
-from modules.ocr_service import OCRService
+from modules.ocr_service import OCRService, OCR_MAX_CONCURRENCY
+
+# int8 copies of the vectors (kept in RAM) serve the first ANN pass; searches
+# rescore the candidates against the original float32 vectors
+_INT8_QUANTIZATION = models.ScalarQuantization(
+    scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, always_ram=True)
+)
+
+# Files downloaded / OCR'd / upserted at the same time by sync_and_upsert_async
+INGEST_MAX_CONCURRENCY = int(os.getenv("INGEST_MAX_CONCURRENCY", "16"))
 
 class OthersIngestionPipeline:
     """Pipeline for AI/Others unstructured document ingestion"""
@@ -56,6 +67,8 @@ class OthersIngestionPipeline:
         )
         
         self.collection_name = qdrant_collection_name
+        self.qdrant_url = qdrant_url
+        self.qdrant_api_key = qdrant_api_key
         
         # Initialize Qdrant
         if not skip_qdrant_init:
@@ -66,7 +79,14 @@ class OthersIngestionPipeline:
             
     def _init_collection(self, vector_size: int):
         try:
-            self.qdrant_client.get_collection(self.collection_name)
+            info = self.qdrant_client.get_collection(self.collection_name)
+            # Collections created before quantization was added get it switched on once
+            if info.config.quantization_config is None:
+                self.qdrant_client.update_collection(
+                    collection_name=self.collection_name,
+                    quantization_config=_INT8_QUANTIZATION
+                )
+                print(f"Enabled int8 quantization on {self.collection_name}")
         except Exception:
             print(f"Creating collection {self.collection_name}...")
             self.qdrant_client.create_collection(
@@ -74,7 +94,8 @@ class OthersIngestionPipeline:
                 vectors_config=models.VectorParams(
                     size=vector_size,
                     distance=models.Distance.COSINE
-                )
+                ),
+                quantization_config=_INT8_QUANTIZATION
             )
             
         # Ensure index exists (safe to call repeatedly usually, or wrap in try)
@@ -89,6 +110,18 @@ class OthersIngestionPipeline:
             # might already exist
             print(f"Index creation note: {e}")
             
+    @staticmethod
+    def _filename_filter(filename: str) -> models.Filter:
+        """Filter matching every chunk of one source file"""
+        return models.Filter(
+            must=[
+                models.FieldCondition(
+                    key="filename",
+                    match=models.MatchValue(value=filename)
+                )
+            ]
+        )
+    
     def get_last_modified(self, filename: str) -> Optional[str]:
         """Check if file exists in Qdrant and get its last modified date"""
         if not self.qdrant_client:
@@ -99,14 +132,7 @@ class OthersIngestionPipeline:
             # Search by filename filter
             results = self.qdrant_client.scroll(
                 collection_name=self.collection_name,
-                scroll_filter=models.Filter(
-                    must=[
-                        models.FieldCondition(
-                            key="filename",
-                            match=models.MatchValue(value=filename)
-                        )
-                    ]
-                ),
+                scroll_filter=self._filename_filter(filename),
                 limit=1,
                 with_payload=True
             )
@@ -133,14 +159,7 @@ class OthersIngestionPipeline:
             result = self.qdrant_client.delete(
                 collection_name=self.collection_name,
                 points_selector=models.FilterSelector(
-                    filter=models.Filter(
-                        must=[
-                            models.FieldCondition(
-                                key="filename",
-                                match=models.MatchValue(value=filename)
-                            )
-                        ]
-                    )
+                    filter=self._filename_filter(filename)
                 )
             )
             print(f"  Deleted old chunks for {filename}")
@@ -159,9 +178,56 @@ class OthersIngestionPipeline:
             start += (chunk_size - overlap)
         return chunks
 
+    def _split_pages(self, pdf_path: str, filename: str, file_id: str):
+        """
+        Write every page of the PDF to its own file for per-page OCR.
+        Page files are prefixed with file_id, so files processed concurrently never share a path.
+        Returns (num_pages, {page_num: page_path}); num_pages is 0 if pypdf can't read it.
+        """
+        print(f"  Processing pages for {filename}...")
+        try:
+            reader = pypdf.PdfReader(pdf_path)
+            num_pages = len(reader.pages)
+            print(f"  Found {num_pages} pages.")
+        except Exception as e:
+            print(f"Error reading PDF {filename}: {e}")
+            return 0, {}
+        
+        page_paths = {}
+        for page_idx, page in enumerate(reader.pages):
+            page_num = page_idx + 1
+            
+            # Save single page to debug folder for inspection
+            debug_filename = f"{file_id}_{os.path.splitext(filename)[0]}_page_{page_num}.pdf"
+            debug_path = os.path.join(os.getenv("DEBUG_PAGES_DIR", "debug_pages"), debug_filename)
+            
+            # Ensure directory exists (redundant if mkdir run, but safe)
+            os.makedirs(os.path.dirname(debug_path), exist_ok=True)
+            
+            try:
+                writer = pypdf.PdfWriter()
+                writer.add_page(page)
+                with open(debug_path, "wb") as f_out:
+                    writer.write(f_out)
+                page_paths[page_num] = debug_path
+            except Exception as pe:
+                print(f"    Error splitting page {page_num}: {pe}")
+            # Do NOT delete debug file
+        return num_pages, page_paths
+
     def sync_and_upsert(self, last_sync_date: Optional[datetime] = None,
                        dry_run: bool = False, batch_size: int = None) -> Dict[str, Any]:
-        
+        """Blocking entry point for scripts; runs sync_and_upsert_async on its own event loop"""
+        return asyncio.run(self.sync_and_upsert_async(last_sync_date, dry_run, batch_size))
+
+    async def sync_and_upsert_async(self, last_sync_date: Optional[datetime] = None,
+                                    dry_run: bool = False, batch_size: int = None,
+                                    max_concurrency: int = INGEST_MAX_CONCURRENCY) -> Dict[str, Any]:
+        """
+        Sync the OneDrive folder into Qdrant, processing up to max_concurrency files at once.
+        Downloads (httpx) and Qdrant calls (AsyncQdrantClient) run on the event loop;
+        Gemini OCR requests share one OCR_MAX_CONCURRENCY bound across all files.
+        """
         if batch_size is None:
             batch_size = int(os.getenv('BATCH_SIZE', '50'))
             
@@ -176,178 +242,161 @@ class OthersIngestionPipeline:
         # Step 1: Get metadata
         print("Fetching file list from OneDrive (AI/Others)...")
         try:
-            all_files_metadata = self.onedrive.get_files_metadata()
+            all_files_metadata = await asyncio.to_thread(self.onedrive.get_files_metadata)
             print(f"Found {len(all_files_metadata)} files")
             summary['total_files'] = len(all_files_metadata)
         except Exception as e:
             summary['errors'].append({'error': f"Metadata fetch failed: {e}"})
             return summary
+        
+        file_semaphore = asyncio.Semaphore(max_concurrency)
+        ocr_semaphore = asyncio.Semaphore(OCR_MAX_CONCURRENCY)
+        aqdrant = AsyncQdrantClient(url=self.qdrant_url, api_key=self.qdrant_api_key) if self.qdrant_client else None
             
         # Create temp dir for processing
-        with tempfile.TemporaryDirectory() as temp_dir:
+        try:
+            with tempfile.TemporaryDirectory() as temp_dir:
+                async with httpx.AsyncClient(timeout=120) as http:
+                    
+                    async def _one(file_meta):
+                        async with file_semaphore:
+                            await self._ingest_file_async(file_meta, temp_dir, http, aqdrant,
+                                                          ocr_semaphore, summary, dry_run)
+                    
+                    # Step 2: Process files concurrently
+                    await asyncio.gather(*[_one(m) for m in all_files_metadata])
+        finally:
+            if aqdrant is not None:
+                await aqdrant.close()
+                    
+        return summary
+
+    async def _ingest_file_async(self, file_meta: Dict[str, Any], temp_dir: str,
+                                 http: httpx.AsyncClient, aqdrant: Optional[AsyncQdrantClient],
+                                 ocr_semaphore: asyncio.Semaphore, summary: Dict[str, Any],
+                                 dry_run: bool):
+        """Download, OCR, vectorize and upsert one file; outcome is recorded in summary"""
+        filename = file_meta['name']
+        file_id = file_meta['id']
+        onedrive_last_modified = file_meta['lastModifiedDateTime']
+        
+        # Filter extensions
+        ext = os.path.splitext(filename)[1].lower()
+        if ext not in ['.pdf', '.ppt', '.pptx']:
+            return
             
-            # Step 2: Iterate
-            total_processed = 0
+        try:
+            # Check Qdrant
+            if aqdrant is not None:
+                qdrant_mod = await self._get_last_modified_async(aqdrant, filename)
+                if qdrant_mod and onedrive_last_modified <= qdrant_mod:
+                    summary['skipped'].append(filename)
+                    print(f"Skipping {filename} (up to date)")
+                    return
             
-            for file_meta in all_files_metadata:
-                filename = file_meta['name']
-                file_id = file_meta['id']
-                onedrive_last_modified = file_meta['lastModifiedDateTime']
-                
-                # Filter extensions
-                ext = os.path.splitext(filename)[1].lower()
-                if ext not in ['.pdf', '.ppt', '.pptx']:
-                    continue
-                    
-                # Check Qdrant
-                if self.qdrant_client:
-                    qdrant_mod = self.get_last_modified(filename)
-                    if qdrant_mod and onedrive_last_modified <= qdrant_mod:
-                        summary['skipped'].append(filename)
-                        print(f"Skipping {filename} (up to date)")
-                        continue
+            print(f"Processing {filename}...")
+            
+            # Download
+            content = await self.onedrive.get_file_content_async(file_id, http)
+            # file_id prefix: X.pptx converts to X.pdf, which must not overwrite a downloaded X.pdf
+            local_path = os.path.join(temp_dir, f"{file_id}_{filename}")
+            with open(local_path, 'wb') as f:
+                f.write(content)
                 
-                print(f"Processing {filename}...")
-                total_processed += 1
+            # Conversion for PPT
+            pdf_path = local_path
+            if ext in ['.ppt', '.pptx']:
+                print(f"  Converting {filename} to PDF...")
+                pdf_filename = os.path.splitext(filename)[0] + '.pdf'
+                pdf_path = os.path.join(temp_dir, f"{file_id}_{pdf_filename}")
+                success = await asyncio.to_thread(convert_ppt_to_pdf, local_path, pdf_path)
+                if not success:
+                    raise Exception("PPT conversion failed")
+            
+            # Page-by-Page OCR using pypdf splitting
+            num_pages, page_paths = await asyncio.to_thread(self._split_pages, pdf_path, filename, file_id)
+            
+            # (chunk_id, text, page_number, total_pages); chunking disabled per user request (one chunk per page)
+            chunks = []
+            if num_pages > 0:
+                print(f"    OCR Processing {len(page_paths)}/{num_pages} pages concurrently...")
+                ocr_results = await self.ocr_service.process_many(
+                    list(page_paths.values()), model_name="gemini-2.5-flash", semaphore=ocr_semaphore)
                 
+                for page_num, page_text in zip(page_paths, ocr_results):
+                    if not page_text or not page_text.strip():
+                        print(f"    Warning: No text for page {page_num}")
+                        continue
+                    chunks.append((f"{file_id}_p{page_num}_0", page_text, page_num, num_pages))
+            else:
+                # Fallback for failed PDF splitting - process whole file
+                print(f"  Processing whole file using GenAI OCR...")
+                num_pages = 1
+                async with ocr_semaphore:
+                    ocr_result = await self.ocr_service.process_with_genai_async(pdf_path, model_name="gemini-2.5-flash")
+                if ocr_result:
+                    chunks.append((f"{file_id}_full_0", ocr_result, 1, 1))
+            
+            # Vectorize every page of the file in one batched call
+            vectors = await asyncio.to_thread(self.vectorizer.vectorize_texts, [c[1] for c in chunks]) if chunks else []
+            points_to_upsert = [
+                models.PointStruct(
+                    id=str(uuid.uuid5(uuid.NAMESPACE_DNS, chunk_id)),
+                    vector=vector,
+                    payload={
+                        "filename": filename,
+                        "content": chunk_text,
+                        "onedrive_id": file_meta['id'],
+                        "webUrl": file_meta.get('webUrl', ''),
+                        "last_modified_onedrive": onedrive_last_modified,
+                        "page_number": page_num,
+                        "chunk_index": 0,
+                        "total_pages": total_pages
+                    }
+                )
+                for (chunk_id, chunk_text, page_num, total_pages), vector in zip(chunks, vectors)
+            ]
+            
+            # Upsert all points for the file in one go
+            if not dry_run and aqdrant is not None and points_to_upsert:
+                # Delete old chunks first to prevent duplicates on re-ingestion
                 try:
-                    # Download
-                    content = self.onedrive.get_file_content(file_id)
-                    local_path = os.path.join(temp_dir, filename)
-                    with open(local_path, 'wb') as f:
-                        f.write(content)
-                        
-                    # Conversion for PPT
-                    pdf_path = local_path
-                    if ext in ['.ppt', '.pptx']:
-                        print(f"  Converting {filename} to PDF...")
-                        pdf_filename = os.path.splitext(filename)[0] + '.pdf'
-                        pdf_path = os.path.join(temp_dir, pdf_filename)
-                        success = convert_ppt_to_pdf(local_path, pdf_path)
-                        if not success:
-                            raise Exception("PPT conversion failed")
-                    
-                    # Page-by-Page OCR using pypdf splitting
-                    print(f"  Processing pages for {filename}...")
-                    try:
-                        reader = pypdf.PdfReader(pdf_path)
-                        num_pages = len(reader.pages)
-                        print(f"  Found {num_pages} pages.")
-                    except Exception as e:
-                         print(f"Error reading PDF {filename}: {e}")
-                         # Fallback to full doc processing if pypdf fails
-                         reader = None
-                         num_pages = 1
-                    
-                    points_to_upsert = []
-                    
-                    if reader and num_pages > 0:
-                        # Iterate pages
-                        for page_idx, page in enumerate(reader.pages):
-                            page_num = page_idx + 1
-                            print(f"    OCR Processing Page {page_num}/{num_pages}...")
-                            
-                            # Save single page to debug folder for inspection
-                            debug_filename = f"{os.path.splitext(filename)[0]}_page_{page_num}.pdf"
-                            debug_path = os.path.join(os.getenv("DEBUG_PAGES_DIR", "debug_pages"), debug_filename)
-                            
-                            # Ensure directory exists (redundant if mkdir run, but safe)
-                            os.makedirs(os.path.dirname(debug_path), exist_ok=True)
-                            
-                            try:
-                                writer = pypdf.PdfWriter()
-                                writer.add_page(page)
-                                with open(debug_path, "wb") as f_out:
-                                    writer.write(f_out)
-                                    
-                                # OCR this page using GenAI
-                                ocr_result = self.ocr_service.process_with_genai(debug_path, model_name="gemini-2.5-flash")
-                                
-                                # GenAI returns string directly
-                                page_text = ocr_result if ocr_result else ""
-                                
-                                if not page_text or not page_text.strip():
-                                    print(f"    Warning: No text for page {page_num}")
-                                    continue
-                                    
-                                # Chunking disabled per user request (one chunk per page)
-                                page_chunks = [page_text]
-                                
-                                for i, chunk_text in enumerate(page_chunks):
-                                    chunk_id = f"{file_id}_p{page_num}_{i}"
-                                    
-                                    payload = {
-                                        "filename": filename,
-                                        "content": chunk_text,
-                                        "onedrive_id": file_meta['id'],
-                                        "webUrl": file_meta.get('webUrl', ''),
-                                        "last_modified_onedrive": onedrive_last_modified,
-                                        "page_number": page_num,
-                                        "chunk_index": i,
-                                        "total_pages": num_pages
-                                    }
-                                    
-                                    # Vectorize
-                                    vector = self.vectorizer.vectorize_text(chunk_text)
-                                    
-                                    points_to_upsert.append(models.PointStruct(
-                                        id=str(uuid.uuid5(uuid.NAMESPACE_DNS, chunk_id)),
-                                        vector=vector,
-                                        payload=payload
-                                    ))
-                                
-                            except Exception as pe:
-                                print(f"    Error processing page {page_num}: {pe}")
-                            # Do NOT delete debug file
-                            # finally:
-                            #    if os.path.exists(temp_page_path):
-                            #        os.remove(temp_page_path)
-                                    
-                    else:
-                        # Fallback for failed PDF splitting - process whole file
-                        print(f"  Processing whole file using GenAI OCR...")
-                        ocr_result = self.ocr_service.process_with_genai(pdf_path, model_name="gemini-2.5-flash")
-                        if ocr_result:
-                            chunk_id = f"{file_id}_full_0"
-                            payload = {
-                                "filename": filename,
-                                "content": ocr_result,
-                                "onedrive_id": file_meta['id'],
-                                "webUrl": file_meta.get('webUrl', ''),
-                                "last_modified_onedrive": onedrive_last_modified,
-                                "page_number": 1,
-                                "chunk_index": 0,
-                                "total_pages": 1
-                            }
-                            vector = self.vectorizer.vectorize_text(ocr_result)
-                            points_to_upsert.append(models.PointStruct(
-                                id=str(uuid.uuid5(uuid.NAMESPACE_DNS, chunk_id)),
-                                vector=vector,
-                                payload=payload
-                            ))
-
-                    
-                    # Upsert all points for the file in one go
-                    if not dry_run and self.qdrant_client and points_to_upsert:
-                        # Delete old chunks first to prevent duplicates on re-ingestion
-                        self.delete_by_filename(filename)
-                        
-                        self.qdrant_client.upsert(
-                            collection_name=self.collection_name,
-                            points=points_to_upsert,
-                            wait=True
-                        )
-                        summary['upserted'].append(filename)
-                        print(f"  Upserted {len(points_to_upsert)} chunks for {filename} (across {num_pages} pages)")
-                    elif dry_run:
-                        summary['upserted'].append(filename)
-                        print(f"  Dry run: Would upsert {len(points_to_upsert)} chunks for {filename}")
-                    
+                    await aqdrant.delete(
+                        collection_name=self.collection_name,
+                        points_selector=models.FilterSelector(filter=self._filename_filter(filename))
+                    )
+                    print(f"  Deleted old chunks for {filename}")
                 except Exception as e:
-                    print(f"Error processing {filename}: {e}")
-                    summary['errors'].append({'filename': filename, 'error': str(e)})
-                    
-        return summary
+                    print(f"  Warning: Could not delete old chunks for {filename}: {e}")
+                
+                await aqdrant.upsert(
+                    collection_name=self.collection_name,
+                    points=points_to_upsert,
+                    wait=True
+                )
+                summary['upserted'].append(filename)
+                print(f"  Upserted {len(points_to_upsert)} chunks for {filename} (across {num_pages} pages)")
+            elif dry_run:
+                summary['upserted'].append(filename)
+                print(f"  Dry run: Would upsert {len(points_to_upsert)} chunks for {filename}")
+            
+        except Exception as e:
+            print(f"Error processing {filename}: {e}")
+            summary['errors'].append({'filename': filename, 'error': str(e)})
+
+    async def _get_last_modified_async(self, aqdrant: AsyncQdrantClient, filename: str) -> Optional[str]:
+        """get_last_modified over the async client"""
+        try:
+            points, _ = await aqdrant.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=self._filename_filter(filename),
+                limit=1,
+                with_payload=True
+            )
+            return points[0].payload.get('last_modified_onedrive') if points else None
+        except Exception as e:
+            print(f"  DEBUG: Error checking {filename} in Qdrant: {e}")
+            return None
 
     def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
         """Search the Others collection"""
@@ -5,7 +5,24 @@ Qdrant vector store integration for storing and retrieving INSW documents
 from typing import List, Dict, Any, Optional
 import json
 from qdrant_client import QdrantClient
-from qdrant_client.models import PointStruct, Distance, VectorParams
+from qdrant_client.models import (
+    PointStruct, Distance, VectorParams,
+    BinaryQuantization, BinaryQuantizationConfig
+)
+
+# Document fields stored natively in the payload, so retrieval never has to
+# re-parse a serialized copy of the whole document
+DOCUMENT_PAYLOAD_FIELDS = (
+    'hs_code', 'deskripsi', 'uraian_barang', 'bagian', 'bab',
+    'bagian_penjelasan', 'bab_penjelasan', 'hs_parent_uraian',
+    'regulations', 'bc_documents', 'ref_satuan', 'link',
+)
+
+# 1-bit codes kept in RAM for the first search pass; the chatbot rescores the
+# candidates with the full vectors (INSWQdrantStore search params)
+_BINARY_QUANTIZATION = BinaryQuantization(
+    binary=BinaryQuantizationConfig(always_ram=True)
+)
 
 
 class QdrantStore:
@@ -45,9 +62,19 @@ class QdrantStore:
             
             self.client.create_collection(
                 collection_name=self.collection_name,
-                vectors_config=VectorParams(size=vector_size, distance=distance_enum)
+                vectors_config=VectorParams(size=vector_size, distance=distance_enum),
+                quantization_config=_BINARY_QUANTIZATION
             )
             print(f"Collection '{self.collection_name}' created successfully")
+            return
+        
+        # Collections created before quantization was added get it switched on once
+        if collection.config.quantization_config is None:
+            self.client.update_collection(
+                collection_name=self.collection_name,
+                quantization_config=_BINARY_QUANTIZATION
+            )
+            print(f"Enabled binary quantization on {self.collection_name}")
     
     def upsert_document(self, hs_code: str, embedding: List[float], 
                        document: Dict[str, Any], last_modified: str = None) -> str:
@@ -112,12 +139,14 @@ class QdrantStore:
                 'has_ref_satuan': len(document.get('ref_satuan', [])) > 0,
                 'link': document.get('link', ''),
                 
+                # Structured detail for retrieval (read directly, no JSON round-trip)
+                'regulations': regulations,
+                'bc_documents': bc_documents,
+                'ref_satuan': document.get('ref_satuan', []),
+                
                 # Search and metadata
                 'search_text': self._create_search_text(document),
-                'lastModifiedDateTime': last_modified or document.get('_file_metadata', {}).get('lastModifiedDateTime', ''),
-                
-                # Full document for retrieval
-                'full_document': json.dumps(document, ensure_ascii=False)
+                'lastModifiedDateTime': last_modified or document.get('_file_metadata', {}).get('lastModifiedDateTime', '')
             }
         )
         
@@ -194,8 +223,7 @@ class QdrantStore:
             )
             
             if points:
-                payload = points[0].payload
-                return json.loads(payload['full_document'])
+                return self._document_from_payload(points[0].payload)
             return None
         except:
             return None
@@ -248,7 +276,7 @@ class QdrantStore:
             payload = point.payload
             search_results.append({
                 'hs_code': payload['hs_code'],
-                'document': json.loads(payload['full_document']),
+                'document': self._document_from_payload(payload),
                 'similarity_score': point.score,
                 'search_text': payload['search_text'],
                 'deskripsi': payload.get('deskripsi', ''),
@@ -313,6 +341,18 @@ class QdrantStore:
             'status': collection_info.status
         }
     
+    @staticmethod
+    def _document_from_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Rebuild the source document from a point payload
+        
+        Points written before the structured payload fields existed carry the
+        whole document as a 'full_document' JSON string instead.
+        """
+        if 'full_document' in payload:
+            return json.loads(payload['full_document'])
+        return {k: payload[k] for k in DOCUMENT_PAYLOAD_FIELDS if k in payload}
+    
     @staticmethod
     def _create_search_text(document: Dict[str, Any]) -> str:
         """
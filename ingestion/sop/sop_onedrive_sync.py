@@ -1,7 +1,9 @@
 """
 OneDrive synchronization for SOP PDF documents
 """
+import asyncio
 import requests
+import httpx
 from azure.identity import ClientSecretCredential
 from typing import List, Dict, Any
 from datetime import datetime
@@ -100,3 +102,24 @@ class SOPOneDriveSync:
         response.raise_for_status()
         
         return response.content
+    
+    async def get_file_content_async(self, file_id: str, http: httpx.AsyncClient) -> bytes:
+        """
+        Download file content from OneDrive without blocking the event loop
+        
+        Args:
+            file_id: OneDrive file ID
+            http: Shared async HTTP client (keeps Graph connections alive across files)
+            
+        Returns:
+            File content as bytes
+        """
+        # azure-identity caches the token; only a refresh actually hits the network
+        token = await asyncio.to_thread(self._get_access_token)
+        headers = {"Authorization": f"Bearer {token}"}
+        
+        url = f"{self.graph_base_url}/drives/{self.drive_id}/items/{file_id}/content"
+        response = await http.get(url, headers=headers, follow_redirects=True)
+        response.raise_for_status()
+        
+        return response.content
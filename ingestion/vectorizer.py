@@ -55,6 +55,29 @@ class Vectorizer:
         )
         return result.embeddings[0].values
     
+    def vectorize_texts(self, texts: List[str], batch_size: int = 100) -> List[List[float]]:
+        """
+        Convert many texts to embedding vectors, batch_size texts per API call
+        
+        Args:
+            texts: Texts to vectorize
+            batch_size: Number of texts sent in each embed_content request (max 100)
+            
+        Returns:
+            Embedding vectors in the same order as texts
+        """
+        if self.client is None:
+            raise RuntimeError("Client not loaded. Call _load_model() first.")
+        
+        embeddings = []
+        for start in range(0, len(texts), batch_size):
+            result = self.client.models.embed_content(
+                model=self.model_name,
+                contents=texts[start:start + batch_size]
+            )
+            embeddings.extend(e.values for e in result.embeddings)
+        return embeddings
+    
     def vectorize_document(self, document: Dict[str, Any]) -> Dict[str, Any]:
         """
         Vectorize an INSW document
@@ -94,7 +117,7 @@ class Vectorizer:
         
         Args:
             documents: List of documents
-            batch_size: Batch size for processing (unused with Gemini API)
+            batch_size: Number of texts sent in each embed_content request
             
         Returns:
             List of documents with embeddings
@@ -113,13 +136,7 @@ class Vectorizer:
             search_texts.append(search_text)
         
         # Vectorize with Gemini
-        embeddings = []
-        for text in search_texts:
-            result = self.client.models.embed_content(
-                model=self.model_name,
-                contents=text
-            )
-            embeddings.append(result.embeddings[0].values)
+        embeddings = self.vectorize_texts(search_texts, batch_size=batch_size)
         
         # Add embeddings to documents
         result = []
@@ -1,12 +1,32 @@
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from modules import database, auth_utils
+from modules import database, auth_utils, chatbot_utils
+from modules import sop_chatbot, insw_chatbot, others_chatbot
 from modules.scheduler import start_scheduler, stop_scheduler
+from modules.llm_logger import llm_logger
 from api import routes
 import os
+import asyncio
 from contextlib import asynccontextmanager
 
+def warmup():
+    """Load each chatbot collection's HNSW index so the first user query isn't a cold read"""
+    # Clients are built lazily per target, so one that can't be created only skips its collection
+    targets = [
+        (sop_chatbot.get_qdrant_client, sop_chatbot.SOP_COLLECTION_NAME),
+        (sop_chatbot.get_qdrant_client, sop_chatbot.CASES_COLLECTION_NAME),
+        (others_chatbot.get_qdrant_client, others_chatbot.COLLECTION_NAME),
+        (lambda: insw_chatbot.insw_store.client, insw_chatbot.insw_collection_name),
+    ]
+    warmed = 0
+    for get_client, name in targets:
+        try:
+            warmed += chatbot_utils.warm_qdrant_collection(get_client(), name)
+        except Exception as e:
+            print(f"Qdrant warm-up skipped for '{name}': {e}")
+    print(f"Qdrant warm-up done ({warmed}/{len(targets)} collections)")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
@@ -28,10 +48,15 @@ async def lifespan(app: FastAPI):
     start_scheduler()
     print("Scheduler started - ingestion pipelines will run every 30 minutes")
     
+    # Fire-and-forget: startup doesn't wait for the warm-up searches
+    app.state.warmup_task = asyncio.create_task(asyncio.to_thread(warmup))
+    
     yield
     # Shutdown
     print("Stopping scheduler...")
     stop_scheduler()
+    llm_logger.flush()
+    database.close_pool()
     print("Shutting down...")
 
 app = FastAPI(title="EXIM Chat API", lifespan=lifespan)
@@ -1,4 +1,16 @@
 import os
+import re
+import asyncio
+import logging
+import urllib.parse
+import random
+import hashlib
+import threading
+import time
+from array import array
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 # Robust import for google.genai
 genai = None
 try:
@@ -16,54 +28,197 @@ except ImportError:
             print("CRITICAL: Could not import google.genai or google.generativeai")
             genai = None
 import requests
+from requests.adapters import HTTPAdapter
 try:
     from azure.identity import ClientSecretCredential
 except ImportError:
     ClientSecretCredential = None
     print("WARNING: azure.identity not found. OneDrive features will be disabled.")
 
+logger = logging.getLogger("app_logger")
+
 # Confidence threshold for retrieval results
 # Reads from environment variable, defaults to 0.6
 CONFIDENCE_THRESHOLD = float(os.getenv("CONFIDENCE_THRESHOLD", "0.6"))
 
+# Chat titles only need a few words, so a small model with no thinking budget is enough
+TITLE_MODEL = os.getenv("TITLE_MODEL", "gemini-2.5-flash-lite")
+
+# Sparse vector tokens: whitespace-separated words longer than 2 characters,
+# the same tokens the ingestion stores index with str.split()
+_SPARSE_TOKEN_RE = re.compile(r"\S{3,}")
+
+# Dense embedding cache
+# Embeddings are deterministic per (model, text), so repeated queries skip the API.
+# Vectors are kept as float32 arrays in a bounded LRU to keep memory predictable.
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))
+
+_embedding_cache = OrderedDict()  # sha256(model|text) -> array('f')
+_embedding_cache_lock = threading.Lock()
+_embedding_cache_stats = {"hits": 0, "misses": 0}
+
+# Parallel embed_content calls when a batch spans several API requests
+EMBEDDING_BATCH_WORKERS = 4
+
+# OneDrive download link cache
+# Graph downloadUrls stay valid for about an hour. Links older than MIN_AGE are
+# refreshed by a single caller while the others keep serving the cached link
+# until MAX_AGE, so an expiring link never triggers a burst of Graph lookups.
+LINK_CACHE_MIN_AGE = int(os.getenv("LINK_CACHE_MIN_AGE", "3000"))
+LINK_CACHE_MAX_AGE = int(os.getenv("LINK_CACHE_MAX_AGE", "3500"))
+
+# Files missing from every folder are remembered briefly (with jitter so entries
+# do not expire together) so repeated references do not re-probe Graph.
+LINK_MISS_TTL = int(os.getenv("LINK_MISS_TTL", "120"))
+LINK_MISS_TTL_JITTER = 30
+
+# Entries kept before expired links and misses are pruned
+LINK_CACHE_MAX_ENTRIES = int(os.getenv("LINK_CACHE_MAX_ENTRIES", "2048"))
+
+# Refresh locks are striped by key hash: a fixed pool that never needs pruning
+LINK_REFRESH_LOCK_STRIPES = 64
+
+_link_cache = {}  # (filename, chatbot_type) -> (download_url, fetched_at)
+_link_miss_cache = {}  # (filename, chatbot_type) -> expires_at
+_LINK_NOT_FOUND = object()
+_link_refresh_locks = [threading.Lock() for _ in range(LINK_REFRESH_LOCK_STRIPES)]
+_link_prune_lock = threading.Lock()
+
+# Microsoft Graph JSON batching ($batch accepts at most 20 subrequests)
+GRAPH_BASE_URL = "https://graph.microsoft.com/v1.0"
+GRAPH_BATCH_LIMIT = 20
+GRAPH_BATCH_MAX_RETRIES = 2
+GRAPH_MAX_RETRY_AFTER = 5.0
+
+# Shared Graph session so TCP/TLS connections are reused across lookups and users
+_graph_session = requests.Session()
+_graph_session.mount("https://", HTTPAdapter(pool_connections=20, pool_maxsize=50))
+_graph_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="graph")
+
+_gemini_client = None
+_gemini_client_lock = threading.Lock()
+
 def init_gemini_client():
-    """Initialize and return Gemini client"""
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        print("GEMINI_API_KEY not found in environment variables.")
-        return None
-    return genai.Client(api_key=api_key)
+    """Return the shared Gemini client, creating it on first use.
+    One client keeps its HTTP connections alive across all chatbots and title generation."""
+    global _gemini_client
+    if _gemini_client is None:
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            print("GEMINI_API_KEY not found in environment variables.")
+            return None
+        with _gemini_client_lock:
+            if _gemini_client is None:
+                _gemini_client = genai.Client(api_key=api_key)
+    return _gemini_client
 
-def get_onedrive_token():
-    """Get access token for Microsoft Graph API"""
-    if ClientSecretCredential is None:
-        print("Azure library missing")
-        return None
+_graph_credential = None
 
-    try:
+def _get_graph_credential():
+    """Build the Graph credential once; it keeps its own token cache across calls."""
+    global _graph_credential
+    if _graph_credential is None:
         tenant_id = os.getenv('MS_TENANT_ID')
         client_id = os.getenv('MS_CLIENT_ID')
         client_secret = os.getenv('MS_CLIENT_SECRET')
         
         if not all([tenant_id, client_id, client_secret]):
-            print("Missing OneDrive credentials")
             return None
             
-        credential = ClientSecretCredential(
+        _graph_credential = ClientSecretCredential(
             tenant_id=tenant_id,
             client_id=client_id,
             client_secret=client_secret
         )
+    return _graph_credential
+
+def get_onedrive_token():
+    """Get access token for Microsoft Graph API"""
+    if ClientSecretCredential is None:
+        print("Azure library missing")
+        return None
+
+    try:
+        credential = _get_graph_credential()
+        if credential is None:
+            print("Missing OneDrive credentials")
+            return None
         token = credential.get_token("https://graph.microsoft.com/.default")
         return token.token
     except Exception as e:
         print(f"Error getting OneDrive token: {e}")
         return None
 
+def _get_link_refresh_lock(cache_key):
+    return _link_refresh_locks[hash(cache_key) % LINK_REFRESH_LOCK_STRIPES]
+
+def _prune_link_caches():
+    """Drop expired links and misses; oldest links go if still near the cap"""
+    now = time.monotonic()
+    with _link_prune_lock:
+        for key, (_, fetched_at) in list(_link_cache.items()):
+            if now - fetched_at >= LINK_CACHE_MAX_AGE:
+                _link_cache.pop(key, None)
+        for key, expires_at in list(_link_miss_cache.items()):
+            if expires_at <= now:
+                _link_miss_cache.pop(key, None)
+        # Trim to 3/4 of the cap so pruning does not run again on the next insert
+        overflow = len(_link_cache) - LINK_CACHE_MAX_ENTRIES * 3 // 4
+        if overflow > 0:
+            for key in sorted(_link_cache, key=lambda k: _link_cache[k][1])[:overflow]:
+                _link_cache.pop(key, None)
+
 def get_onedrive_download_link(filename, chatbot_type=None):
     """
     Generate a 1-hour valid download link for a file in OneDrive.
-    Returns a temporary Microsoft Graph downloadUrl.
+    Returns a temporary Microsoft Graph downloadUrl, cached per (filename, chatbot_type).
+    """
+    cache_key = (filename, chatbot_type)
+    cached = _link_cache.get(cache_key)
+    age = time.monotonic() - cached[1] if cached else None
+    if cached and age < LINK_CACHE_MIN_AGE:
+        return cached[0]
+    if not cached and _link_miss_cache.get(cache_key, 0) > time.monotonic():
+        return None
+
+    lock = _get_link_refresh_lock(cache_key)
+    if cached and age < LINK_CACHE_MAX_AGE:
+        # Still usable: only the caller that wins the lock refreshes it
+        if not lock.acquire(blocking=False):
+            return cached[0]
+    else:
+        lock.acquire()
+        # Another caller may have refreshed the link, or recorded a miss, while we were waiting
+        cached = _link_cache.get(cache_key)
+        if cached and time.monotonic() - cached[1] < LINK_CACHE_MIN_AGE:
+            lock.release()
+            return cached[0]
+        if not cached and _link_miss_cache.get(cache_key, 0) > time.monotonic():
+            lock.release()
+            return None
+
+    try:
+        download_url = _lookup_onedrive_download_link(filename, chatbot_type)
+        if download_url is _LINK_NOT_FOUND:
+            _link_miss_cache[cache_key] = (
+                time.monotonic() + LINK_MISS_TTL + random.uniform(0, LINK_MISS_TTL_JITTER)
+            )
+            download_url = None
+        elif download_url:
+            _link_cache[cache_key] = (download_url, time.monotonic())
+            _link_miss_cache.pop(cache_key, None)
+        elif cached and time.monotonic() - cached[1] < LINK_CACHE_MAX_AGE:
+            # Refresh failed (token or Graph error): the old link is still valid
+            return cached[0]
+    finally:
+        lock.release()
+    if len(_link_cache) + len(_link_miss_cache) > LINK_CACHE_MAX_ENTRIES:
+        _prune_link_caches()
+    return download_url
+
+def _lookup_onedrive_download_link(filename, chatbot_type=None):
+    """
+    Look up a fresh download link through the Microsoft Graph API.
     Iterates through known folders to find the file, prioritized by chatbot_type if provided.
     """
 
@@ -93,9 +248,6 @@ def get_onedrive_download_link(filename, chatbot_type=None):
     if insw_folder and insw_folder not in folders_to_check:
         folders_to_check.append(insw_folder)
 
-    import logging
-    logger = logging.getLogger("app_logger")
-
     if not drive_id or not folders_to_check:
         logger.error("Missing OneDrive drive_id or folder paths configuration")
         return None
@@ -106,85 +258,314 @@ def get_onedrive_download_link(filename, chatbot_type=None):
         return None
 
     headers = {"Authorization": f"Bearer {token}"}
-    graph_base_url = "https://graph.microsoft.com/v1.0"
-    
-    import urllib.parse
 
-    # Iterate through folders and return the first valid link found
-    for folder_path in folders_to_check:
+    encoded_filename = urllib.parse.quote(filename)
+    probes = [
+        (
+            str(i),
+            f"/drives/{drive_id}/root:/{urllib.parse.quote(folder_path)}/{encoded_filename}"
+            f"?select=id,name,@microsoft.graph.downloadUrl"
+        )
+        for i, folder_path in enumerate(folders_to_check)
+    ]
+
+    # Probe every folder in one $batch round trip; fall back to parallel GETs
+    results = _graph_batch(probes, headers)
+    if results is None:
+        results = _graph_get_concurrently(probes, headers)
+
+    # Walk folders in priority order until a direct hit; remember the 404s ahead of it
+    direct_hit = None
+    missing_folders = []
+    for (probe_id, probe_url), folder_path in zip(probes, folders_to_check):
         try:
-            encoded_filename = urllib.parse.quote(filename)
-            encoded_folder = urllib.parse.quote(folder_path)
-            
-            # Try direct path first
-            direct_url = (
-                f"{graph_base_url}/drives/{drive_id}/root:/{encoded_folder}/{encoded_filename}"
-                f"?select=id,name,@microsoft.graph.downloadUrl"
-            )
-            
-            response = requests.get(direct_url, headers=headers)
+            result = results.get(probe_id, {})
+            status_code = result.get("status")
+            data = result.get("body") or {}
             
-            if response.status_code == 200:
-                data = response.json()
+            if status_code == 200:
                 download_url = data.get('@microsoft.graph.downloadUrl')
                 
                 if download_url:
-                    logger.info(f"Download URL FOUND for '{filename}' in '{folder_path}'")
-                    return download_url
+                    direct_hit = (folder_path, download_url)
+                    break
             
-            elif response.status_code == 404:
-                # Fallback: List folder contents and do case-insensitive search
-                logger.info(f"Direct lookup failed. Trying folder search for '{filename}'...")
-                try:
-                    list_url = f"{graph_base_url}/drives/{drive_id}/root:/{encoded_folder}:/children?select=name,@microsoft.graph.downloadUrl"
-                    list_res = requests.get(list_url, headers=headers)
-                    
-                    if list_res.status_code == 200:
-                        files = list_res.json().get('value', [])
-                        filename_lower = filename.lower()
-                        
-                        for f in files:
-                            if f.get('name', '').lower() == filename_lower:
-                                download_url = f.get('@microsoft.graph.downloadUrl')
-                                if download_url:
-                                    logger.info(f"Fallback: Found '{f['name']}' via folder listing")
-                                    return download_url
-                        
-                        # Log available files for debugging
-                        file_names = [f['name'] for f in files]
-                        logger.info(f"Files in '{folder_path}': {file_names[:10]}...")
-                except Exception as e:
-                    logger.error(f"Failed to list folder: {e}")
-                continue
+            elif status_code == 404:
+                missing_folders.append(folder_path)
             else:
-                logger.warning(f"OneDrive error for '{filename}' in '{folder_path}': {response.status_code}")
+                logger.warning(f"OneDrive error for '{filename}' in '{folder_path}': {status_code}")
                 
         except Exception as e:
             logger.error(f"Error checking folder '{folder_path}': {e}")
             continue
 
-    logger.error(f"File not found in any configured folders: {filename}")
+    # Higher-priority folders may still hold the file under a different case
+    listing_result = None
+    if missing_folders:
+        logger.info(f"Direct lookup failed. Trying folder search for '{filename}'...")
+        listing_result = _find_in_folder_listings(missing_folders, filename, drive_id, headers)
+        if listing_result and listing_result is not _LINK_NOT_FOUND:
+            return listing_result
+
+    if direct_hit:
+        folder_path, download_url = direct_hit
+        logger.info(f"Download URL FOUND for '{filename}' in '{folder_path}'")
+        return download_url
+
+    # Only a definite miss (every folder 404, every listing read) is cached;
+    # throttling, 5xx or missing sub-responses are retried on the next request
+    if len(missing_folders) == len(folders_to_check) and listing_result is _LINK_NOT_FOUND:
+        logger.error(f"File not found in any configured folders: {filename}")
+        return _LINK_NOT_FOUND
+
+    logger.warning(f"OneDrive lookup for '{filename}' was inconclusive")
     return None
+
+def _find_in_folder_listings(folders, filename, drive_id, headers):
+    """
+    Case-insensitive filename match over the children of each folder, in order.
+    All folder listings are fetched in a single $batch round trip.
+    Returns _LINK_NOT_FOUND only when every listing was read without a match.
+    """
+    listings = [
+        (
+            str(i),
+            f"/drives/{drive_id}/root:/{urllib.parse.quote(folder_path)}:/children"
+            f"?select=name,@microsoft.graph.downloadUrl"
+        )
+        for i, folder_path in enumerate(folders)
+    ]
+    results = _graph_batch(listings, headers) if len(listings) > 1 else None
+    if results is None:
+        results = _graph_get_concurrently(listings, headers)
+    filename_lower = filename.lower()
+    all_listed = True
+
+    for (listing_id, listing_url), folder_path in zip(listings, folders):
+        try:
+            result = results.get(listing_id, {})
+            status_code = result.get("status")
+            files = (result.get("body") or {}).get('value', [])
+
+            if status_code != 200:
+                all_listed = False
+                continue
+
+            for f in files:
+                if f.get('name', '').lower() == filename_lower:
+                    download_url = f.get('@microsoft.graph.downloadUrl')
+                    if download_url:
+                        logger.info(f"Fallback: Found '{f['name']}' via folder listing")
+                        return download_url
+            
+            # Log available files for debugging
+            if logger.isEnabledFor(logging.DEBUG):
+                file_names = [f['name'] for f in files]
+                logger.debug(f"Files in '{folder_path}': {file_names[:10]}...")
+        except Exception as e:
+            all_listed = False
+            logger.error(f"Failed to list folder: {e}")
+
+    return _LINK_NOT_FOUND if all_listed else None
+
+def _graph_get_concurrently(subrequests, headers):
+    """
+    Issue GET subrequests (list of (id, relative_url)) in parallel.
+    Returns {id: {"status": ..., "body": ...}}, the same shape as _graph_batch.
+    """
+    def _get(url):
+        try:
+            response = _graph_session.get(f"{GRAPH_BASE_URL}{url}", headers=headers, timeout=15)
+            body = response.json() if response.status_code == 200 else {}
+            return {"status": response.status_code, "body": body}
+        except Exception as e:
+            logger.error(f"Graph request failed for '{url}': {e}")
+            return {}
+
+    urls = [url for _, url in subrequests]
+    return {
+        rid: result
+        for (rid, _), result in zip(subrequests, _graph_pool.map(_get, urls))
+    }
+
+def _retry_after_seconds(headers):
+    try:
+        return min(float(headers.get("Retry-After", 1)), GRAPH_MAX_RETRY_AFTER)
+    except (TypeError, ValueError):
+        return 1.0
+
+def _graph_batch(subrequests, headers):
+    """
+    Send GET subrequests (list of (id, relative_url)) as one Graph JSON batch.
+    Throttled (429) subrequests are retried after their Retry-After delay.
+    Returns {id: response_dict}, or None if the batch call itself failed.
+    """
+    pending = dict(subrequests[:GRAPH_BATCH_LIMIT])
+    results = {}
+    batch_headers = {**headers, "Content-Type": "application/json"}
+
+    for attempt in range(GRAPH_BATCH_MAX_RETRIES + 1):
+        body = {"requests": [{"id": rid, "method": "GET", "url": url} for rid, url in pending.items()]}
+        try:
+            response = _graph_session.post(f"{GRAPH_BASE_URL}/$batch", headers=batch_headers, json=body, timeout=15)
+        except Exception as e:
+            logger.warning(f"Graph batch request failed: {e}")
+            return results or None
+
+        if response.status_code == 429 and attempt < GRAPH_BATCH_MAX_RETRIES:
+            time.sleep(_retry_after_seconds(response.headers))
+            continue
+        if response.status_code != 200:
+            logger.warning(f"Graph batch request returned {response.status_code}")
+            return results or None
+
+        retry_after = 0
+        last_attempt = attempt == GRAPH_BATCH_MAX_RETRIES
+        for item in response.json().get("responses", []):
+            if item.get("status") == 429 and not last_attempt:
+                retry_after = max(retry_after, _retry_after_seconds(item.get("headers") or {}))
+                continue
+            results[item.get("id")] = item
+            pending.pop(item.get("id"), None)
+
+        if not pending:
+            break
+        time.sleep(retry_after)
+
+    return results
     
+def _embedding_cache_key(text, model):
+    return hashlib.sha256(f"{model}|{text}".encode("utf-8")).digest()
+
+def _embedding_cache_get(key):
+    with _embedding_cache_lock:
+        vec = _embedding_cache.get(key)
+        if vec is None:
+            _embedding_cache_stats["misses"] += 1
+            return None
+        _embedding_cache_stats["hits"] += 1
+        _embedding_cache.move_to_end(key)
+    return vec.tolist()
+
+def _embedding_cache_put(key, values):
+    with _embedding_cache_lock:
+        _embedding_cache[key] = array("f", values)
+        _embedding_cache.move_to_end(key)
+        while len(_embedding_cache) > EMBEDDING_CACHE_SIZE:
+            _embedding_cache.popitem(last=False)
+
+def embedding_cache_info():
+    """Hit/miss counters and current size of the query embedding cache"""
+    with _embedding_cache_lock:
+        return dict(_embedding_cache_stats, size=len(_embedding_cache), maxsize=EMBEDDING_CACHE_SIZE)
+
+def normalize_query(text: str) -> str:
+    """Case- and whitespace-insensitive form of a query, so retyped or regenerated queries share a cache entry"""
+    return " ".join(text.lower().split())
+
+_DIGITS_RE = re.compile(r"\d+")
+
+def query_numbers(text: str) -> tuple:
+    """Distinct numbers in a query; semantic cache hits must name the same ones"""
+    return tuple(sorted(set(_DIGITS_RE.findall(text))))
+
+class SemanticAnswerCache:
+    """
+    Recent chatbot answers keyed by query embedding. A new question whose embedding is
+    close enough to a cached one (and names the same numbers, so HS 8703 never
+    matches HS 8704) reuses that answer without touching Qdrant or the LLM.
+    """
+
+    def __init__(self, size, threshold, ttl):
+        self.size = size
+        self.threshold = threshold
+        self.ttl = ttl
+        self._vectors = None            # (size, dim) unit vectors, zero rows are empty slots
+        self._entries = [None] * size   # (expires_at, numbers, answer)
+        self._next = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _unit(vector):
+        q = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        return q / norm if norm else None
+
+    def get(self, vector, numbers):
+        q = self._unit(vector)
+        if q is None:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != q.shape[0]:
+                return None
+            sims = self._vectors @ q
+            for i in np.argsort(sims)[::-1]:
+                if sims[i] < self.threshold:
+                    break
+                entry = self._entries[i]
+                if entry and entry[0] > now and entry[1] == numbers:
+                    return entry[2]
+        return None
+
+    def put(self, vector, numbers, answer):
+        q = self._unit(vector)
+        if q is None:
+            return
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != q.shape[0]:
+                self._vectors = np.zeros((self.size, q.shape[0]), dtype=np.float32)
+                self._entries = [None] * self.size
+            self._vectors[self._next] = q
+            self._entries[self._next] = (time.monotonic() + self.ttl, numbers, answer)
+            self._next = (self._next + 1) % self.size
+
+def create_embeddings_batch(client, texts, batch_size: int = 100, model: str = "models/gemini-embedding-001"):
+    """Create dense embeddings for many texts, sending up to batch_size texts per API call"""
+    keys = [_embedding_cache_key(text, model) for text in texts]
+    results = [_embedding_cache_get(key) for key in keys]
+    missing = [i for i, values in enumerate(results) if values is None]
+    batches = [missing[i:i + batch_size] for i in range(0, len(missing), batch_size)]
+
+    def _embed(batch):
+        try:
+            response = client.models.embed_content(
+                model=model,
+                contents=[texts[i] for i in batch]
+            )
+            return [e.values for e in response.embeddings]
+        except Exception as e:
+            print(f"Error creating embedding: {e}")
+            return None
+
+    if len(batches) > 1:
+        with ThreadPoolExecutor(max_workers=min(EMBEDDING_BATCH_WORKERS, len(batches))) as pool:
+            outputs = list(pool.map(_embed, batches))
+    else:
+        outputs = [_embed(batch) for batch in batches]
+
+    for batch, vectors in zip(batches, outputs):
+        if vectors is None or len(vectors) != len(batch):
+            for i in batch:
+                results[i] = [0.0] * 3072
+            continue
+        for i, values in zip(batch, vectors):
+            _embedding_cache_put(keys[i], values)
+            results[i] = values
+
+    return results
+
 def create_embedding(client, text: str, model: str = "models/gemini-embedding-001"):
-    """Create dense embedding using Gemini"""
-    try:
-        response = client.models.embed_content(
-            model=model,
-            contents=text
-        )
-        return response.embeddings[0].values
-    except Exception as e:
-        print(f"Error creating embedding: {e}")
-        return [0.0] * 3072
+    """Create dense embedding using Gemini (cached per model and text)"""
+    return create_embeddings_batch(client, [text], model=model)[0]
+
+async def create_embedding_async(client, text: str, model: str = "models/gemini-embedding-001"):
+    """create_embedding off the event loop, so it can overlap other Gemini calls"""
+    return await asyncio.to_thread(create_embedding, client, text, model)
 
 def create_sparse_vector(text: str):
     """Create sparse BM25-like vector from text"""
-    words = text.lower().split()
-    word_freq = {}
-    for word in words:
-        if len(word) > 2:
-            word_freq[word] = word_freq.get(word, 0) + 1
+    word_freq = Counter(_SPARSE_TOKEN_RE.findall(text.lower()))
     
     indices = []
     values = []
@@ -196,19 +577,49 @@ def create_sparse_vector(text: str):
     return {"indices": indices, "values": values}
 
 
+def warm_qdrant_collection(qdrant_client, collection_name: str) -> bool:
+    """
+    Run one limit=1 search with a random unit vector so the collection's HNSW
+    index is paged in before the first user query. Returns False if it failed.
+    """
+    try:
+        vectors = qdrant_client.get_collection(collection_name).config.params.vectors
+        # Named vectors (hybrid collections) warm the first dense vector
+        if isinstance(vectors, dict):
+            using, params = next(iter(vectors.items()))
+        else:
+            using, params = None, vectors
+        probe = np.random.standard_normal(params.size)
+        probe /= np.linalg.norm(probe)
+        qdrant_client.query_points(
+            collection_name=collection_name,
+            query=probe.tolist(),
+            using=using,
+            limit=1,
+            with_payload=False
+        )
+        return True
+    except Exception as e:
+        logger.warning(f"Qdrant warm-up skipped for '{collection_name}': {e}")
+        return False
+
+
 def generate_chat_title(client, user_input, response_text):
     """Generate concise title using Gemini"""
     try:
-        model = "gemini-2.5-flash"
         prompt = f"""Generate a very short, concise title (3-5 words) for this chat conversation.
-User: {user_input[:200]}
-Assistant: {response_text[:200]}
+User: {user_input[:120]}
+Assistant: {response_text[:120]}
 
 Title:"""
         
         response = client.models.generate_content(
-            model=model,
-            contents=[{"role": "user", "parts": [{"text": prompt}]}]
+            model=TITLE_MODEL,
+            contents=[{"role": "user", "parts": [{"text": prompt}]}],
+            config={
+                "max_output_tokens": 32,
+                "thinking_config": {"thinking_budget": 0}
+            }
         )
         title = response.text.strip().replace('"', '').replace("Title:", "").strip()
         return title if len(title) < 50 else title[:50]
@@ -1,130 +1,433 @@
 import sqlite3
-import json
-from datetime import datetime
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 import os
 from dotenv import load_dotenv
 import uuid
+import zlib
+
+try:
+    import zstandard as zstd
+except ImportError:
+    zstd = None
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # SQLite Configuration
 DB_NAME = "chat_history.db"
 # Store in 'data' directory for docker persistence
 SQLITE_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", DB_NAME)
 
+# All user-facing timestamps are stored in Jakarta time
+_JAKARTA_TZ = ZoneInfo("Asia/Jakarta")
+
+def _now_jakarta_iso():
+    return datetime.now(_JAKARTA_TZ).isoformat()
+
+# Connection pool
+# Connections are opened once with the PRAGMAs below and reused, instead of
+# re-opening the .db/-wal/-shm files on every call. SQLite allows one writer
+# at a time, so write transactions are serialized with a process-wide lock.
+POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "8"))
+_CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL;",
+    "PRAGMA synchronous=NORMAL;",
+    "PRAGMA temp_store=MEMORY;",
+    "PRAGMA cache_size=-20000;",
+    # Serve reads straight from the OS page cache instead of pread() copies
+    "PRAGMA mmap_size=268435456;",
+    # Fold the WAL back into the main file every ~1000 pages (~4MB)
+    "PRAGMA wal_autocheckpoint=1000;",
+)
+
+_pool = queue.Queue(maxsize=POOL_SIZE)
+_write_lock = threading.Lock()
+
+# Bump when _migrate_schema gains a step; stored in PRAGMA user_version
+SCHEMA_VERSION = 4
+
+# Prepared statements kept per pooled connection, so hot queries are parsed once
+STATEMENT_CACHE_SIZE = 256
+
+# Hot-path statements (shared constants keep the statement cache keys identical)
+SQL_SELECT_USER = "SELECT * FROM users WHERE username = ?"
+SQL_SELECT_SESSION = "SELECT * FROM sessions WHERE session_id = ?"
+SQL_SELECT_SESSION_STATUS = "SELECT status FROM sessions WHERE session_id = ?"
+SQL_INSERT_SESSION = """INSERT INTO sessions (session_id, username, chatbot_type, title, created_at, last_activity) 
+                        VALUES (?, ?, ?, ?, ?, ?)"""
+SQL_ENSURE_SESSION = """INSERT OR IGNORE INTO sessions (session_id, username, chatbot_type, title, created_at, last_activity) 
+                        VALUES (?, ?, ?, ?, ?, ?)"""
+# NULL leaves a column unchanged, so one cached statement serves every session update
+SQL_UPDATE_SESSION = """UPDATE sessions SET title = COALESCE(?, title), status = COALESCE(?, status),
+                        last_activity = COALESCE(?, last_activity), message_count = message_count + ?
+                        WHERE session_id = ?"""
+SQL_INSERT_MESSAGE = "INSERT INTO messages (session_id, role, content, timestamp) VALUES (?, ?, ?, ?)"
+SQL_SELECT_MESSAGES = "SELECT role, content, timestamp FROM messages WHERE session_id = ? ORDER BY id ASC"
+SQL_INSERT_INGESTION_LOG = """INSERT INTO ingestion_logs 
+                              (pipeline_name, status, started_at, completed_at, files_processed,
+                               files_upserted, files_skipped, errors, summary)
+                              VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+SQL_SELECT_SESSIONS = """
+    SELECT session_id, title, last_activity, message_count
+    FROM sessions
+    WHERE username = ? AND chatbot_type = ?
+    ORDER BY last_activity DESC
+"""
+
+def _make_conn():
+    conn = sqlite3.connect(
+        SQLITE_DB_PATH,
+        timeout=30,
+        check_same_thread=False,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        # Autocommit mode: reads never open a transaction, and writers get an
+        # explicit BEGIN IMMEDIATE from conn_ctx(write=True)
+        isolation_level=None
+    )
+    for pragma in _CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def _close_conn(conn):
+    """Close a connection, first letting SQLite ANALYZE whatever it flagged as stale"""
+    try:
+        conn.execute("PRAGMA optimize")
+    except sqlite3.Error as e:
+        logger.warning("PRAGMA optimize failed on close: %s", e)
+    conn.close()
+
+@contextmanager
+def conn_ctx(write=False):
+    """
+    Check out a pooled connection.
+    write=True also holds the single-writer lock and opens a BEGIN IMMEDIATE
+    transaction; wrap the body in `with conn:` to commit it.
+    """
+    try:
+        conn = _pool.get_nowait()
+    except queue.Empty:
+        conn = _make_conn()
+    try:
+        with _write_lock if write else nullcontext():
+            if write:
+                conn.execute("BEGIN IMMEDIATE")
+            yield conn
+    finally:
+        # Never hand the next caller a half-finished transaction
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            _pool.put_nowait(conn)
+        except queue.Full:
+            _close_conn(conn)
+
+def close_pool():
+    """Close all idle pooled connections (shutdown, or after changing SQLITE_DB_PATH)"""
+    while True:
+        try:
+            _close_conn(_pool.get_nowait())
+        except queue.Empty:
+            break
+
+def maintenance():
+    """Periodic housekeeping: truncate the WAL and refresh planner statistics.
+
+    Runs off the request path (scheduled from modules.scheduler); a checkpoint
+    that is blocked by active readers is simply retried on the next run.
+    """
+    try:
+        with conn_ctx() as conn:
+            busy, log_pages, checkpointed = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+            conn.execute("PRAGMA optimize")
+        logger.info("SQLite maintenance: checkpoint busy=%s wal_pages=%s checkpointed=%s",
+                    busy, log_pages, checkpointed)
+        return busy == 0
+    except Exception as e:
+        logger.error("Error running database maintenance: %s", e)
+        return False
+
+# Read-through caches for the per-request user and session lookups.
+# Rows are copied in and out so callers never mutate a cached entry, and
+# every writer evicts the keys it touches; the TTL bounds any leftover staleness.
+CACHE_TTL_SECONDS = int(os.getenv("DB_CACHE_TTL_SECONDS", "30"))
+CACHE_MAX_ENTRIES = 1024
+
+_user_cache = {}     # username -> (expires_at, row dict)
+_session_cache = {}  # session_id -> (expires_at, row dict)
+_cache_lock = threading.Lock()
+
+def _cache_get(cache, key):
+    with _cache_lock:
+        entry = cache.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del cache[key]
+            return None
+    return dict(value)
+
+def _cache_put(cache, key, value):
+    with _cache_lock:
+        if key not in cache and len(cache) >= CACHE_MAX_ENTRIES:
+            # Dicts keep insertion order, so this drops the oldest entry
+            del cache[next(iter(cache))]
+        cache[key] = (time.monotonic() + CACHE_TTL_SECONDS, dict(value))
+
+def _cache_evict(cache, key=None):
+    """Drop one key, or the whole cache when key is None"""
+    with _cache_lock:
+        if key is None:
+            cache.clear()
+        else:
+            cache.pop(key, None)
+
+def clear_caches():
+    _cache_evict(_user_cache)
+    _cache_evict(_session_cache)
+
+# Rows fetched per fetchmany() call on list endpoints
+FETCH_BATCH_SIZE = 1000
+
+# Long message bodies are stored compressed as BLOBs with a one-byte codec tag;
+# anything shorter than the threshold stays plain TEXT, as do all legacy rows.
+COMPRESS_MIN_CHARS = 512
+_CODEC_ZLIB = b"\x01"
+_CODEC_ZSTD = b"\x02"
+_codec_local = threading.local()
+
+def _zstd_compressor():
+    # zstandard (de)compressor objects must not be shared across threads
+    cctx = getattr(_codec_local, "cctx", None)
+    if cctx is None:
+        cctx = _codec_local.cctx = zstd.ZstdCompressor(level=3)
+    return cctx
+
+def _zstd_decompressor():
+    dctx = getattr(_codec_local, "dctx", None)
+    if dctx is None:
+        dctx = _codec_local.dctx = zstd.ZstdDecompressor()
+    return dctx
+
+def _encode_content(content):
+    if not isinstance(content, str) or len(content) < COMPRESS_MIN_CHARS:
+        return content
+    raw = content.encode("utf-8")
+    if zstd is not None:
+        packed = _CODEC_ZSTD + _zstd_compressor().compress(raw)
+    else:
+        packed = _CODEC_ZLIB + zlib.compress(raw, 6)
+    # Incompressible text is not worth the decode cost on every read
+    return packed if len(packed) < len(raw) else content
+
+def _decode_content(value):
+    if not isinstance(value, bytes):
+        return value
+    codec, payload = value[:1], value[1:]
+    if codec == _CODEC_ZSTD:
+        if zstd is None:
+            raise RuntimeError("zstandard is required to read this message")
+        return _zstd_decompressor().decompress(payload).decode("utf-8")
+    if codec == _CODEC_ZLIB:
+        return zlib.decompress(payload).decode("utf-8")
+    return value.decode("utf-8")
+
+def _fetch_dicts(cursor, batch_size=FETCH_BATCH_SIZE):
+    """Build result dicts straight from plain tuples, skipping the sqlite3.Row copy"""
+    cursor.row_factory = None
+    columns = [d[0] for d in cursor.description]
+    results = []
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        results.extend(dict(zip(columns, row)) for row in rows)
+    return results
+
 def get_db_connection():
     """Get a SQLite database connection"""
     conn = sqlite3.connect(SQLITE_DB_PATH)
     conn.row_factory = sqlite3.Row
     return conn
 
+def _migrate_schema(c):
+    """Bring tables created by older releases up to the current columns"""
+    # Migration: Add display_name column if not exists
+    c.execute("PRAGMA table_info(users)")
+    columns = [col[1] for col in c.fetchall()]
+    if 'display_name' not in columns:
+        c.execute("ALTER TABLE users ADD COLUMN display_name TEXT")
+        logger.info("Added display_name column to users table")
+    if 'requested_at' not in columns:
+        c.execute("ALTER TABLE users ADD COLUMN requested_at TIMESTAMP")
+        logger.info("Added requested_at column to users table")
+
+    # Migration: Rename created_at to requested_at in pending_users
+    c.execute("PRAGMA table_info(pending_users)")
+    pending_columns = [col[1] for col in c.fetchall()]
+    if 'requested_at' not in pending_columns and 'created_at' in pending_columns:
+        # SQLite doesn't support ALTER COLUMN with non-constant default (like CURRENT_TIMESTAMP)
+        # So we add it as nullable, then populate it
+        c.execute("ALTER TABLE pending_users ADD COLUMN requested_at TIMESTAMP")
+        c.execute("UPDATE pending_users SET requested_at = created_at WHERE requested_at IS NULL")
+        logger.info("Migrated pending_users to use requested_at")
+
+    # Migration: Add denormalized message_count and backfill it from messages
+    c.execute("PRAGMA table_info(sessions)")
+    session_columns = [col[1] for col in c.fetchall()]
+    if 'message_count' not in session_columns:
+        c.execute("ALTER TABLE sessions ADD COLUMN message_count INTEGER DEFAULT 0")
+        c.execute("""UPDATE sessions SET message_count = (
+                         SELECT COUNT(*) FROM messages m WHERE m.session_id = sessions.session_id
+                     )""")
+        logger.info("Added message_count column to sessions table")
+
+    # Migration: Backfill the llm_logs_daily rollup from existing logs
+    if c.execute("SELECT 1 FROM llm_logs_daily LIMIT 1").fetchone() is None:
+        c.execute("""INSERT INTO llm_logs_daily
+                         (date, chatbot_type, status, calls, input_tokens, output_tokens, sum_latency, n_latency)
+                     SELECT DATE(created_at), chatbot_type, status, COUNT(*), SUM(input_tokens),
+                            SUM(output_tokens), SUM(latency_ms), COUNT(latency_ms)
+                     FROM llm_logs GROUP BY DATE(created_at), chatbot_type, status""")
+        logger.info("Backfilled llm_logs_daily rollup")
+
+    # Migration: idx_llm_logs_created used to be DESC; it is recreated ascending below
+    # so ORDER BY created_at DESC, id DESC is a plain backwards index scan
+    c.execute("DROP INDEX IF EXISTS idx_llm_logs_created")
+
 def init_database():
     """Initialize SQLite database with all tables"""
     try:
-        conn = sqlite3.connect(SQLITE_DB_PATH)
-        # Enable WAL mode for better concurrency
-        conn.execute("PRAGMA journal_mode=WAL;")
-        c = conn.cursor()
+        with conn_ctx(write=True) as conn, conn:
+            c = conn.cursor()
         
-        # 1. Users Table
-        c.execute('''CREATE TABLE IF NOT EXISTS users (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        username TEXT UNIQUE NOT NULL,
-                        password_hash TEXT NOT NULL,
-                        role TEXT DEFAULT 'user',
-                        display_name TEXT,
-                        requested_at TIMESTAMP,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )''')
+            # 1. Users Table
+            c.execute('''CREATE TABLE IF NOT EXISTS users (
+                            id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            username TEXT UNIQUE NOT NULL,
+                            password_hash TEXT NOT NULL,
+                            role TEXT DEFAULT 'user',
+                            display_name TEXT,
+                            requested_at TIMESTAMP,
+                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                        )''')
         
-        # Migration: Add display_name column if not exists
-        c.execute("PRAGMA table_info(users)")
-        columns = [col[1] for col in c.fetchall()]
-        if 'display_name' not in columns:
-            c.execute("ALTER TABLE users ADD COLUMN display_name TEXT")
-            print("Added display_name column to users table")
-        if 'requested_at' not in columns:
-            c.execute("ALTER TABLE users ADD COLUMN requested_at TIMESTAMP")
-            print("Added requested_at column to users table")
                     
-        # 2. Sessions Table
-        c.execute('''CREATE TABLE IF NOT EXISTS sessions (
-                        session_id TEXT PRIMARY KEY,
-                        username TEXT NOT NULL,
-                        chatbot_type TEXT NOT NULL,
-                        title TEXT,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        last_activity TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        status TEXT DEFAULT 'idle',
-                        FOREIGN KEY(username) REFERENCES users(username)
-                    )''')
+            # 2. Sessions Table
+            c.execute('''CREATE TABLE IF NOT EXISTS sessions (
+                            session_id TEXT PRIMARY KEY,
+                            username TEXT NOT NULL,
+                            chatbot_type TEXT NOT NULL,
+                            title TEXT,
+                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                            last_activity TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                            status TEXT DEFAULT 'idle',
+                            message_count INTEGER DEFAULT 0,
+                            FOREIGN KEY(username) REFERENCES users(username)
+                        )''')
+            
                     
-        # 3. Messages Table
-        c.execute('''CREATE TABLE IF NOT EXISTS messages (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        session_id TEXT NOT NULL,
-                        role TEXT NOT NULL,
-                        content TEXT NOT NULL,
-                        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY(session_id) REFERENCES sessions(session_id) ON DELETE CASCADE
-                    )''')
+            # 3. Messages Table
+            c.execute('''CREATE TABLE IF NOT EXISTS messages (
+                            id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            session_id TEXT NOT NULL,
+                            role TEXT NOT NULL,
+                            content TEXT NOT NULL,
+                            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                            FOREIGN KEY(session_id) REFERENCES sessions(session_id) ON DELETE CASCADE
+                        )''')
         
-        # 4. Pending Users Table (for registration approval)
-        c.execute('''CREATE TABLE IF NOT EXISTS pending_users (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        username TEXT UNIQUE NOT NULL,
-                        email TEXT NOT NULL,
-                        password_hash TEXT NOT NULL,
-                        requested_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        status TEXT DEFAULT 'pending'
-                    )''')
+            # 4. Pending Users Table (for registration approval)
+            c.execute('''CREATE TABLE IF NOT EXISTS pending_users (
+                            id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            username TEXT UNIQUE NOT NULL,
+                            email TEXT NOT NULL,
+                            password_hash TEXT NOT NULL,
+                            requested_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                            status TEXT DEFAULT 'pending'
+                        )''')
         
-        # Migration: Rename created_at to requested_at in pending_users
-        c.execute("PRAGMA table_info(pending_users)")
-        pending_columns = [col[1] for col in c.fetchall()]
-        if 'requested_at' not in pending_columns and 'created_at' in pending_columns:
-            # SQLite doesn't support ALTER COLUMN with non-constant default (like CURRENT_TIMESTAMP)
-            # So we add it as nullable, then populate it
-            c.execute("ALTER TABLE pending_users ADD COLUMN requested_at TIMESTAMP")
-            c.execute("UPDATE pending_users SET requested_at = created_at WHERE requested_at IS NULL")
-            print("Migrated pending_users to use requested_at")
         
-        # 5. LLM Logs Table (for developer dashboard)
-        c.execute('''CREATE TABLE IF NOT EXISTS llm_logs (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        session_id TEXT,
-                        username TEXT,
-                        chatbot_type TEXT,
-                        status TEXT,
-                        input_tokens INTEGER DEFAULT 0,
-                        output_tokens INTEGER DEFAULT 0,
-                        latency_ms INTEGER DEFAULT 0,
-                        error_message TEXT,
-                        query TEXT,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )''')
+            # 5. LLM Logs Table (for developer dashboard)
+            c.execute('''CREATE TABLE IF NOT EXISTS llm_logs (
+                            id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            session_id TEXT,
+                            username TEXT,
+                            chatbot_type TEXT,
+                            status TEXT,
+                            input_tokens INTEGER DEFAULT 0,
+                            output_tokens INTEGER DEFAULT 0,
+                            latency_ms INTEGER DEFAULT 0,
+                            error_message TEXT,
+                            query TEXT,
+                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                        )''')
+
+            # 5b. Per-day LLM rollup, kept up to date by llm_logger so the
+            # dashboard stats never scan llm_logs
+            c.execute('''CREATE TABLE IF NOT EXISTS llm_logs_daily (
+                            date TEXT NOT NULL,
+                            chatbot_type TEXT,
+                            status TEXT,
+                            calls INTEGER DEFAULT 0,
+                            input_tokens INTEGER DEFAULT 0,
+                            output_tokens INTEGER DEFAULT 0,
+                            sum_latency INTEGER DEFAULT 0,
+                            n_latency INTEGER DEFAULT 0,
+                            PRIMARY KEY (date, chatbot_type, status)
+                        )''')
+
+
+            # 5c. OCR results keyed by content hash, so identical files are not re-sent to Gemini
+            c.execute('''CREATE TABLE IF NOT EXISTS ocr_cache (
+                            sha256 TEXT NOT NULL,
+                            model TEXT NOT NULL,
+                            text TEXT NOT NULL,
+                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                            PRIMARY KEY (sha256, model)
+                        )''')
         
-        # 6. Ingestion Logs Table (for admin dashboard)
-        c.execute('''CREATE TABLE IF NOT EXISTS ingestion_logs (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        pipeline_name TEXT NOT NULL,
-                        status TEXT NOT NULL,
-                        started_at TIMESTAMP,
-                        completed_at TIMESTAMP,
-                        files_processed INTEGER DEFAULT 0,
-                        files_upserted INTEGER DEFAULT 0,
-                        files_skipped INTEGER DEFAULT 0,
-                        errors INTEGER DEFAULT 0,
-                        summary TEXT,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )''')
+            # 6. Ingestion Logs Table (for admin dashboard)
+            c.execute('''CREATE TABLE IF NOT EXISTS ingestion_logs (
+                            id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            pipeline_name TEXT NOT NULL,
+                            status TEXT NOT NULL,
+                            started_at TIMESTAMP,
+                            completed_at TIMESTAMP,
+                            files_processed INTEGER DEFAULT 0,
+                            files_upserted INTEGER DEFAULT 0,
+                            files_skipped INTEGER DEFAULT 0,
+                            errors INTEGER DEFAULT 0,
+                            summary TEXT,
+                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                        )''')
+            
+            # Column migrations only run when the stored schema version is behind
+            schema_version = c.execute("PRAGMA user_version").fetchone()[0]
+            if schema_version < SCHEMA_VERSION:
+                _migrate_schema(c)
+            
+            # 7. Indexes for the filtered / sorted read paths
+            c.execute("CREATE INDEX IF NOT EXISTS idx_messages_session ON messages(session_id, id)")
+            c.execute("CREATE INDEX IF NOT EXISTS idx_sessions_user_bot ON sessions(username, chatbot_type, last_activity DESC)")
+            c.execute("CREATE INDEX IF NOT EXISTS idx_pending_status ON pending_users(status, requested_at DESC)")
+            c.execute("CREATE INDEX IF NOT EXISTS idx_llm_logs_created ON llm_logs(created_at)")
+            c.execute("CREATE INDEX IF NOT EXISTS idx_llm_logs_status_type_created ON llm_logs(status, chatbot_type, created_at)")
+            # Gather statistics for the new indexes so the planner picks them up
+            c.execute("PRAGMA optimize")
         
-        conn.commit()
-        conn.close()
-        print(f"Successfully initialized SQLite database at {SQLITE_DB_PATH}")
+            c.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        logger.info("Successfully initialized SQLite database at %s", SQLITE_DB_PATH)
     except Exception as e:
-        print(f"Failed to initialize SQLite database: {e}")
+        logger.error("Failed to initialize SQLite database: %s", e)
 
 # -----------------------------------------------------------------------------
 # Ingestion Logging
@@ -136,22 +439,62 @@ def log_ingestion_run(pipeline_name: str, status: str, started_at: str = None,
                       errors: int = 0, summary: str = None) -> int:
     """Log an ingestion run to the database"""
     try:
-        conn = sqlite3.connect(SQLITE_DB_PATH)
-        c = conn.cursor()
-        c.execute('''INSERT INTO ingestion_logs 
-                     (pipeline_name, status, started_at, completed_at, files_processed,
-                      files_upserted, files_skipped, errors, summary)
-                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                  (pipeline_name, status, started_at, completed_at, files_processed,
-                   files_upserted, files_skipped, errors, summary))
-        log_id = c.lastrowid
-        conn.commit()
-        conn.close()
+        with conn_ctx(write=True) as conn, conn:
+            c = conn.cursor()
+            c.execute(SQL_INSERT_INGESTION_LOG,
+                      (pipeline_name, status, started_at, completed_at, files_processed,
+                       files_upserted, files_skipped, errors, summary))
+            log_id = c.lastrowid
         return log_id
     except Exception as e:
-        print(f"Error logging ingestion run: {e}")
+        logger.error("Error logging ingestion run: %s", e)
+        return -1
+
+def log_ingestion_runs_bulk(rows) -> int:
+    """
+    Log several ingestion runs in one transaction.
+    rows: iterable of (pipeline_name, status, started_at, completed_at, files_processed,
+          files_upserted, files_skipped, errors, summary) tuples.
+    Returns the number of rows written, or -1 on error.
+    """
+    rows = list(rows)
+    if not rows:
+        return 0
+    try:
+        with conn_ctx(write=True) as conn, conn:
+            c = conn.cursor()
+            c.executemany(SQL_INSERT_INGESTION_LOG, rows)
+        return len(rows)
+    except Exception as e:
+        logger.error("Error logging ingestion runs: %s", e)
         return -1
 
+# -----------------------------------------------------------------------------
+# OCR Cache
+# -----------------------------------------------------------------------------
+
+def get_cached_ocr(digest, model):
+    """Return the cached OCR text for a content hash and model, or None"""
+    try:
+        with conn_ctx() as conn:
+            row = conn.execute("SELECT text FROM ocr_cache WHERE sha256 = ? AND model = ?",
+                               (digest, model)).fetchone()
+        return row[0] if row else None
+    except Exception as e:
+        logger.error("Error reading OCR cache: %s", e)
+        return None
+
+def cache_ocr_result(digest, model, text):
+    """Store an OCR result under its content hash and model"""
+    try:
+        with conn_ctx(write=True) as conn, conn:
+            conn.execute("INSERT OR REPLACE INTO ocr_cache (sha256, model, text) VALUES (?, ?, ?)",
+                         (digest, model, text))
+        return True
+    except Exception as e:
+        logger.error("Error writing OCR cache: %s", e)
+        return False
+
 # -----------------------------------------------------------------------------
 # User Management
 # -----------------------------------------------------------------------------
@@ -159,88 +502,83 @@ def log_ingestion_run(pipeline_name: str, status: str, started_at: str = None,
 def add_user(username, password_hash, role="user"):
     """Add a new user (admin-created, not via signup flow)"""
     try:
-        conn = sqlite3.connect(SQLITE_DB_PATH)
-        c = conn.cursor()
-        now_jakarta = datetime.now(ZoneInfo("Asia/Jakarta")).isoformat()
-        # For admin-created users, set created_at but no requested_at (since no approval flow)
-        c.execute("""INSERT INTO users (username, password_hash, role, created_at) 
-                     VALUES (?, ?, ?, ?)""", 
-                  (username, password_hash, role, now_jakarta))
-        conn.commit()
-        conn.close()
-        return True
-    except sqlite3.IntegrityError:
-        return False
+        with conn_ctx(write=True) as conn, conn:
+            c = conn.cursor()
+            now_jakarta = _now_jakarta_iso()
+            # For admin-created users, set created_at but no requested_at (since no approval flow)
+            # Existing usernames are ignored by the UNIQUE constraint; rowcount tells us
+            c.execute("""INSERT OR IGNORE INTO users (username, password_hash, role, created_at) 
+                         VALUES (?, ?, ?, ?)""", 
+                      (username, password_hash, role, now_jakarta))
+        return c.rowcount == 1
     except Exception as e:
-        print(f"Error adding user: {e}")
+        logger.error("Error adding user: %s", e)
         return False
 
 def get_user_by_username(username):
+    cached = _cache_get(_user_cache, username)
+    if cached is not None:
+        return cached
     try:
-        conn = sqlite3.connect(SQLITE_DB_PATH)
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
-        c.execute("SELECT * FROM users WHERE username = ?", (username,))
-        user = c.fetchone()
-        conn.close()
+        with conn_ctx() as conn:
+            c = conn.cursor()
+            c.execute(SQL_SELECT_USER, (username,))
+            user = c.fetchone()
         if user:
+            user = dict(user)
+            _cache_put(_user_cache, username, user)
             return dict(user)
         return None
     except Exception as e:
-        print(f"Error getting user: {e}")
+        logger.error("Error getting user: %s", e)
         return None
 
 def get_all_users():
     try:
-        conn = sqlite3.connect(SQLITE_DB_PATH)
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
-        c.execute("SELECT id, username, display_name, role, requested_at, created_at FROM users")
-        users = [dict(row) for row in c.fetchall()]
-        conn.close()
+        with conn_ctx() as conn:
+            c = conn.cursor()
+            c.execute("SELECT id, username, display_name, role, requested_at, created_at FROM users")
+            users = _fetch_dicts(c)
         return users
     except Exception as e:
-        print(f"Error getting all users: {e}")
+        logger.error("Error getting all users: %s", e)
         return []
 
 def delete_user_by_id(user_id):
     try:
-        conn = sqlite3.connect(SQLITE_DB_PATH)
-        c = conn.cursor()
-        c.execute("DELETE FROM users WHERE id = ?", (user_id,))
-        conn.commit()
-        conn.close()
+        with conn_ctx(write=True) as conn, conn:
+            c = conn.cursor()
+            c.execute("DELETE FROM users WHERE id = ?", (user_id,))
+        _cache_evict(_user_cache)
         return True
     except Exception as e:
-        print(f"Error deleting user: {e}")
+        logger.error("Error deleting user: %s", e)
         return False
 
 def update_user_display_name(username, display_name):
     """Update user's display name"""
     try:
-        conn = sqlite3.connect(SQLITE_DB_PATH)
-        c = conn.cursor()
-        c.execute("UPDATE users SET display_name = ? WHERE username = ?", 
-                  (display_name, username))
-        conn.commit()
-        conn.close()
+        with conn_ctx(write=True) as conn, conn:
+            c = conn.cursor()
+            c.execute("UPDATE users SET display_name = ? WHERE username = ?", 
+                      (display_name, username))
+        _cache_evict(_user_cache, username)
         return True
     except Exception as e:
-        print(f"Error updating display name: {e}")
+        logger.error("Error updating display name: %s", e)
         return False
 
 def update_user_password(username, new_password_hash):
     """Update user's password"""
     try:
-        conn = sqlite3.connect(SQLITE_DB_PATH)
-        c = conn.cursor()
-        c.execute("UPDATE users SET password_hash = ? WHERE username = ?", 
-                  (new_password_hash, username))
-        conn.commit()
-        conn.close()
+        with conn_ctx(write=True) as conn, conn:
+            c = conn.cursor()
+            c.execute("UPDATE users SET password_hash = ? WHERE username = ?", 
+                      (new_password_hash, username))
+        _cache_evict(_user_cache, username)
         return True
     except Exception as e:
-        print(f"Error updating password: {e}")
+        logger.error("Error updating password: %s", e)
         return False
 
 # -----------------------------------------------------------------------------
@@ -250,200 +588,200 @@ def update_user_password(username, new_password_hash):
 def add_pending_user(username, email, password_hash):
     """Add a user registration request for admin approval"""
     try:
-        conn = sqlite3.connect(SQLITE_DB_PATH)
-        c = conn.cursor()
-        now_jakarta = datetime.now(ZoneInfo("Asia/Jakarta")).isoformat()
-        c.execute("INSERT INTO pending_users (username, email, password_hash, requested_at) VALUES (?, ?, ?, ?)", 
-                  (username, email, password_hash, now_jakarta))
-        conn.commit()
-        conn.close()
-        return True
-    except sqlite3.IntegrityError:
-        return False
+        with conn_ctx(write=True) as conn, conn:
+            c = conn.cursor()
+            now_jakarta = _now_jakarta_iso()
+            c.execute("INSERT OR IGNORE INTO pending_users (username, email, password_hash, requested_at) VALUES (?, ?, ?, ?)", 
+                      (username, email, password_hash, now_jakarta))
+        return c.rowcount == 1
     except Exception as e:
-        print(f"Error adding pending user: {e}")
+        logger.error("Error adding pending user: %s", e)
         return False
 
 def get_pending_users():
     """Get all pending registration requests"""
     try:
-        conn = sqlite3.connect(SQLITE_DB_PATH)
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
-        c.execute("""SELECT id, username, email, requested_at, status 
-                     FROM pending_users WHERE status = 'pending' 
-                     ORDER BY requested_at DESC""")
-        users = [dict(row) for row in c.fetchall()]
-        conn.close()
+        with conn_ctx() as conn:
+            c = conn.cursor()
+            c.execute("""SELECT id, username, email, requested_at, status 
+                         FROM pending_users WHERE status = 'pending' 
+                         ORDER BY requested_at DESC""")
+            users = _fetch_dicts(c)
         return users
     except Exception as e:
-        print(f"Error getting pending users: {e}")
+        logger.error("Error getting pending users: %s", e)
         return []
 
 def get_pending_user_by_id(user_id):
     """Get a pending user by ID"""
     try:
-        conn = sqlite3.connect(SQLITE_DB_PATH)
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
-        c.execute("SELECT * FROM pending_users WHERE id = ?", (user_id,))
-        user = c.fetchone()
-        conn.close()
+        with conn_ctx() as conn:
+            c = conn.cursor()
+            c.execute("SELECT * FROM pending_users WHERE id = ?", (user_id,))
+            user = c.fetchone()
         return dict(user) if user else None
     except Exception as e:
-        print(f"Error getting pending user: {e}")
+        logger.error("Error getting pending user: %s", e)
         return None
 
 def approve_pending_user(user_id):
     """Approve a pending user and move them to users table"""
     try:
-        pending = get_pending_user_by_id(user_id)
-        if not pending:
-            return False
+        with conn_ctx(write=True) as conn, conn:
+            c = conn.cursor()
+            # Read and move the request in one transaction so it cannot be approved twice
+            # Legacy tables may still carry created_at instead of requested_at
+            c.execute("SELECT * FROM pending_users WHERE id = ?", (user_id,))
+            row = c.fetchone()
+            if not row:
+                return False
+            pending = dict(row)
+            
+            # Add to users table with requested_at from pending
+            requested_at = pending.get('requested_at') or pending.get('created_at')
+            c.execute("""INSERT INTO users (username, password_hash, role, requested_at, created_at) 
+                         VALUES (?, ?, 'user', ?, CURRENT_TIMESTAMP)""", 
+                      (pending['username'], pending['password_hash'], requested_at))
         
-        # Add to users table with requested_at from pending
-        conn = sqlite3.connect(SQLITE_DB_PATH)
-        c = conn.cursor()
-        requested_at = pending.get('requested_at') or pending.get('created_at')
-        c.execute("""INSERT INTO users (username, password_hash, role, requested_at, created_at) 
-                     VALUES (?, ?, 'user', ?, CURRENT_TIMESTAMP)""", 
-                  (pending['username'], pending['password_hash'], requested_at))
-        
-        # Update pending status
-        c.execute("UPDATE pending_users SET status = 'approved' WHERE id = ?", (user_id,))
-        conn.commit()
-        conn.close()
+            # Update pending status
+            c.execute("UPDATE pending_users SET status = 'approved' WHERE id = ?", (user_id,))
         return True
     except Exception as e:
-        print(f"Error approving user: {e}")
+        logger.error("Error approving user: %s", e)
         return False
 
 def reject_pending_user(user_id):
     """Reject a pending user request"""
     try:
-        conn = sqlite3.connect(SQLITE_DB_PATH)
-        c = conn.cursor()
-        c.execute("UPDATE pending_users SET status = 'rejected' WHERE id = ?", (user_id,))
-        conn.commit()
-        conn.close()
+        with conn_ctx(write=True) as conn, conn:
+            c = conn.cursor()
+            c.execute("UPDATE pending_users SET status = 'rejected' WHERE id = ?", (user_id,))
         return True
     except Exception as e:
-        print(f"Error rejecting user: {e}")
+        logger.error("Error rejecting user: %s", e)
         return False
 
 def check_pending_username_exists(username):
     """Check if username exists in pending users"""
     try:
-        conn = sqlite3.connect(SQLITE_DB_PATH)
-        c = conn.cursor()
-        c.execute("SELECT 1 FROM pending_users WHERE username = ? AND status = 'pending'", (username,))
-        exists = c.fetchone() is not None
-        conn.close()
+        with conn_ctx() as conn:
+            c = conn.cursor()
+            c.execute("SELECT 1 FROM pending_users WHERE username = ? AND status = 'pending'", (username,))
+            exists = c.fetchone() is not None
         return exists
     except Exception as e:
-        print(f"Error checking pending username: {e}")
+        logger.error("Error checking pending username: %s", e)
         return False
 
 # -----------------------------------------------------------------------------
 # Chat Session Management
 # -----------------------------------------------------------------------------
 
+def _uuid7():
+    """Time-ordered UUID (RFC 9562 v7) so new sessions append to the end of the
+    primary-key B-tree instead of landing on a random page"""
+    if hasattr(uuid, "uuid7"):
+        return uuid.uuid7()
+    ms = time.time_ns() // 1_000_000
+    rand = int.from_bytes(os.urandom(10), "big")
+    value = (ms & 0xFFFFFFFFFFFF) << 80
+    value |= 0x7 << 76                           # version
+    value |= ((rand >> 62) & 0xFFF) << 64         # rand_a
+    value |= 0b10 << 62                           # variant
+    value |= rand & 0x3FFFFFFFFFFFFFFF            # rand_b
+    return uuid.UUID(int=value)
+
 def create_session(username, chatbot_type, session_id=None, title="New Chat"):
     if not session_id:
-        session_id = str(uuid.uuid4())
+        session_id = str(_uuid7())
     
-    timestamp = datetime.now(ZoneInfo("Asia/Jakarta")).isoformat()
+    timestamp = _now_jakarta_iso()
     try:
-        conn = sqlite3.connect(SQLITE_DB_PATH)
-        c = conn.cursor()
-        c.execute("""INSERT INTO sessions (session_id, username, chatbot_type, title, created_at, last_activity) 
-                     VALUES (?, ?, ?, ?, ?, ?)""",
-                  (session_id, username, chatbot_type, title, timestamp, timestamp))
-        conn.commit()
-        conn.close()
+        with conn_ctx(write=True) as conn, conn:
+            c = conn.cursor()
+            c.execute(SQL_INSERT_SESSION,
+                      (session_id, username, chatbot_type, title, timestamp, timestamp))
         return session_id
     except Exception as e:
-        print(f"Error creating session: {e}")
+        logger.error("Error creating session: %s", e)
         return None
 
 def get_chat_sessions(username, chatbot_type):
     try:
-        conn = sqlite3.connect(SQLITE_DB_PATH)
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
+        with conn_ctx() as conn:
+            c = conn.cursor()
         
-        # Get sessions with message count
-        query = """
-            SELECT s.session_id, s.title, s.last_activity, COUNT(m.id) as message_count 
-            FROM sessions s
-            LEFT JOIN messages m ON s.session_id = m.session_id
-            WHERE s.username = ? AND s.chatbot_type = ?
-            GROUP BY s.session_id
-            ORDER BY s.last_activity DESC
-        """
-        c.execute(query, (username, chatbot_type))
+            # Get sessions with message count
+            c.execute(SQL_SELECT_SESSIONS, (username, chatbot_type))
         
-        sessions = [dict(row) for row in c.fetchall()]
-        conn.close()
+            sessions = _fetch_dicts(c)
         return sessions
     except Exception as e:
-        print(f"Error getting sessions: {e}")
+        logger.error("Error getting sessions: %s", e)
         return []
 
 def get_session_by_id(session_id):
+    cached = _cache_get(_session_cache, session_id)
+    if cached is not None:
+        return cached
     try:
-        conn = sqlite3.connect(SQLITE_DB_PATH)
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
-        c.execute("SELECT * FROM sessions WHERE session_id = ?", (session_id,))
-        session = c.fetchone()
-        conn.close()
+        with conn_ctx() as conn:
+            c = conn.cursor()
+            c.execute(SQL_SELECT_SESSION, (session_id,))
+            session = c.fetchone()
+        if not session and _archived_session_exists(session_id):
+            session = _restore_archived_session(session_id)
         if session:
+            session = dict(session)
+            _cache_put(_session_cache, session_id, session)
             return dict(session)
         return None
     except Exception as e:
-        print(f"Error getting session: {e}")
+        logger.error("Error getting session: %s", e)
         return None
 
 def delete_session(username, chatbot_type, session_id): 
     # username and chatbot_type are for validation, but ID is unique
     try:
-        conn = sqlite3.connect(SQLITE_DB_PATH)
-        c = conn.cursor()
-        c.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
-        conn.commit()
-        conn.close()
+        with conn_ctx(write=True) as conn, conn:
+            c = conn.cursor()
+            c.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        _cache_evict(_session_cache, session_id)
     except Exception as e:
-        print(f"Error deleting session: {e}")
+        logger.error("Error deleting session: %s", e)
+
+def _update_session(session_id, *, title=None, status=None, last_activity=None,
+                    added_messages=0, cursor=None):
+    """
+    Update any subset of a session's mutable fields in one statement.
+    Pass cursor to run inside the caller's transaction (the caller then evicts the cache).
+    """
+    params = (title, status, last_activity, added_messages, session_id)
+    if cursor is not None:
+        cursor.execute(SQL_UPDATE_SESSION, params)
+        return
+    with conn_ctx(write=True) as conn, conn:
+        conn.execute(SQL_UPDATE_SESSION, params)
+    _cache_evict(_session_cache, session_id)
 
 def update_session_title(session_id, title):
     try:
-        conn = sqlite3.connect(SQLITE_DB_PATH)
-        c = conn.cursor()
-        c.execute("UPDATE sessions SET title = ? WHERE session_id = ?", (title, session_id))
-        conn.commit()
-        conn.close()
+        _update_session(session_id, title=title)
     except Exception as e:
-        print(f"Error updating session title: {e}")
+        logger.error("Error updating session title: %s", e)
 
 def set_session_status(session_id, status):
     try:
-        conn = sqlite3.connect(SQLITE_DB_PATH)
-        c = conn.cursor()
-        c.execute("UPDATE sessions SET status = ? WHERE session_id = ?", (status, session_id))
-        conn.commit()
-        conn.close()
+        _update_session(session_id, status=status)
     except Exception as e:
-        print(f"Error setting session status: {e}")
+        logger.error("Error setting session status: %s", e)
 
 def get_session_status(session_id):
     try:
-        conn = sqlite3.connect(SQLITE_DB_PATH)
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
-        c.execute("SELECT status FROM sessions WHERE session_id = ?", (session_id,))
-        row = c.fetchone()
-        conn.close()
+        with conn_ctx() as conn:
+            c = conn.cursor()
+            c.execute(SQL_SELECT_SESSION_STATUS, (session_id,))
+            row = c.fetchone()
         return row['status'] if row else 'idle'
     except Exception as e:
         return 'idle'
@@ -457,42 +795,66 @@ def save_message(username, chatbot_type, role, content, session_id, timestamp=No
         timestamp = datetime.now().isoformat()
         
     try:
-        conn = sqlite3.connect(SQLITE_DB_PATH)
-        c = conn.cursor()
-        
-        # Check if session exists, if not create it (auto-recovery)
-        c.execute("SELECT 1 FROM sessions WHERE session_id = ?", (session_id,))
-        if not c.fetchone():
-            c.execute("""INSERT INTO sessions (session_id, username, chatbot_type, title, created_at, last_activity) 
-                         VALUES (?, ?, ?, ?, ?, ?)""",
+        with conn_ctx(write=True) as conn, conn:
+            c = conn.cursor()
+            
+            # Create the session if it does not exist yet (auto-recovery)
+            c.execute(SQL_ENSURE_SESSION,
                       (session_id, username, chatbot_type, "New Chat", timestamp, timestamp))
         
-        # Save message
-        c.execute("INSERT INTO messages (session_id, role, content, timestamp) VALUES (?, ?, ?, ?)",
-                  (session_id, role, content, timestamp))
+            # Save message
+            c.execute(SQL_INSERT_MESSAGE, (session_id, role, _encode_content(content), timestamp))
         
-        # Update last activity
-        c.execute("UPDATE sessions SET last_activity = ? WHERE session_id = ?", (timestamp, session_id))
+            # Update last activity and message count
+            _update_session(session_id, last_activity=timestamp, added_messages=1, cursor=c)
         
-        conn.commit()
-        conn.close()
+        _cache_evict(_session_cache, session_id)
     except Exception as e:
-        print(f"Error saving message: {e}")
+        logger.error("Error saving message: %s", e)
+
+def save_messages_bulk(username, chatbot_type, session_id, messages):
+    """
+    Save several messages to one session in a single transaction.
+    messages: iterable of (role, content) or (role, content, timestamp) tuples.
+    """
+    now = datetime.now().isoformat()
+    rows = [
+        (session_id, msg[0], _encode_content(msg[1]), msg[2] if len(msg) > 2 and msg[2] else now)
+        for msg in messages
+    ]
+    if not rows:
+        return True
+        
+    try:
+        with conn_ctx(write=True) as conn, conn:
+            c = conn.cursor()
+            
+            c.execute(SQL_ENSURE_SESSION,
+                      (session_id, username, chatbot_type, "New Chat", rows[0][3], rows[0][3]))
+            
+            c.executemany(SQL_INSERT_MESSAGE, rows)
+            _update_session(session_id, last_activity=rows[-1][3], added_messages=len(rows), cursor=c)
+            
+        _cache_evict(_session_cache, session_id)
+        return True
+    except Exception as e:
+        logger.error("Error saving messages: %s", e)
+        return False
 
 def load_chat_history(username, chatbot_type, session_id=None):
     if not session_id:
         return []
         
     try:
-        conn = sqlite3.connect(SQLITE_DB_PATH)
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
-        c.execute("SELECT role, content, timestamp FROM messages WHERE session_id = ? ORDER BY id ASC", (session_id,))
-        messages = [dict(row) for row in c.fetchall()]
-        conn.close()
+        with conn_ctx() as conn:
+            c = conn.cursor()
+            c.execute(SQL_SELECT_MESSAGES, (session_id,))
+            messages = _fetch_dicts(c)
+        for message in messages:
+            message['content'] = _decode_content(message['content'])
         return messages
     except Exception as e:
-        print(f"Error loading chat history: {e}")
+        logger.error("Error loading chat history: %s", e)
         return []
 
 def clear_chat_history(username, chatbot_type, session_id=None):
@@ -500,28 +862,142 @@ def clear_chat_history(username, chatbot_type, session_id=None):
     if not session_id:
         return
     try:
-        conn = sqlite3.connect(SQLITE_DB_PATH)
-        c = conn.cursor()
-        c.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
-        conn.commit()
-        conn.close()
+        with conn_ctx(write=True) as conn, conn:
+            c = conn.cursor()
+            c.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            c.execute("UPDATE sessions SET message_count = 0 WHERE session_id = ?", (session_id,))
+        _cache_evict(_session_cache, session_id)
     except Exception as e:
-        print(f"Error clearing chat history: {e}")
+        logger.error("Error clearing chat history: %s", e)
 
 def delete_all_sessions(username, chatbot_type):
     """Delete all sessions for a specific user and chatbot type"""
     try:
-        conn = sqlite3.connect(SQLITE_DB_PATH)
-        c = conn.cursor()
-        # Deleting sessions will cascade delete messages due to foreign key
-        c.execute("DELETE FROM sessions WHERE username = ? AND chatbot_type = ?", (username, chatbot_type))
-        conn.commit()
-        conn.close()
+        with conn_ctx(write=True) as conn, conn:
+            c = conn.cursor()
+            # Deleting sessions will cascade delete messages due to foreign key
+            c.execute("DELETE FROM sessions WHERE username = ? AND chatbot_type = ?", (username, chatbot_type))
+        _cache_evict(_session_cache)
         return True
     except Exception as e:
-        print(f"Error deleting all sessions: {e}")
+        logger.error("Error deleting all sessions: %s", e)
+        return False
+
+# -----------------------------------------------------------------------------
+# Session Archive
+# -----------------------------------------------------------------------------
+
+# Sessions idle for this many days are moved to the archive DB (0 disables archiving)
+CHAT_ARCHIVE_DAYS = int(os.getenv("CHAT_ARCHIVE_DAYS", "0"))
+ARCHIVE_DB_NAME = "chat_history_archive.db"
+
+_SESSION_COLUMNS = "session_id, username, chatbot_type, title, created_at, last_activity, status, message_count"
+_MESSAGE_COLUMNS = "id, session_id, role, content, timestamp"
+
+def _archive_path():
+    return os.path.join(os.path.dirname(SQLITE_DB_PATH), ARCHIVE_DB_NAME)
+
+@contextmanager
+def _archive_conn():
+    """
+    Dedicated connection with the archive DB attached as `archive`.
+    Holds the writer lock; ATTACH cannot run on a pooled connection mid-transaction.
+    """
+    with _write_lock:
+        conn = _make_conn()
+        try:
+            conn.execute("ATTACH DATABASE ? AS archive", (_archive_path(),))
+            # Archive is only scanned occasionally: big pages, mapped reads
+            # (page_size only takes effect while the file is still empty)
+            conn.execute("PRAGMA archive.page_size=65536")
+            conn.execute("PRAGMA archive.mmap_size=1073741824")
+            conn.execute('''CREATE TABLE IF NOT EXISTS archive.sessions (
+                                session_id TEXT PRIMARY KEY,
+                                username TEXT NOT NULL,
+                                chatbot_type TEXT NOT NULL,
+                                title TEXT,
+                                created_at TIMESTAMP,
+                                last_activity TIMESTAMP,
+                                status TEXT,
+                                message_count INTEGER DEFAULT 0
+                            )''')
+            conn.execute('''CREATE TABLE IF NOT EXISTS archive.messages (
+                                id INTEGER PRIMARY KEY,
+                                session_id TEXT NOT NULL,
+                                role TEXT NOT NULL,
+                                content TEXT NOT NULL,
+                                timestamp TIMESTAMP
+                            )''')
+            conn.execute("CREATE INDEX IF NOT EXISTS archive.idx_archive_messages_session ON messages(session_id, id)")
+            yield conn
+        finally:
+            conn.close()
+
+def archive_old_sessions(days=None):
+    """
+    Move sessions idle for more than `days` (default CHAT_ARCHIVE_DAYS) together with
+    their messages into the archive DB, keeping the hot database small.
+    Returns the number of sessions archived.
+    """
+    days = CHAT_ARCHIVE_DAYS if days is None else days
+    if days <= 0:
+        return 0
+    # Timestamps are ISO strings with or without an offset; compare the local part
+    cutoff = (datetime.now(_JAKARTA_TZ) - timedelta(days=days)).strftime("%Y-%m-%dT%H:%M:%S")
+    stale = "SELECT session_id FROM main.sessions WHERE substr(last_activity, 1, 19) < ? AND status != 'processing'"
+    try:
+        with _archive_conn() as conn, conn:
+            c = conn.cursor()
+            c.execute("BEGIN IMMEDIATE")
+            c.execute(f"""INSERT OR REPLACE INTO archive.messages ({_MESSAGE_COLUMNS})
+                          SELECT {_MESSAGE_COLUMNS} FROM main.messages WHERE session_id IN ({stale})""", (cutoff,))
+            c.execute(f"""INSERT OR REPLACE INTO archive.sessions ({_SESSION_COLUMNS})
+                          SELECT {_SESSION_COLUMNS} FROM main.sessions WHERE session_id IN ({stale})""", (cutoff,))
+            archived = c.rowcount
+            c.execute(f"DELETE FROM main.messages WHERE session_id IN ({stale})", (cutoff,))
+            c.execute(f"DELETE FROM main.sessions WHERE session_id IN ({stale})", (cutoff,))
+        _cache_evict(_session_cache)
+        if archived:
+            logger.info("Archived %s sessions idle for more than %s days", archived, days)
+        return archived
+    except Exception as e:
+        logger.error("Error archiving old sessions: %s", e)
+        return 0
+
+def _archived_session_exists(session_id):
+    """
+    Read-only check for a session in the archive DB. Unknown session IDs are common,
+    so a miss must not take the writer lock that a restore needs.
+    """
+    path = _archive_path()
+    if not os.path.exists(path):
+        return False
+    try:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            return conn.execute("SELECT 1 FROM sessions WHERE session_id = ?", (session_id,)).fetchone() is not None
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        # Archive without tables yet (or unreadable): nothing to restore
         return False
 
+def _restore_archived_session(session_id):
+    """Move an archived session back into the main DB (it is being opened again)"""
+    with _archive_conn() as conn, conn:
+        c = conn.cursor()
+        c.execute("BEGIN IMMEDIATE")
+        c.execute(f"""INSERT OR IGNORE INTO main.sessions ({_SESSION_COLUMNS})
+                      SELECT {_SESSION_COLUMNS} FROM archive.sessions WHERE session_id = ?""", (session_id,))
+        if c.rowcount == 0:
+            return None
+        c.execute(f"""INSERT OR IGNORE INTO main.messages ({_MESSAGE_COLUMNS})
+                      SELECT {_MESSAGE_COLUMNS} FROM archive.messages WHERE session_id = ?""", (session_id,))
+        c.execute("DELETE FROM archive.messages WHERE session_id = ?", (session_id,))
+        c.execute("DELETE FROM archive.sessions WHERE session_id = ?", (session_id,))
+        c.execute(SQL_SELECT_SESSION, (session_id,))
+        return c.fetchone()
+
 # Compabitility shims for existing code
 def create_empty_session(username, chatbot_type, session_id):
     create_session(username, chatbot_type, session_id)
@@ -1,12 +1,23 @@
 
 from modules import database, chatbot_utils
-from datetime import datetime
-from zoneinfo import ZoneInfo
 from dotenv import load_dotenv
 import os
+import re
+import time
 from ingestion.insw.insw_qdrant_store import INSWQdrantStore
 import dateutil.parser
 
+try:
+    import orjson
+
+    def _json_loads(data):
+        return orjson.loads(data)
+except ImportError:
+    import json
+
+    def _json_loads(data):
+        return json.loads(data)
+
 load_dotenv()
 
 # Initialize Qdrant client for INSW with correct env vars
@@ -23,6 +34,91 @@ from modules import app_logger
 logger = app_logger.setup_logger()
 llm_logger = app_logger.setup_llm_logger()
 
+# HS codes at 6/8/10-digit level, plain or dotted (8703.21.10); 4-digit headings are
+# left out on purpose so years in a question are not mistaken for codes
+_HS_CODE_RE = re.compile(r"\b\d{4}\.\d{2}(?:\.\d{2}){0,2}\b|\b\d{6}(?:\d{2}){0,2}\b")
+MAX_HS_SUBQUERIES = 5
+MULTI_HS_RESULT_LIMIT = 10
+# Regulations listed per section in the LLM context; the rest are summarized as a count
+_MAX_REGS_PER_SECTION = int(os.getenv("INSW_MAX_REGS_PER_SECTION", "3"))
+# Regulation payload keys in display order, with their context headings
+_REGULATION_SECTIONS = (
+    ("import_regulation", "   [Ketentuan Impor Umum]:\n"),
+    ("import_regulation_border", "   [Ketentuan Impor Border (Pengawasan di Perbatasan)]:\n"),
+    ("import_regulation_post_border", "   [Ketentuan Impor Post-Border (Pengawasan Setelah Keluar Pelabuhan)]:\n"),
+    ("export_regulation", "   [Ketentuan Ekspor]:\n"),
+)
+# Input made only of digits and spaces (e.g. "0101 21") is treated as an HS code lookup
+_HS_NUMERIC_RE = re.compile(r"[\d ]{2,}")
+
+# Entries expire with the ingestion interval so refreshed regulations show up
+_answer_cache = chatbot_utils.SemanticAnswerCache(
+    size=int(os.getenv("INSW_SEMANTIC_CACHE_SIZE", "64")),
+    threshold=float(os.getenv("INSW_SEMANTIC_CACHE_THRESHOLD", "0.92")),
+    ttl=30 * 60
+)
+
+def _canonicalize_query(text):
+    """
+    Lowercase and collapse whitespace; purely numeric input becomes an HS code
+    lookup ("0101 21 00" -> "hs code 01012100", while "0101 8703" keeps both codes)
+    """
+    text = chatbot_utils.normalize_query(text)
+    if _HS_NUMERIC_RE.fullmatch(text):
+        groups = text.split()
+        if len(groups) > 1 and all(len(g) <= 2 for g in groups[1:]) and len("".join(groups)) <= 10:
+            text = "".join(groups)
+        text = f"hs code {text}"
+    return text
+
+def _merge_batch_results(result_lists, limit):
+    """Interleave per-query results (best of each first), dropping duplicate points"""
+    merged, seen = [], set()
+    for rank in range(max((len(r) for r in result_lists), default=0)):
+        for results in result_lists:
+            if rank < len(results) and results[rank]["id"] not in seen:
+                seen.add(results[rank]["id"])
+                merged.append(results[rank])
+                if len(merged) == limit:
+                    return merged
+    return merged
+
+# Constant prompt pieces, built once at import
+_INSW_SYSTEM_PROMPT = """Anda adalah Asisten HS Code untuk regulasi ekspor-impor.
+
+Peran Anda:
+- Memberikan informasi akurat tentang HS Code, regulasi import/export, dan dokumen kepabeanan
+- Menjelaskan ketentuan larangan/pembatasan (Lartas) yang berlaku secara spesifik (Border vs Post-Border)
+- Mengutip dasar hukum/peraturan yang relevan
+- Menggunakan Bahasa Indonesia yang profesional
+- Data yang Anda gunakan berasal dari database HS Code, BUKAN dari pengguna
+
+Format Jawaban:
+1. **Ringkasan**: Jawaban singkat tentang HS Code, uraian barang, dan status regulasinya.
+2. **Detail Regulasi**:
+   - **Impor (Border)**: Ketentuan yang harus dipenuhi di perbatasan (jika ada).
+   - **Impor (Post-Border)**: Ketentuan yang harus dipenuhi setelah keluar pelabuhan (jika ada).
+   - **Ekspor**: Ketentuan ekspor (jika ada).
+3. **Dokumen yang Diperlukan**: Dokumen BC dan perizinan yang dibutuhkan.
+4. **Dasar Hukum**: Peraturan yang menjadi dasar ketentuan.
+5. **Link Referensi**: Sertakan link referensi jika tersedia.
+
+Penting:
+- Selalu sebutkan HS Code lengkap (8 digit)
+- Bedakan dengan jelas antara regulasi Border dan Post-Border
+- Jika ada beberapa HS Code relevan, jelaskan detailnya satu per satu
+- Jika informasi tidak tersedia, nyatakan dengan jelas
+- JANGAN katakan "berdasarkan data yang Anda berikan" - data berasal dari database HS Code, bukan dari pengguna
+- Gunakan frasa seperti "berdasarkan data HS Code" atau "berdasarkan informasi dari database"
+"""
+_INSW_SYSTEM_PROMPT_LEN = len(_INSW_SYSTEM_PROMPT)
+# System turn + model primer, built once; each call only appends its own user turn
+_INSW_CONTENTS_PREFIX = [
+    {"role": "user", "parts": [{"text": _INSW_SYSTEM_PROMPT}]},
+    {"role": "model", "parts": [{"text": "Saya mengerti. Saya akan menjawab pertanyaan tentang regulasi HS Code dengan mengutip HS Code, ketentuan import/export (Border/Post-Border), dan dasar hukum yang relevan."}]},
+]
+_LLM_MODEL = os.getenv("LLM_MODEL", "gemini-2.5-flash")
+
 def _format_date(date_str):
     """Format ISO date string to readable format"""
     if not date_str:
@@ -33,10 +129,32 @@ def _format_date(date_str):
     except:
         return date_str
 
+def _result_document(result: dict) -> dict:
+    """
+    Document fields for a search result. Structured fields live directly in the
+    payload; only points ingested before that change still need their
+    'full_document' JSON string parsed, and that parse is cached on the result.
+    """
+    if "_parsed_full_doc" in result:
+        return result["_parsed_full_doc"]
+    
+    payload = result.get("payload", {})
+    full_doc_str = payload.get("full_document", "")
+    data = payload
+    if "regulations" not in payload and full_doc_str and isinstance(full_doc_str, str):
+        try:
+            data = _json_loads(full_doc_str)
+        except Exception as e:
+            print(f"Error parsing full_document: {e}")
+            data = payload # Fallback to flat payload
+    
+    result["_parsed_full_doc"] = data
+    return data
+
 def _build_insw_context(results: list) -> str:
     """
     Build context string from INSW search results.
-    Parses the 'full_document' JSON to extract comprehensive details including:
+    Reads the structured payload fields written at ingestion to extract comprehensive details including:
     - Hierarchy (Bagian, Bab, Parent Uraian)
     - Detailed Regulations (Import, Border, Post-Border, Export)
     - BC Documents
@@ -50,20 +168,8 @@ def _build_insw_context(results: list) -> str:
     for idx, result in enumerate(results, 1):
         payload = result.get("payload", {})
         
-        # 1. Try to parse 'full_document' JSON string
-        # The payload often contains a 'full_document' string which has the nested structure
-        full_doc_str = payload.get("full_document", "")
-        data = {}
-        
-        if full_doc_str and isinstance(full_doc_str, str):
-            try:
-                import json
-                data = json.loads(full_doc_str)
-            except Exception as e:
-                print(f"Error parsing full_document: {e}")
-                data = payload # Fallback to flat payload
-        else:
-            data = payload # Fallback if no full_document
+        # 1. Document fields (parsed once per result, shared with the date scan)
+        data = _result_document(result)
 
         # 2. Extract Basic Info
         hs_code = data.get("hs_code", "N/A")
@@ -77,12 +183,8 @@ def _build_insw_context(results: list) -> str:
         bab_penjelasan = data.get("bab_penjelasan", [])
         hs_parent_uraian = data.get("hs_parent_uraian", [])
         
-        # 4. Extract Regulations
+        # 4. Extract Regulations (rendered per section below)
         regulations = data.get("regulations", {})
-        import_regs = regulations.get("import_regulation", [])
-        import_border = regulations.get("import_regulation_border", [])
-        import_post_border = regulations.get("import_regulation_post_border", [])
-        export_regs = regulations.get("export_regulation", [])
         
         # 5. Extract Documents & Refs
         bc_documents = data.get("bc_documents", [])
@@ -90,86 +192,94 @@ def _build_insw_context(results: list) -> str:
         link = data.get("link", "")
 
         # --- Build Context String ---
-        item = f"{idx}. HS Code: {hs_code}\n"
-        if deskripsi: item += f"   Deskripsi: {deskripsi}\n"
-        if uraian_barang: item += f"   Uraian Barang: {uraian_barang}\n"
+        # Collect fragments and join once per result instead of repeated str +=
+        parts = [f"{idx}. HS Code: {hs_code}\n"]
+        if deskripsi: parts.append(f"   Deskripsi: {deskripsi}\n")
+        if uraian_barang: parts.append(f"   Uraian Barang: {uraian_barang}\n")
         
         # Hierarchy
         hierarchy_info = []
         if bagian: hierarchy_info.append(f"Bagian {bagian}")
         if bab: hierarchy_info.append(f"Bab {bab}")
         if hierarchy_info:
-            item += f"   Klasifikasi: {', '.join(hierarchy_info)}\n"
+            parts.append(f"   Klasifikasi: {', '.join(hierarchy_info)}\n")
             
         if hs_parent_uraian:
             # Join with arrow for visual hierarchy
-            item += f"   Hierarki: {' > '.join(hs_parent_uraian)}\n"
+            parts.append(f"   Hierarki: {' > '.join(hs_parent_uraian)}\n")
             
         # Regulations Detail
-        if import_regs:
-            item += "   [Ketentuan Impor Umum]:\n"
-            for r in import_regs:
-                item += f"    - {r.get('name', '')}\n"
-                if r.get('legal'): item += f"      Legal: {r.get('legal')}\n"
-
-        if import_border:
-            item += "   [Ketentuan Impor Border (Pengawasan di Perbatasan)]:\n"
-            for r in import_border:
-                item += f"    - {r.get('name', '')}\n"
-                if r.get('legal'): item += f"      Legal: {r.get('legal')}\n"
-
-        if import_post_border:
-            item += "   [Ketentuan Impor Post-Border (Pengawasan Setelah Keluar Pelabuhan)]:\n"
-            for r in import_post_border:
-                item += f"    - {r.get('name', '')}\n"
-                if r.get('legal'): item += f"      Legal: {r.get('legal')}\n"
-
-        if export_regs:
-            item += "   [Ketentuan Ekspor]:\n"
-            for r in export_regs:
-                item += f"    - {r.get('name', '')}\n"
-                if r.get('legal'): item += f"      Legal: {r.get('legal')}\n"
+        for key, heading in _REGULATION_SECTIONS:
+            regs = regulations.get(key)
+            if not regs:
+                continue
+            parts.append(heading)
+            for r in regs[:_MAX_REGS_PER_SECTION]:
+                parts.append(f"    - {r.get('name', '')}\n")
+                if r.get('legal'): parts.append(f"      Legal: {r.get('legal')}\n")
+            if len(regs) > _MAX_REGS_PER_SECTION:
+                parts.append(f"    ... (+{len(regs) - _MAX_REGS_PER_SECTION} lainnya)\n")
 
         # BC Documents
         if bc_documents:
             doc_types = [d.get('type') for d in bc_documents if d.get('type')]
             if doc_types:
-                item += f"   Dokumen BC: {', '.join(doc_types)}\n"
+                parts.append(f"   Dokumen BC: {', '.join(doc_types)}\n")
 
         # Satuan
         if ref_satuan:
             satuan_list = [f"{s.get('ur_satuan')} ({s.get('kd_satuan')})" for s in ref_satuan if s.get('ur_satuan')]
             if satuan_list:
-                item += f"   Satuan: {', '.join(satuan_list)}\n"
+                parts.append(f"   Satuan: {', '.join(satuan_list)}\n")
         
         if link:
-            item += f"   Link Detail: {link}\n"
+            parts.append(f"   Link Detail: {link}\n")
             
-        context_parts.append(item)
+        context_parts.append("".join(parts))
     
     return "\n".join(context_parts)
 
 
-def search_insw_regulation(user_input):
+def _insw_answer_chunks(user_input, stream=False):
     """
-    Search INSW regulations using hybrid search (dense + sparse)
+    Search INSW regulations using hybrid search (dense + sparse) and yield the
+    answer text. With stream=True the LLM answer is yielded as it is generated.
     """
     try:
         # Guardrail: Check for very short/empty input
         if not user_input or len(user_input.strip()) < 2:
-            return "Mohon masukkan kata kunci yang lebih spesifik.\n\n---\n*Untuk informasi lebih lanjut, silakan kunjungi [INSW INTR](https://insw.go.id/intr).*"
-
-        # HS Code Auto-detection: If input is purely numeric, treat as HS Code
-        clean_input = user_input.strip()
-        # Remove spaces to check if it's a number (e.g. "12 34")
-        if clean_input.replace(" ", "").isdigit():
-            user_input = f"hs code {clean_input}"
-
-        # Create embeddings for query
-        query_embedding = chatbot_utils.create_embedding(client, user_input)
-        
-        # Search in Qdrant with hybrid search
-        results = insw_store.search_hybrid(user_input, query_embedding, limit=5)
+            yield "Mohon masukkan kata kunci yang lebih spesifik.\n\n---\n*Untuk informasi lebih lanjut, silakan kunjungi [INSW INTR](https://insw.go.id/intr).*"
+            return
+
+        # One canonical form per question, so "8703", " HS CODE 8703" and
+        # "hs code 8703" share embedding-cache entries and search results;
+        # the prompt and logs keep the user's own text
+        query = _canonicalize_query(user_input)
+
+        hs_codes = list(dict.fromkeys(_HS_CODE_RE.findall(query)))[:MAX_HS_SUBQUERIES]
+        query_embedding = None
+        if len(hs_codes) > 1:
+            # Several HS codes in one question: one sub-query per code, embedded in a
+            # single API call and searched in a single Qdrant batch request
+            sub_queries = [f"hs code {code}" for code in hs_codes]
+            embeddings = chatbot_utils.create_embeddings_batch(client, sub_queries)
+            results = _merge_batch_results(
+                insw_store.search_hybrid_batch(sub_queries, embeddings, limit=5),
+                limit=MULTI_HS_RESULT_LIMIT
+            )
+        else:
+            # Create embeddings for query
+            query_embedding = chatbot_utils.create_embedding(client, query)
+            
+            # A paraphrase of a recent question gets the same answer straight from memory
+            cached_answer = _answer_cache.get(query_embedding, chatbot_utils.query_numbers(query))
+            if cached_answer is not None:
+                logger.info(f"INSW semantic cache hit for '{user_input}'")
+                yield cached_answer
+                return
+            
+            # Search in Qdrant with hybrid search
+            results = insw_store.search_hybrid(query, query_embedding, limit=5)
         
         logger.info(f"INSW Search: '{user_input}' found {len(results)} results")
         
@@ -177,27 +287,18 @@ def search_insw_regulation(user_input):
         max_score = 0.0
         latest_date = None
         
-        if results:
-            max_score = max(r.get('score', 0.0) if isinstance(r, dict) else getattr(r, 'score', 0.0) for r in results)
+        # Single pass for best score and latest modification date
+        for r in results:
+            score = r.get('score', 0.0)
+            if score > max_score:
+                max_score = score
+            
+            # Try top level first, then the (cached) parsed document
+            date_str = r.get('payload', {}).get('lastModifiedDateTime') or _result_document(r).get('lastModifiedDateTime')
             
-            # Extract latest modification date
-            for r in results:
-                payload = r.get('payload', {})
-                # Try top level first, then full_document metadata
-                date_str = payload.get('lastModifiedDateTime')
-                if not date_str:
-                    # Try parsing full_document
-                    try:
-                        import json
-                        full_doc = json.loads(payload.get('full_document', '{}'))
-                        date_str = full_doc.get('lastModifiedDateTime')
-                    except:
-                        pass
-                
-                if date_str:
-                    # Simple string comparison works for ISO dates to find latest
-                    if latest_date is None or date_str > latest_date:
-                        latest_date = date_str
+            # Simple string comparison works for ISO dates to find latest
+            if date_str and (latest_date is None or date_str > latest_date):
+                latest_date = date_str
 
         # Build footer with data date if available
         if latest_date:
@@ -208,44 +309,17 @@ def search_insw_regulation(user_input):
 
         if max_score < chatbot_utils.CONFIDENCE_THRESHOLD:
             logger.warning(f"INSW Low confidence: {max_score} for query '{user_input}'")
-            return "Maaf, saya tidak menemukan informasi regulasi HS Code yang cukup relevan untuk menjawab pertanyaan Anda. Mohon pastikan kata kunci atau HS Code yang Anda masukkan benar." + footer
+            yield "Maaf, saya tidak menemukan informasi regulasi HS Code yang cukup relevan untuk menjawab pertanyaan Anda. Mohon pastikan kata kunci atau HS Code yang Anda masukkan benar." + footer
+            return
         
         if not results:
             logger.warning(f"INSW No results for query '{user_input}'")
-            return "Tidak ditemukan data HS Code yang relevan. Silakan coba kata kunci lain." + footer
+            yield "Tidak ditemukan data HS Code yang relevan. Silakan coba kata kunci lain." + footer
+            return
         
         # Build context from search results
         context = _build_insw_context(results)
         
-        # Generate LLM response with Indonesian system prompt
-        system_prompt = """Anda adalah Asisten HS Code untuk regulasi ekspor-impor.
-
-Peran Anda:
-- Memberikan informasi akurat tentang HS Code, regulasi import/export, dan dokumen kepabeanan
-- Menjelaskan ketentuan larangan/pembatasan (Lartas) yang berlaku secara spesifik (Border vs Post-Border)
-- Mengutip dasar hukum/peraturan yang relevan
-- Menggunakan Bahasa Indonesia yang profesional
-- Data yang Anda gunakan berasal dari database HS Code, BUKAN dari pengguna
-
-Format Jawaban:
-1. **Ringkasan**: Jawaban singkat tentang HS Code, uraian barang, dan status regulasinya.
-2. **Detail Regulasi**:
-   - **Impor (Border)**: Ketentuan yang harus dipenuhi di perbatasan (jika ada).
-   - **Impor (Post-Border)**: Ketentuan yang harus dipenuhi setelah keluar pelabuhan (jika ada).
-   - **Ekspor**: Ketentuan ekspor (jika ada).
-3. **Dokumen yang Diperlukan**: Dokumen BC dan perizinan yang dibutuhkan.
-4. **Dasar Hukum**: Peraturan yang menjadi dasar ketentuan.
-5. **Link Referensi**: Sertakan link referensi jika tersedia.
-
-Penting:
-- Selalu sebutkan HS Code lengkap (8 digit)
-- Bedakan dengan jelas antara regulasi Border dan Post-Border
-- Jika ada beberapa HS Code relevan, jelaskan detailnya satu per satu
-- Jika informasi tidak tersedia, nyatakan dengan jelas
-- JANGAN katakan "berdasarkan data yang Anda berikan" - data berasal dari database HS Code, bukan dari pengguna
-- Gunakan frasa seperti "berdasarkan data HS Code" atau "berdasarkan informasi dari database"
-"""
-
         user_message = f"""Konteks:
 {context}
 
@@ -254,36 +328,54 @@ Pertanyaan: {user_input}
 Berikan jawaban yang komprehensif berdasarkan konteks di atas."""
 
         # Use the global client instance
-        start_time = datetime.now(ZoneInfo("Asia/Jakarta"))
-        response = client.models.generate_content(
-            model=os.getenv("LLM_MODEL", "gemini-2.5-flash"),
-            contents=[
-                {"role": "user", "parts": [{"text": system_prompt}]},
-                {"role": "model", "parts": [{"text": "Saya mengerti. Saya akan menjawab pertanyaan tentang regulasi HS Code dengan mengutip HS Code, ketentuan import/export (Border/Post-Border), dan dasar hukum yang relevan."}]},
-                {"role": "user", "parts": [{"text": user_message}]}
-            ]
-        )
-        end_time = datetime.now(ZoneInfo("Asia/Jakarta"))
-        duration = (end_time - start_time).total_seconds()
+        start_time = time.perf_counter()
+        contents = _INSW_CONTENTS_PREFIX + [{"role": "user", "parts": [{"text": user_message}]}]
+        if stream:
+            # Hand each chunk on as it arrives so the first tokens reach the user early
+            text_parts = []
+            for chunk in client.models.generate_content_stream(
+                model=_LLM_MODEL,
+                contents=contents
+            ):
+                if chunk.text:
+                    text_parts.append(chunk.text)
+                    yield chunk.text
+            response_text = "".join(text_parts)
+        else:
+            response = client.models.generate_content(
+                model=_LLM_MODEL,
+                contents=contents
+            )
+            response_text = response.text
+            yield response_text
+        duration = time.perf_counter() - start_time
         
         # Log LLM analytics
         llm_logger.info("INSW LLM Call", extra={
             "query": user_input,
             "duration": duration,
-            "model": os.getenv("LLM_MODEL", "gemini-2.5-flash"),
-            "input_chars": len(system_prompt) + len(user_message),
-            "output_chars": len(response.text)
+            "model": _LLM_MODEL,
+            "input_chars": _INSW_SYSTEM_PROMPT_LEN + len(user_message),
+            "output_chars": len(response_text),
+            "embedding_cache": chatbot_utils.embedding_cache_info()
         })
         
-        return response.text + footer
+        yield footer
+        if query_embedding is not None:
+            _answer_cache.put(query_embedding, chatbot_utils.query_numbers(query), response_text + footer)
 
     except Exception as e:
         logger.error(f"Error searching INSW regulations: {e}", exc_info=True)
         import traceback
         traceback.print_exc()
-        return f"❌ Error: {str(e)}\n\nSilakan coba lagi atau hubungi administrator.\n\n---\n*Untuk informasi lebih lanjut, silakan kunjungi [INSW INTR](https://insw.go.id/intr).*"
+        yield f"❌ Error: {str(e)}\n\nSilakan coba lagi atau hubungi administrator.\n\n---\n*Untuk informasi lebih lanjut, silakan kunjungi [INSW INTR](https://insw.go.id/intr).*"
 
-        
 
+def search_insw_regulation(user_input):
+    """Answer an INSW question and return the complete response text"""
+    return "".join(_insw_answer_chunks(user_input))
 
 
+def stream_insw_regulation(user_input):
+    """Answer an INSW question, yielding text chunks as the LLM produces them"""
+    return _insw_answer_chunks(user_input, stream=True)
@@ -2,11 +2,82 @@
 LLM Logger Module - Track all LLM interactions for developer dashboard
 Logs: requests, responses, token usage, latency, errors
 """
+import os
 import time
+import queue
+import atexit
+import threading
 from datetime import datetime
 from typing import Optional, Dict, Any, List
-from modules.database import SQLITE_DB_PATH
-import sqlite3
+from modules import database
+
+# Fire-and-forget logging
+# log_call only puts the row on a queue; a daemon thread drains whatever has
+# piled up (up to LOG_FLUSH_BATCH rows) and writes it with one executemany per
+# transaction, so no request waits on SQLite. Error rows skip the queue and are
+# written immediately so they are never lost; the rest is flushed at exit.
+LOG_FLUSH_BATCH = int(os.getenv("LLM_LOG_FLUSH_BATCH", "100"))
+
+# Statements kept as module constants so every call hits the same entry in
+# the pooled connection's prepared-statement cache
+SQL_INSERT_LLM_LOG = """
+    INSERT INTO llm_logs 
+    (session_id, username, chatbot_type, status, input_tokens, output_tokens, 
+     latency_ms, error_message, query)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+# Rollup rows are keyed by the UTC day, matching created_at's CURRENT_TIMESTAMP
+SQL_UPSERT_LLM_DAILY = """
+    INSERT INTO llm_logs_daily
+    (date, chatbot_type, status, calls, input_tokens, output_tokens, sum_latency, n_latency)
+    VALUES (DATE('now'), ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(date, chatbot_type, status) DO UPDATE SET
+        calls = calls + excluded.calls,
+        input_tokens = input_tokens + excluded.input_tokens,
+        output_tokens = output_tokens + excluded.output_tokens,
+        sum_latency = sum_latency + excluded.sum_latency,
+        n_latency = n_latency + excluded.n_latency
+"""
+SQL_LLM_TOTALS = """
+    SELECT 
+        SUM(calls) as total,
+        SUM(CASE WHEN status = 'answered' THEN calls ELSE 0 END) as answered,
+        SUM(CASE WHEN status = 'unanswered' THEN calls ELSE 0 END) as unanswered,
+        SUM(CASE WHEN status = 'error' THEN calls ELSE 0 END) as errors,
+        SUM(input_tokens) as total_input_tokens,
+        SUM(output_tokens) as total_output_tokens,
+        CAST(SUM(sum_latency) AS REAL) / NULLIF(SUM(n_latency), 0) as avg_latency_ms
+    FROM llm_logs_daily
+"""
+SQL_LLM_DAILY = """
+    SELECT 
+        date,
+        SUM(calls) as calls,
+        SUM(input_tokens + output_tokens) as tokens
+    FROM llm_logs_daily
+    WHERE date >= DATE('now', '-7 days')
+    GROUP BY date
+    ORDER BY date ASC
+"""
+
+# Stored query / error text is capped in UTF-8 bytes, not characters,
+# so multibyte text cannot make rows wider than intended
+LOG_TEXT_MAX_BYTES = 500
+
+def _trunc(text: Optional[str], max_bytes: int = LOG_TEXT_MAX_BYTES) -> Optional[str]:
+    if not text:
+        return None
+    encoded = text.encode("utf-8")
+    if len(encoded) <= max_bytes:
+        return text
+    # errors="ignore" drops a multibyte character cut in half at the boundary
+    return encoded[:max_bytes].decode("utf-8", errors="ignore")
+
+_LOG_QUEUE = queue.SimpleQueue()
+_flusher = None
+_flusher_lock = threading.Lock()
+# Longest flush() waits for the flusher thread to catch up
+LOG_FLUSH_TIMEOUT = 10
 
 class LLMLogger:
     """Logger for tracking LLM calls and token usage"""
@@ -27,37 +98,54 @@ class LLMLogger:
         error_message: Optional[str] = None,
         query: Optional[str] = None
     ) -> bool:
-        """Log an LLM call to the database"""
+        """Log an LLM call to the database (queued unless status is error)"""
+        row = (session_id, username, chatbot_type, status, input_tokens, output_tokens,
+               latency_ms, _trunc(error_message), _trunc(query))
+        if status == LLMLogger.STATUS_ERROR:
+            return LLMLogger.log_calls_batch([row])
+        _LOG_QUEUE.put(row)
+        _ensure_flusher()
+        return True
+
+    @staticmethod
+    def log_calls_batch(rows) -> bool:
+        """Write several llm_logs rows in a single transaction"""
+        if not rows:
+            return True
         try:
-            conn = sqlite3.connect(SQLITE_DB_PATH)
-            c = conn.cursor()
-            c.execute("""
-                INSERT INTO llm_logs 
-                (session_id, username, chatbot_type, status, input_tokens, output_tokens, 
-                 latency_ms, error_message, query)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (session_id, username, chatbot_type, status, input_tokens, output_tokens,
-                  latency_ms, error_message, query[:500] if query else None))
-            conn.commit()
-            conn.close()
+            with database.conn_ctx(write=True) as conn, conn:
+                conn.executemany(SQL_INSERT_LLM_LOG, rows)
+                conn.executemany(SQL_UPSERT_LLM_DAILY, _rollup(rows))
             return True
         except Exception as e:
-            print(f"Error logging LLM call: {e}")
+            print(f"Error logging LLM calls: {e}")
             return False
+
+    @staticmethod
+    def flush() -> bool:
+        """Write out everything queued so far; returns once it is on disk"""
+        if _flusher is None or not _flusher.is_alive():
+            return _write_batch(_drain())
+        # The queue is FIFO, so once the flusher reaches this marker every
+        # earlier row has been written
+        done = threading.Event()
+        _LOG_QUEUE.put(done)
+        return done.wait(LOG_FLUSH_TIMEOUT)
     
     @staticmethod
     def get_logs(
         limit: int = 50,
         offset: int = 0,
         status_filter: Optional[str] = None,
-        chatbot_type_filter: Optional[str] = None
+        chatbot_type_filter: Optional[str] = None,
+        before_id: Optional[int] = None
     ) -> List[Dict[str, Any]]:
-        """Get paginated LLM logs"""
+        """
+        Get paginated LLM logs, newest first.
+        Pass the id of the last row seen as before_id to fetch the next page
+        straight from the index instead of skipping `offset` rows.
+        """
         try:
-            conn = sqlite3.connect(SQLITE_DB_PATH)
-            conn.row_factory = sqlite3.Row
-            c = conn.cursor()
-            
             query = "SELECT * FROM llm_logs WHERE 1=1"
             params = []
             
@@ -68,12 +156,21 @@ class LLMLogger:
                 query += " AND chatbot_type = ?"
                 params.append(chatbot_type_filter)
             
-            query += " ORDER BY created_at DESC LIMIT ? OFFSET ?"
+            if before_id is not None:
+                query += " AND (created_at, id) < (SELECT created_at, id FROM llm_logs WHERE id = ?)"
+                params.append(before_id)
+                offset = 0
+            
+            query += " ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?"
             params.extend([limit, offset])
             
-            c.execute(query, params)
-            logs = [dict(row) for row in c.fetchall()]
-            conn.close()
+            with database.conn_ctx() as conn:
+                # Plain tuples zipped with the column names, skipping the sqlite3.Row layer
+                c = conn.cursor()
+                c.row_factory = None
+                c.execute(query, params)
+                cols = [d[0] for d in c.description]
+                logs = [dict(zip(cols, r)) for r in c.fetchall()]
             return logs
         except Exception as e:
             print(f"Error getting LLM logs: {e}")
@@ -83,38 +180,13 @@ class LLMLogger:
     def get_stats() -> Dict[str, Any]:
         """Get aggregate statistics for developer dashboard"""
         try:
-            conn = sqlite3.connect(SQLITE_DB_PATH)
-            c = conn.cursor()
-            
-            # Total counts by status
-            c.execute("""
-                SELECT 
-                    COUNT(*) as total,
-                    SUM(CASE WHEN status = 'answered' THEN 1 ELSE 0 END) as answered,
-                    SUM(CASE WHEN status = 'unanswered' THEN 1 ELSE 0 END) as unanswered,
-                    SUM(CASE WHEN status = 'error' THEN 1 ELSE 0 END) as errors,
-                    SUM(input_tokens) as total_input_tokens,
-                    SUM(output_tokens) as total_output_tokens,
-                    AVG(latency_ms) as avg_latency_ms
-                FROM llm_logs
-            """)
-            row = c.fetchone()
-            
-            # Daily stats for chart (last 7 days)
-            c.execute("""
-                SELECT 
-                    DATE(created_at) as date,
-                    COUNT(*) as calls,
-                    SUM(input_tokens + output_tokens) as tokens
-                FROM llm_logs
-                WHERE created_at >= DATE('now', '-7 days')
-                GROUP BY DATE(created_at)
-                ORDER BY date ASC
-            """)
-            daily_stats = [{"date": r[0], "calls": r[1], "tokens": r[2]} for r in c.fetchall()]
-            
-            conn.close()
-            
+            with database.conn_ctx() as conn:
+                # Total counts by status
+                row = conn.execute(SQL_LLM_TOTALS).fetchone()
+                # Daily stats for chart (last 7 days)
+                daily_stats = [{"date": r[0], "calls": r[1], "tokens": r[2]}
+                               for r in conn.execute(SQL_LLM_DAILY).fetchall()]
+
             return {
                 "total": row[0] or 0,
                 "answered": row[1] or 0,
@@ -133,6 +205,50 @@ class LLMLogger:
                 "avg_latency_ms": 0, "daily_stats": []
             }
 
+def _rollup(rows):
+    """Sum llm_logs rows per (chatbot_type, status) for the daily rollup upsert"""
+    totals = {}
+    for _, _, chatbot_type, status, input_tokens, output_tokens, latency_ms, _, _ in rows:
+        t = totals.setdefault((chatbot_type, status), [0, 0, 0, 0, 0])
+        t[0] += 1
+        t[1] += input_tokens or 0
+        t[2] += output_tokens or 0
+        t[3] += latency_ms or 0
+        t[4] += 1
+    return [(chatbot_type, status, *t) for (chatbot_type, status), t in totals.items()]
+
+def _drain(first=None, limit=None):
+    """Take queued rows without blocking (all of them unless limit is given)"""
+    rows = [] if first is None else [first]
+    while limit is None or len(rows) < limit:
+        try:
+            rows.append(_LOG_QUEUE.get_nowait())
+        except queue.Empty:
+            break
+    return rows
+
+def _write_batch(items):
+    """Write drained rows, then release any flush() calls waiting on markers in the batch"""
+    rows = [item for item in items if not isinstance(item, threading.Event)]
+    ok = LLMLogger.log_calls_batch(rows)
+    for item in items:
+        if isinstance(item, threading.Event):
+            item.set()
+    return ok
+
+def _flush_loop():
+    while True:
+        # Block for the next row, then batch up whatever queued behind it
+        _write_batch(_drain(_LOG_QUEUE.get(), LOG_FLUSH_BATCH))
+
+def _ensure_flusher():
+    global _flusher
+    if _flusher is None:
+        with _flusher_lock:
+            if _flusher is None:
+                _flusher = threading.Thread(target=_flush_loop, name="llm-log-flusher", daemon=True)
+                _flusher.start()
+
 # Helper class for timing LLM calls
 class LLMCallTimer:
     """Context manager for timing LLM calls"""
@@ -141,12 +257,15 @@ class LLMCallTimer:
         self.latency_ms = 0
     
     def __enter__(self):
-        self.start_time = time.time()
+        # Monotonic, ns resolution: unaffected by clock adjustments
+        self.start_time = time.perf_counter_ns()
         return self
     
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.latency_ms = int((time.time() - self.start_time) * 1000)
+        self.latency_ms = (time.perf_counter_ns() - self.start_time) // 1_000_000
         return False
 
 # Global instance
 llm_logger = LLMLogger()
+# The flusher is a daemon thread; write out anything still queued on exit
+atexit.register(LLMLogger.flush)
@@ -1,23 +1,94 @@
 
 import os
+import asyncio
+import base64
+import hashlib
+import functools
 import requests
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 
-# Robust import for google.genai
+from modules import database
+
+# google.genai is imported on the first OCRService() instead of at module import,
+# so importing the ingestion pipelines stays cheap
 genai = None
-try:
-    from google import genai
-    from google.genai import types
-except ImportError:
+types = None
+_genai_imported = False
+
+def _import_genai():
+    """Robust import for google.genai; runs the import ladder once per process"""
+    global genai, types, _genai_imported
+    if _genai_imported:
+        return genai
     try:
-        import google.genai as genai
+        from google import genai
         from google.genai import types
     except ImportError:
         try:
-            import google.generativeai as genai
-            types = None # Old SDK doesn't use types.Part in same way
+            import google.genai as genai
+            from google.genai import types
         except ImportError:
-            pass
+            try:
+                import google.generativeai as genai
+                types = None # Old SDK doesn't use types.Part in same way
+            except ImportError:
+                pass
+    _genai_imported = True
+    return genai
+
+# Files larger than this are sent through the Gemini Files API, which streams
+# them from disk, instead of being read and base64-inlined into the request
+OCR_INLINE_MAX_BYTES = int(os.getenv("OCR_INLINE_MAX_BYTES", str(8 * 1024 * 1024)))
+# Concurrent Gemini requests for process_many (bounded by the API quota)
+OCR_MAX_CONCURRENCY = int(os.getenv("OCR_MAX_CONCURRENCY", "4"))
+
+# Prompts are built once at import; only the question is filled in per call
+_OCR_PROMPT = """
+Task: Extract the exact text content from this document page.
+Rules:
+1. Extract ONLY the text visible on the page. Do NOT add any words, interpretations, or descriptions.
+2. Maintain the strict reading order (top-to-bottom, left-to-right).
+3. If a section is a table, extract the text row-by-row, cell-by-cell, separated by spaces or tabs, preserving the order.
+4. Ignore purely visual elements like shapes or icons unless they contain text labels.
+5. Do NOT use Markdown formatting (no headers, no bolding). Just plain text.
+6. Strictly follow the primary language of the document.
+7. Output nothing but the extracted text.
+"""
+
+_ANSWER_TEMPLATE = """Pertanyaan: {question}
+
+Lihat gambar di bawah dan jawab pertanyaan di atas secara langsung.
+
+Aturan:
+1. Jawab pertanyaan secara LANGSUNG tanpa menyebut "gambar", "screenshot", "berdasarkan gambar", dll.
+2. Tulis jawaban seolah-olah Anda yang mengetahui informasinya, bukan mengekstrak dari gambar.
+3. Jika gambar menunjukkan langkah-langkah, jelaskan langkah-langkahnya secara jelas.
+4. Jika gambar menunjukkan data/tabel, sajikan informasinya secara terstruktur.
+5. Gunakan Bahasa Indonesia.
+6. Langsung pada inti jawaban, JANGAN awali dengan "Jawaban:" atau pengantar lainnya.
+
+Jawaban:"""
+
+def _file_sha256(path: str) -> str:
+    """SHA-256 of a file, streamed from disk in fixed-size chunks"""
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+@functools.lru_cache(maxsize=4)
+def _get_gemini_client(api_key: str):
+    """One Gemini client per API key, shared by every OCRService (keeps connections alive)"""
+    return genai.Client(api_key=api_key)
+
+_EXT_MIME = {'.pdf': 'application/pdf', '.jpg': 'image/jpeg', '.jpeg': 'image/jpeg', '.png': 'image/png'}
+
+def _sniff_image_mime(image_bytes: bytes) -> str:
+    """MIME type from the image's magic bytes, defaulting to PNG"""
+    head = bytes(image_bytes[:4])
+    if head[:3] == b'\xff\xd8\xff':
+        return "image/jpeg"
+    if head == b'GIF8':
+        return "image/gif"
+    return "image/png"
 
 class OCRService:
     def __init__(self, api_url: str = None, api_key: str = None, gemini_api_key: str = None):
@@ -26,9 +97,9 @@ class OCRService:
         self.gemini_api_key = gemini_api_key or os.getenv('GEMINI_API_KEY')
         
         self.gemini_client = None
-        if self.gemini_api_key and genai:
+        if self.gemini_api_key and _import_genai():
              try:
-                self.gemini_client = genai.Client(api_key=self.gemini_api_key)
+                self.gemini_client = _get_gemini_client(self.gemini_api_key)
              except Exception as e:
                 print(f"Warning: Failed to init Gemini client in OCRService: {e}")
         
@@ -55,74 +126,136 @@ class OCRService:
              return None
              
         try:
-             import base64
+             # MIME type detection
+             mime_type = _EXT_MIME.get(os.path.splitext(file_path)[1].lower(), "application/pdf")
+             prompt = _OCR_PROMPT
+
+             # Identical content already transcribed by this model: skip the API call.
+             # The hash is streamed from disk, so a cache hit never loads the file.
+             digest = _file_sha256(file_path)
+             cached = database.get_cached_ocr(digest, model_name)
+             if cached is not None:
+                 return cached
+
+             # Large files: upload instead of holding the bytes and their base64 copy
+             if (types and hasattr(types, 'Part') and hasattr(self.gemini_client, 'files')
+                     and os.path.getsize(file_path) > OCR_INLINE_MAX_BYTES):
+                 return self._remember(digest, model_name,
+                                       self._process_uploaded(file_path, mime_type, prompt, model_name))
              
-             # Read file
+             # Read file (cache miss only)
              with open(file_path, "rb") as f:
                  file_content = f.read()
-                 
-             # MIME type detection
-             mime_type = "application/pdf"
-             if file_path.lower().endswith(('.jpg', '.jpeg')):
-                 mime_type = "image/jpeg"
-             elif file_path.lower().endswith('.png'):
-                 mime_type = "image/png"
-                 
-             # Prompt
-             prompt = """
-Task: Extract the exact text content from this document page.
-Rules:
-1. Extract ONLY the text visible on the page. Do NOT add any words, interpretations, or descriptions.
-2. Maintain the strict reading order (top-to-bottom, left-to-right).
-3. If a section is a table, extract the text row-by-row, cell-by-cell, separated by spaces or tabs, preserving the order.
-4. Ignore purely visual elements like shapes or icons unless they contain text labels.
-5. Do NOT use Markdown formatting (no headers, no bolding). Just plain text.
-6. Strictly follow the primary language of the document.
-7. Output nothing but the extracted text.
-"""
              
-             # Prepare content depending on SDK version (assuming new SDK based on imports)
-             # Check if we have types.Part (New SDK)
-             if types and hasattr(types, 'Part'):
-                 parts = [
-                     types.Part(text=prompt),
-                     types.Part(
-                         inline_data=types.Blob(
-                             mime_type=mime_type,
-                             data=base64.b64encode(file_content).decode('utf-8')
-                         )
-                     )
-                 ]
-                 
-                 response = self.gemini_client.models.generate_content(
-                     model=model_name,
-                     contents=[types.Content(role="user", parts=parts)]
-                 )
-                 
-             else:
-                 # Fallback to old SDK usage pattern if types not available or init differently
-                 # But self.gemini_client construction implies new SDK (genai.Client)
-                 # If old SDK (google.generativeai), the client structure is different (GenerativeModel)
-                 # We assume new SDK per check_genai.py results users environment
-                 
-                 # Basic fallback for new SDK without types helper if needed
-                 b64_data = base64.b64encode(file_content).decode('utf-8')
-                 response = self.gemini_client.models.generate_content(
-                     model=model_name,
-                     contents=[
-                         {"role": "user", "parts": [
-                             {"text": prompt},
-                             {"inline_data": {"mime_type": mime_type, "data": b64_data}}
-                         ]}
-                     ]
-                 )
-                 
-             return response.text.strip()
+             response = self.gemini_client.models.generate_content(
+                 model=model_name,
+                 contents=self._inline_contents(prompt, file_content, mime_type)
+             )
+             return self._remember(digest, model_name, response.text.strip())
              
         except Exception as e:
             print(f"GenAI OCR Error: {e}")
             return None
 
+    async def process_with_genai_async(self, file_path: str, model_name: str = "gemini-2.5-flash") -> Optional[str]:
+        """Async twin of process_with_genai, so several files can be OCR'd concurrently"""
+        if not self.gemini_client:
+            print("Gemini client not initialized via OCRService")
+            return None
+        if not hasattr(self.gemini_client, 'aio'):
+            return await asyncio.to_thread(self.process_with_genai, file_path, model_name)
+        if not os.path.exists(file_path):
+            print(f"File not found for GenAI OCR: {file_path}")
+            return None
+
+        try:
+            mime_type = _EXT_MIME.get(os.path.splitext(file_path)[1].lower(), "application/pdf")
+            if hasattr(self.gemini_client, 'files') and os.path.getsize(file_path) > OCR_INLINE_MAX_BYTES:
+                # Upload path (hash, cache lookup, upload) is blocking; keep it off the event loop
+                return await asyncio.to_thread(self.process_with_genai, file_path, model_name)
+
+            # Hashing, the cache lookup and the file read block; only the API call awaits on the loop
+            digest, cached, file_content = await asyncio.to_thread(self._load_uncached, file_path, model_name)
+            if cached is not None:
+                return cached
+            response = await self.gemini_client.aio.models.generate_content(
+                model=model_name,
+                contents=self._inline_contents(_OCR_PROMPT, file_content, mime_type)
+            )
+            # The cache write is a SQLite write transaction; keep it off the loop too
+            return await asyncio.to_thread(self._remember, digest, model_name, response.text.strip())
+        except Exception as e:
+            print(f"GenAI OCR Error: {e}")
+            return None
+
+    async def process_many(self, file_paths: List[str], model_name: str = "gemini-2.5-flash",
+                           max_concurrency: int = OCR_MAX_CONCURRENCY,
+                           semaphore: Optional[asyncio.Semaphore] = None) -> List[Optional[str]]:
+        """
+        OCR several files concurrently, at most max_concurrency requests in flight.
+        Pass a shared semaphore to bound requests across several concurrent calls.
+        Returns one result per path, in order (None where OCR failed).
+        """
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def _one(path):
+            async with semaphore:
+                return await self.process_with_genai_async(path, model_name)
+
+        results = await asyncio.gather(*[_one(p) for p in file_paths], return_exceptions=True)
+        return [None if isinstance(r, BaseException) else r for r in results]
+
+    @staticmethod
+    def _load_uncached(file_path: str, model_name: str):
+        """(digest, cached_text, None) on a cache hit, else (digest, None, file_bytes)"""
+        digest = _file_sha256(file_path)
+        cached = database.get_cached_ocr(digest, model_name)
+        if cached is not None:
+            return digest, cached, None
+        with open(file_path, "rb") as f:
+            return digest, None, f.read()
+
+    @staticmethod
+    def _remember(digest: str, model_name: str, text: Optional[str]) -> Optional[str]:
+        """Store a non-empty result in the OCR cache and hand it back"""
+        if text:
+            database.cache_ocr_result(digest, model_name, text)
+        return text
+
+    @staticmethod
+    def _inline_contents(prompt: str, data: bytes, mime_type: str) -> list:
+        """Request contents with the prompt and the file inlined as base64"""
+        b64_data = base64.b64encode(memoryview(data)).decode('ascii')
+        # New SDK exposes types.Part; otherwise fall back to plain dicts
+        if types and hasattr(types, 'Part'):
+            return [types.Content(role="user", parts=[
+                types.Part(text=prompt),
+                types.Part(inline_data=types.Blob(mime_type=mime_type, data=b64_data))
+            ])]
+        return [{"role": "user", "parts": [
+            {"text": prompt},
+            {"inline_data": {"mime_type": mime_type, "data": b64_data}}
+        ]}]
+
+    def _process_uploaded(self, file_path: str, mime_type: str, prompt: str, model_name: str) -> str:
+        """OCR a large file via the Files API; the upload is deleted once answered"""
+        uploaded = self.gemini_client.files.upload(file=file_path, config={"mime_type": mime_type})
+        try:
+            response = self.gemini_client.models.generate_content(
+                model=model_name,
+                contents=[types.Content(role="user", parts=[
+                    types.Part(text=prompt),
+                    types.Part.from_uri(file_uri=uploaded.uri, mime_type=mime_type)
+                ])]
+            )
+        finally:
+            try:
+                self.gemini_client.files.delete(name=uploaded.name)
+            except Exception as e:
+                print(f"Warning: Failed to delete uploaded OCR file {uploaded.name}: {e}")
+        return response.text.strip()
+
     def analyze_image_answer(self, image_bytes: bytes, question: str, model_name: str = "gemini-2.5-flash") -> Optional[str]:
         """
         Analyze an image and generate an answer based on the question context.
@@ -141,34 +274,22 @@ Rules:
             return None
             
         try:
-            import base64
+            # The question is part of the key, so a different question re-asks the model
+            hasher = hashlib.sha256(image_bytes)
+            hasher.update(question.encode("utf-8"))
+            digest = hasher.hexdigest()
+            cached = database.get_cached_ocr(digest, model_name)
+            if cached is not None:
+                return cached
             
             # Detect MIME type from magic bytes
-            mime_type = "image/png"  # default
-            if image_bytes[:3] == b'\xff\xd8\xff':
-                mime_type = "image/jpeg"
-            elif image_bytes[:4] == b'\x89PNG':
-                mime_type = "image/png"
-            elif image_bytes[:4] == b'GIF8':
-                mime_type = "image/gif"
+            mime_type = _sniff_image_mime(image_bytes)
             
             # Prompt that instructs Gemini to answer the question based on image
-            prompt = f"""Pertanyaan: {question}
-
-Lihat gambar di bawah dan jawab pertanyaan di atas secara langsung.
-
-Aturan:
-1. Jawab pertanyaan secara LANGSUNG tanpa menyebut "gambar", "screenshot", "berdasarkan gambar", dll.
-2. Tulis jawaban seolah-olah Anda yang mengetahui informasinya, bukan mengekstrak dari gambar.
-3. Jika gambar menunjukkan langkah-langkah, jelaskan langkah-langkahnya secara jelas.
-4. Jika gambar menunjukkan data/tabel, sajikan informasinya secara terstruktur.
-5. Gunakan Bahasa Indonesia.
-6. Langsung pada inti jawaban, JANGAN awali dengan "Jawaban:" atau pengantar lainnya.
-
-Jawaban:"""
+            prompt = _ANSWER_TEMPLATE.format(question=question)
             
             # Prepare content
-            b64_data = base64.b64encode(image_bytes).decode('utf-8')
+            b64_data = base64.b64encode(memoryview(image_bytes)).decode('ascii')
             
             if types and hasattr(types, 'Part'):
                 parts = [
@@ -196,7 +317,7 @@ Jawaban:"""
                     ]
                 )
                 
-            return response.text.strip()
+            return self._remember(digest, model_name, response.text.strip())
             
         except Exception as e:
             print(f"Image Analysis Error: {e}")
@@ -2,10 +2,14 @@ from modules import database, chatbot_utils, app_logger
 from datetime import datetime
 from zoneinfo import ZoneInfo
 import os
+import json
+import time
+import traceback
+import urllib.parse
 from typing import List, Dict, Any
 from dotenv import load_dotenv
 from qdrant_client import QdrantClient
-from qdrant_client.models import Prefetch, FusionQuery
+from qdrant_client.models import Prefetch, FusionQuery, SearchParams, QuantizationSearchParams, PayloadSelectorInclude
 from functools import lru_cache
 
 load_dotenv()
@@ -17,29 +21,69 @@ client = chatbot_utils.init_gemini_client()
 logger = app_logger.setup_logger()
 llm_logger = app_logger.setup_llm_logger()
 
+COLLECTION_NAME = os.getenv('OTHERS_QDRANT_COLLECTION_NAME', 'others_documents')
+LLM_MODEL = os.getenv('LLM_MODEL', 'gemini-2.5-flash')
+
+# HNSW candidate list size per query; 64 is plenty for top-5 (raise to 96 if recall drops)
+OTHERS_HNSW_EF = int(os.getenv("OTHERS_HNSW_EF", "64"))
+
+# The collection stores int8-quantized vectors: search those first, then
+# rescore 2x the requested candidates with the full float32 vectors
+_SEARCH_PARAMS = SearchParams(
+    hnsw_ef=OTHERS_HNSW_EF,
+    quantization=QuantizationSearchParams(rescore=True, oversampling=2.0)
+)
+
+# Recent answers reused for near-identical questions; entries expire with the
+# 30-minute ingestion interval so updated documents show up
+_answer_cache = chatbot_utils.SemanticAnswerCache(
+    size=int(os.getenv("OTHERS_SEMANTIC_CACHE_SIZE", "64")),
+    threshold=float(os.getenv("OTHERS_SEMANTIC_CACHE_THRESHOLD", "0.97")),
+    ttl=30 * 60
+)
+
+# Minimum score for a hit to be used without the LLM relevancy check
+STRICT_SCORE_THRESHOLD = 0.35
+
+# Context sent to the model is capped by an estimated token count (Gemini averages
+# ~4 characters per token; counting exactly would cost an extra API round trip)
+OTHERS_CONTEXT_TOKEN_BUDGET = int(os.getenv("OTHERS_CONTEXT_TOKEN_BUDGET", "4096"))
+_CHARS_PER_TOKEN = 4
+# Chunks scoring this far below the best hit add tokens but rarely the answer
+CONTEXT_SCORE_MARGIN = float(os.getenv("OTHERS_CONTEXT_SCORE_MARGIN", "0.15"))
+
+# Only the payload fields the context builder reads come back from searches
+_SEARCH_PAYLOAD = PayloadSelectorInclude(include=["content", "filename", "webUrl"])
+
+# gRPC (protobuf over one persistent HTTP/2 channel) instead of REST/JSON for searches
+OTHERS_QDRANT_PREFER_GRPC = os.getenv("OTHERS_QDRANT_PREFER_GRPC", "true").lower() == "true"
+OTHERS_QDRANT_GRPC_PORT = int(os.getenv("OTHERS_QDRANT_GRPC_PORT", "6334"))
+
 # Initialize Qdrant Client (Global/Cached)
 @lru_cache(maxsize=1)
 def get_qdrant_client():
     url = os.getenv('SOP_QDRANT_URL') 
     api_key = os.getenv('SOP_QDRANT_API_KEY')
     # Using same credentials as SOP for now, assuming shared instance
-    return QdrantClient(url=url, api_key=api_key)
+    return QdrantClient(url=url, api_key=api_key, prefer_grpc=OTHERS_QDRANT_PREFER_GRPC,
+                        grpc_port=OTHERS_QDRANT_GRPC_PORT, timeout=10)
 
 def _search_others_collection(query_vector: List[float], query_text: str, limit: int = 5, threshold: float = 0.45) -> List[Dict[str, Any]]:
     """
     Search Others (unstructured) documents collection with STRICT filtering.
     """
-    collection_name = os.getenv('OTHERS_QDRANT_COLLECTION_NAME', 'others_documents')
     qdrant_client = get_qdrant_client()
     
     try:
         # Use query_points instead of search (search deprecated/missing in this version)
         result_obj = qdrant_client.query_points(
-            collection_name=collection_name,
+            collection_name=COLLECTION_NAME,
             query=query_vector,
             limit=limit,
             score_threshold=threshold,
-            with_payload=True
+            search_params=_SEARCH_PARAMS,
+            with_payload=_SEARCH_PAYLOAD,
+            with_vectors=False
         )
         results = result_obj.points
         
@@ -65,6 +109,27 @@ def _search_others_collection(query_vector: List[float], query_text: str, limit:
         print(f"Error searching others collection: {str(e)}")
         return []
 
+def _select_context_chunks(others_results: List[Dict]) -> List[Dict]:
+    """
+    Best-first chunks that fit OTHERS_CONTEXT_TOKEN_BUDGET. Chunks scoring more than
+    CONTEXT_SCORE_MARGIN below the top hit are dropped; the last chunk that fits
+    is cut to the remaining budget.
+    """
+    ranked = sorted(others_results, key=lambda r: r.get('score', 0), reverse=True)
+    floor = ranked[0].get('score', 0) - CONTEXT_SCORE_MARGIN
+    
+    remaining = OTHERS_CONTEXT_TOKEN_BUDGET * _CHARS_PER_TOKEN
+    selected = []
+    for item in ranked:
+        if item.get('score', 0) < floor or remaining <= 0:
+            break
+        content = item.get('content', '').strip()
+        if len(content) > remaining:
+            content = content[:remaining] + "..."
+        remaining -= len(content)
+        selected.append({**item, 'content': content})
+    return selected
+
 def _build_context(others_results: List[Dict]) -> str:
     """Build context string from search results"""
     if not others_results:
@@ -73,7 +138,7 @@ def _build_context(others_results: List[Dict]) -> str:
     context_parts = []
     context_parts.append("=== Informasi Umum & Internal EXIM ===\n")
     
-    for idx, item in enumerate(others_results, 1):
+    for idx, item in enumerate(_select_context_chunks(others_results), 1):
         content = item.get('content', '').strip()
         filename = item.get('filename', 'Unknown')
         web_url = item.get('webUrl')
@@ -81,15 +146,10 @@ def _build_context(others_results: List[Dict]) -> str:
         # Consistent Link Logic (Parity with SOP Chatbot)
         # Always try to generate a download link if filename exists
         if filename and filename != 'Unknown':
-             import urllib.parse
              safe_filename = urllib.parse.quote(filename)
              # Overwrite/Set web_url to the internal download endpoint
              web_url = f"/download-link?filename={safe_filename}&chatbot_type=OTHERS"
         
-        # Truncate very long content (approx 2000 chars per chunk to fit context)
-        if len(content) > 2000:
-            content = content[:2000] + "..."
-            
         text = f"{idx}. Dokumen: {filename} (Score: {item.get('score', 0):.2f})\n"
         text += f"   Konten: {content}\n"
         
@@ -100,18 +160,8 @@ def _build_context(others_results: List[Dict]) -> str:
 
     return "\n".join(context_parts)
 
-def _generate_llm_response(user_query: str, context: str) -> str:
-    """Generate response using Gemini LLM"""
-    llm_model = os.getenv('LLM_MODEL', 'gemini-2.5-flash')
-    
-    # If context is empty, we act as a General Assistant but declare we don't have specific internal docs
-    if not context:
-        context_warning = "CATATAN SISTEM: Tidak ada dokumen internal Panarub yang ditemukan cocok dengan pertanyaan ini (skor relevansi rendah)."
-    else:
-        context_warning = ""
+_OTHERS_SYSTEM_PROMPT = """Anda adalah Asisten Virtual General & EXIM untuk PT Panarub Industry.
 
-    system_prompt = """Anda adalah Asisten Virtual General & EXIM untuk PT Panarub Industry.
-    
 Tugas Utama Anda:
 1. Menjawab pertanyaan pengguna HANYA dan MUTLAK berdasarkan informasi yang tersedia di "Konteks Dokumen".
 2. JANGAN menggunakan pengetahuan umum Anda. Jika informasi tidak ada di konteks, KATAKAN: "Maaf, saya tidak menemukan informasi tersebut dalam dokumen internal kami."
@@ -121,16 +171,57 @@ Tugas Utama Anda:
 Aturan Referensi (Link Wajib):
 - WAJIB menyertakan daftar dokumen sumber di BAGIAN PALING BAWAH jawaban.
 - Format yang HARUS dipatuhi untuk setiap referensi:
-  
+
   **Referensi:**
   - [Judul Dokumen](URL Link Dokumen)
-  
+
   (Ambil URL dari bagian "Link Dokumen" di dalam konteks. Jangan ubah link tersebut.)
 
 Aturan Kritis:
 - JIKA KONTEKS KOSONG atau TIDAK RELEVAN: JANGAN MENJAWAB pertanyaan. Cukup katakan: "Maaf, saya tidak memiliki dokumen referensi yang relevan untuk menjawab pertanyaan ini."
+
+Format Output (JSON):
+- "category": Jenis pertanyaan.
+  1. OTHERS: Terkait dokumen internal perusahaan, regulasi umum, atau informasi yang mungkin disimpan dalam database 'Lainnya' (Bahan sosialisasi, Notulensi rapat, dll).
+  2. GREETING: Sapaan sopan santun (Halo, Selamat pagi).
+  3. IRRELEVANT: Coding, Resep masakan, Pembahasan game, dan hal lain yang TIDAK ADA HUBUNGANNYA dengan pekerjaan kantor atau EXIM.
+- "is_context_relevant": true jika ada sedikit saja informasi di Konteks Dokumen yang MUNGKIN bisa menjawab pertanyaan; false hanya jika sama sekali tidak relevan atau konteks kosong.
+- "answer": Jawaban sesuai aturan di atas. Kosongkan jika category bukan OTHERS.
 """
 
+_OTHERS_CONTENTS_PREFIX = [
+    {"role": "user", "parts": [{"text": _OTHERS_SYSTEM_PROMPT}]},
+    {"role": "model", "parts": [{"text": "Dimengerti. Saya SANGAT PATUH pada konteks. Jika tidak ada di konteks, saya akan menolak menjawab."}]},
+]
+
+# Intent, relevancy and the answer come back together from one call
+_OTHERS_RESPONSE_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": {
+        "type": "OBJECT",
+        "properties": {
+            "category": {"type": "STRING", "enum": ["OTHERS", "GREETING", "IRRELEVANT"]},
+            "is_context_relevant": {"type": "BOOLEAN"},
+            "answer": {"type": "STRING"},
+        },
+        "required": ["category", "is_context_relevant", "answer"],
+    },
+}
+
+_NO_RELEVANT_DOCS_RESPONSE = "Maaf, saya tidak memiliki dokumen referensi yang relevan untuk menjawab pertanyaan ini."
+
+def _answer_others(user_query: str, context: str) -> dict:
+    """
+    Classify the question, judge the context and answer it in a single Gemini call.
+    Returns {"category", "is_context_relevant", "answer"}; on failure the answer
+    carries the error text and category stays OTHERS.
+    """
+    # If context is empty, we act as a General Assistant but declare we don't have specific internal docs
+    if not context:
+        context_warning = "CATATAN SISTEM: Tidak ada dokumen internal Panarub yang ditemukan cocok dengan pertanyaan ini (skor relevansi rendah)."
+    else:
+        context_warning = ""
+
     user_message = f"""{context_warning}
 
 Konteks Dokumen:
@@ -141,112 +232,26 @@ Pertanyaan Pengguna: {user_query}
 Ingat: HANYA jawab dari konteks. Jika konteks kosong, tolak menjawab."""
 
     try:
+        start_time = time.perf_counter()
         response = client.models.generate_content(
-            model=llm_model,
-            contents=[
-                {"role": "user", "parts": [{"text": system_prompt}]},
-                {"role": "model", "parts": [{"text": "Dimengerti. Saya SANGAT PATUH pada konteks. Jika tidak ada di konteks, saya akan menolak menjawab."}]},
-                {"role": "user", "parts": [{"text": user_message}]}
-            ]
-        )
-        
-        return response.text
-    except Exception as e:
-        logger.error(f"Error generating response: {str(e)}", exc_info=True)
-        return f"Error generating response: {str(e)}"
-
-        return response.text
-    except Exception as e:
-        logger.error(f"Error generating response: {str(e)}", exc_info=True)
-        return f"Error generating response: {str(e)}"
-
-def _check_relevancy(user_query: str, chunks: List[Dict[str, Any]]) -> bool:
-    """
-    Ask LLM if the provided chunks are relevant to the user query.
-    Returns True if relevant, False otherwise.
-    """
-    llm_model = os.getenv('LLM_MODEL', 'gemini-2.5-flash')
-    
-    # Prepare chunk summaries for validation
-    chunk_text = ""
-    for idx, c in enumerate(chunks, 1):
-        chunk_text += f"Chunk {idx}: {c.get('content', '')[:500]}...\n"
-
-    system_prompt = """Anda adalah validator relevansi dokumen.
-    Tugas: Jawab pertanyaan ini untuk setiap potongan dokumen:
-    "Apakah ada informasi di dalam potongan ini yang MUNGKIN bisa menjawab pertanyaan pengguna?"
-    
-    Kriteria:
-    - Jawab "YA" jika ada sedikit saja informasi yang berkaitan atau bisa membantu menjawab.
-    - Jawab "TIDAK" hanya jika sama sekali tidak relevan.
-    
-    Jawab HANYA dengan satu kata: "YA" atau "TIDAK".
-    """
-    
-    user_message = f"""Potongan Dokumen:
-{chunk_text}
-
-Pertanyaan Pengguna: {user_query}
-
-Apakah relevan? (YA/TIDAK)"""
-
-    try:
-        response = client.models.generate_content(
-            model=llm_model,
-            contents=[
-                {"role": "user", "parts": [{"text": system_prompt}]},
-                {"role": "user", "parts": [{"text": user_message}]}
-            ]
+            model=LLM_MODEL,
+            contents=_OTHERS_CONTENTS_PREFIX + [{"role": "user", "parts": [{"text": user_message}]}],
+            config=_OTHERS_RESPONSE_CONFIG
         )
-        answer = response.text.strip().upper()
-        logger.info(f"Relevancy Check for '{user_query}': {answer}")
-        return "YA" in answer
-    except Exception as e:
-        logger.error(f"Error checking relevancy: {e}")
-        # Default to True on error to avoid blocking potentially good answers if LLM acts up
-        return True 
-
-def _check_intent_others(user_input: str) -> dict:
-    """Check if query is related to General EXIM/Others"""
-    llm_model = os.getenv('LLM_MODEL', 'gemini-2.5-flash')
-    
-    prompt = f"""Analisis jenis pertanyaan berikut.
-
-Pertanyaan: "{user_input}"
-
-Kategori:
-1. OTHERS: Terkait dokumen internal perusahaan, regulasi umum, atau informasi yang mungkin disimpan dalam database 'Lainnya' (Bahan sosialisasi, Notulensi rapat, dll).
-2. GREETING: Sapaan sopan santun (Halo, Selamat pagi).
-3. IRRELEVANT: Coding, Resep masakan, Pembahasan game, dan hal lain yang TIDAK ADA HUBUNGANNYA dengan pekerjaan kantor atau EXIM.
+        duration = time.perf_counter() - start_time
 
-Berikan jawaban dalam format JSON:
-{{
-  "category": "OTHERS" atau "GREETING" atau "IRRELEVANT",
-  "reason": "..."
-}}
-Hanya output JSON."""
+        result = json.loads(response.text)
 
-    try:
-        start_time = datetime.now(ZoneInfo("Asia/Jakarta"))
-        response = client.models.generate_content(
-            model=llm_model, contents=[{"role": "user", "parts": [{"text": prompt}]}]
-        )
-        end_time = datetime.now(ZoneInfo("Asia/Jakarta"))
-        duration = (end_time - start_time).total_seconds()
-        
         # Log LLM analytics
-        llm_logger.info("OTHERS Intent Check", extra={
-            "query": user_input, "duration": duration, "model": llm_model
+        llm_logger.info("OTHERS LLM Call", extra={
+            "query": user_query, "duration": duration, "model": LLM_MODEL,
+            "category": result.get("category"), "is_context_relevant": result.get("is_context_relevant")
         })
-        
-        import json
-        result_text = response.text.strip()
-        if result_text.startswith("```"):
-            result_text = result_text.split("```")[1]
-            if result_text.startswith("json"): result_text = result_text[4:]
-        return json.loads(result_text.strip())
-    except:
-        return {"category": "OTHERS"}
+        return result
+    except Exception as e:
+        logger.error(f"Error generating response: {str(e)}", exc_info=True)
+        return {"category": "OTHERS", "is_context_relevant": True,
+                "answer": f"Error generating response: {str(e)}"}
 
 def _generate_greeting_response(user_input: str) -> str:
     return "Halo! Saya adalah Asisten Dokumen Lainnya. Saya dapat membantu mencari informasi dari bahan sosialisasi, notulensi rapat, dan dokumen internal lainnya."
@@ -262,48 +267,57 @@ def search_others(user_input: str, session_id: str = None) -> str:
         if not user_input or len(user_input.strip()) < 2:
             return "Mohon masukkan pertanyaan yang lebih jelas."
         
-        # Intent Check
-        intent_result = _check_intent_others(user_input)
-        category = intent_result.get("category", "OTHERS")
+        # Create embedding (exact repeats are served by the embedding cache)
+        query_vector = chatbot_utils.create_embedding(client, chatbot_utils.normalize_query(user_input))
+        
+        # Same or near-identical question answered recently: skip search and LLM
+        numbers = chatbot_utils.query_numbers(user_input)
+        cached_answer = _answer_cache.get(query_vector, numbers)
+        if cached_answer is not None:
+            logger.info(f"Others semantic cache hit for '{user_input}'")
+            return cached_answer
         
+        # One search without a threshold; results come back best-first, so the
+        # strict set (score >= 0.35) is a prefix of the same top 5
+        fallback_results = _search_others_collection(query_vector, user_input, limit=5, threshold=0.0)
+
+        # 1. Primary: Lowered Strict Threshold (0.35) to improve recall
+        results = [r for r in fallback_results if r['score'] >= STRICT_SCORE_THRESHOLD]
+
+        # 2. Fallback: If no results, send the Top 5 and let the model judge their relevancy
+        used_fallback = not results and bool(fallback_results)
+        if used_fallback:
+            logger.info("Strict search returned 0 results. Using Top 5 as fallback context...")
+            results = fallback_results
+        elif not results:
+            logger.info("Fallback: No documents found even with 0 threshold.")
+
+        logger.info(f"Others Search: Context has {len(results)} docs for '{user_input}'")
+
+        # Build Context
+        context = _build_context(results)
+
+        # Intent, relevancy and answer in one call
+        result = _answer_others(user_input, context)
+        category = result.get("category", "OTHERS")
+
         if category == "GREETING":
             return _generate_greeting_response(user_input)
         if category == "IRRELEVANT":
             return _generate_irrelevant_response()
 
-        # Create embedding
-        query_vector = chatbot_utils.create_embedding(client, user_input)
-        
-        # 1. Primary Search: Lowered Strict Threshold (0.35) to improve recall
-        results = _search_others_collection(query_vector, user_input, limit=5, threshold=0.35)
-        
-        # 2. Fallback: If no results, try Top 5 without strict threshold & Check Relevancy
-        if not results:
-            logger.info("Strict search returned 0 results. Attempting Fallback...")
-            fallback_results = _search_others_collection(query_vector, user_input, limit=5, threshold=0.0)
-            
-            if fallback_results:
-                is_relevant = _check_relevancy(user_input, fallback_results)
-                if is_relevant:
-                    logger.info("Fallback: Relevancy Check PASSED. Using fallback results.")
-                    results = fallback_results
-                else:
-                    logger.info("Fallback: Relevancy Check FAILED. Ignoring fallback results.")
-            else:
-                logger.info("Fallback: No documents found even with 0 threshold.")
-
-        logger.info(f"Others Search: Final Context has {len(results)} docs for '{user_input}'")
-        
-        # Build Context
-        context = _build_context(results)
-        
-        # Generate Answer
-        response = _generate_llm_response(user_input, context)
-        
+        # Low-score fallback documents are only used if the model found them relevant
+        if used_fallback and not result.get("is_context_relevant", True):
+            logger.info("Fallback: Relevancy Check FAILED. Ignoring fallback results.")
+            return _NO_RELEVANT_DOCS_RESPONSE
+
+        response = result.get("answer") or _NO_RELEVANT_DOCS_RESPONSE
+        if not response.startswith("Error"):
+            _answer_cache.put(query_vector, numbers, response)
+
         return response
 
     except Exception as e:
         logger.error(f"Error in search_others: {e}", exc_info=True)
-        import traceback
         traceback.print_exc()
         return f"❌ Error: {str(e)}\n\nSilakan coba lagi."
@@ -1,15 +1,129 @@
 """
 PPT/PPTX to PDF Converter - Linux Compatible
 
-Uses LibreOffice for conversion (works in Docker/Linux).
+Uses LibreOffice for conversion (works in Docker/Linux), through a persistent
+unoserver daemon when one is installed, otherwise one soffice process per file.
 Falls back to python-pptx for text extraction if LibreOffice is not available.
 """
 
 import os
+import atexit
+import socket
 import subprocess
 import tempfile
 import shutil
-from typing import Optional
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+# Executables are looked up on PATH once, at import
+_SOFFICE = shutil.which("soffice") or shutil.which("libreoffice")
+
+# Optional: unoserver keeps one LibreOffice instance running and converts through
+# it, which skips the seconds of soffice start-up paid by every --convert-to call.
+# Set UNOSERVER_HOST/PORT to use a daemon that is already running elsewhere.
+UNOSERVER_HOST = os.getenv("UNOSERVER_HOST", "127.0.0.1")
+UNOSERVER_PORT = int(os.getenv("UNOSERVER_PORT", "2003"))
+UNOSERVER_START_TIMEOUT = float(os.getenv("UNOSERVER_START_TIMEOUT", "30"))
+_UNOSERVER = shutil.which("unoserver")
+_UNOCONVERT = shutil.which("unoconvert")
+
+# Parallel conversions for convert_many; the work itself runs in soffice processes
+PPT_CONVERT_WORKERS = int(os.getenv("PPT_CONVERT_WORKERS", str(os.cpu_count() or 2)))
+
+_unoserver_proc: Optional[subprocess.Popen] = None
+_unoserver_lock = threading.Lock()
+
+
+def _unoserver_listening() -> bool:
+    try:
+        socket.create_connection((UNOSERVER_HOST, UNOSERVER_PORT), timeout=1).close()
+        return True
+    except OSError:
+        return False
+
+
+def _ensure_unoserver() -> bool:
+    """Start the unoserver daemon on first use; True if one is accepting conversions."""
+    global _unoserver_proc
+    if not _UNOCONVERT:
+        return False
+    
+    with _unoserver_lock:
+        if _unoserver_listening():
+            return True
+        if not _UNOSERVER:
+            return False
+        if _unoserver_proc is not None and _unoserver_proc.poll() is None:
+            # Ours, but not answering: restart it
+            _stop_unoserver()
+        
+        print(f"Starting unoserver on {UNOSERVER_HOST}:{UNOSERVER_PORT}...")
+        _unoserver_proc = subprocess.Popen(
+            [_UNOSERVER, "--interface", UNOSERVER_HOST, "--port", str(UNOSERVER_PORT)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        deadline = time.monotonic() + UNOSERVER_START_TIMEOUT
+        while time.monotonic() < deadline:
+            if _unoserver_proc.poll() is not None:
+                print("Warning: unoserver exited during start-up")
+                _unoserver_proc = None
+                return False
+            if _unoserver_listening():
+                return True
+            time.sleep(0.25)
+        
+        print("Warning: unoserver did not start in time")
+        _stop_unoserver()
+        return False
+
+
+def _stop_unoserver():
+    """Terminate the unoserver daemon started by this process, if any."""
+    global _unoserver_proc
+    if _unoserver_proc is not None and _unoserver_proc.poll() is None:
+        _unoserver_proc.terminate()
+        try:
+            _unoserver_proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            _unoserver_proc.kill()
+    _unoserver_proc = None
+
+
+atexit.register(_stop_unoserver)
+
+
+def _thread_profile_url() -> str:
+    """
+    LibreOffice profile for one-shot soffice runs from the current thread.
+    Concurrent soffice processes sharing a profile block each other, so each
+    thread gets its own, reused across its conversions.
+    """
+    profile_dir = os.path.join(tempfile.gettempdir(), f"lo_profile_{threading.get_ident()}")
+    return "file://" + profile_dir
+
+
+def _convert_with_unoserver(input_path: str, output_path: str) -> bool:
+    """Convert through the running unoserver daemon; False on any failure."""
+    cmd = [
+        _UNOCONVERT,
+        "--host", UNOSERVER_HOST,
+        "--port", str(UNOSERVER_PORT),
+        "--convert-to", "pdf",
+        input_path,
+        output_path
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
+    except subprocess.TimeoutExpired:
+        print(f"Error: unoconvert timed out for {input_path}")
+        return False
+    
+    if result.returncode == 0 and os.path.exists(output_path):
+        return True
+    print(f"unoconvert failed: {result.stderr}")
+    return False
 
 
 def convert_ppt_to_pdf(input_path: str, output_path: str) -> bool:
@@ -30,8 +144,13 @@ def convert_ppt_to_pdf(input_path: str, output_path: str) -> bool:
         print(f"Error: Input file not found: {input_path}")
         return False
     
-    # Method 1: Try LibreOffice (soffice) - works in Linux/Docker
-    if shutil.which("soffice") or shutil.which("libreoffice"):
+    # Method 1: Persistent LibreOffice via unoserver (if installed)
+    if _ensure_unoserver() and _convert_with_unoserver(input_path, output_path):
+        print(f"Successfully converted {input_path} to {output_path}")
+        return True
+    
+    # Method 2: One-shot LibreOffice (soffice) - works in Linux/Docker
+    if _SOFFICE:
         try:
             # LibreOffice outputs to the same directory as input, so we use a temp dir
             with tempfile.TemporaryDirectory() as temp_dir:
@@ -41,8 +160,9 @@ def convert_ppt_to_pdf(input_path: str, output_path: str) -> bool:
                 
                 # Convert using LibreOffice
                 cmd = [
-                    shutil.which("soffice") or shutil.which("libreoffice"),
+                    _SOFFICE,
                     "--headless",
+                    f"-env:UserInstallation={_thread_profile_url()}",
                     "--convert-to", "pdf",
                     "--outdir", temp_dir,
                     temp_input
@@ -67,7 +187,7 @@ def convert_ppt_to_pdf(input_path: str, output_path: str) -> bool:
         except Exception as e:
             print(f"Error during LibreOffice conversion: {e}")
     
-    # Method 2: Fallback - extract text using python-pptx (no actual PDF, just text)
+    # Method 3: Fallback - extract text using python-pptx (no actual PDF, just text)
     try:
         from pptx import Presentation
         from pptx.util import Inches, Pt
@@ -99,6 +219,23 @@ def convert_ppt_to_pdf(input_path: str, output_path: str) -> bool:
         return False
 
 
+def convert_many(inputs: List[Tuple[str, str]], max_workers: int = PPT_CONVERT_WORKERS) -> List[bool]:
+    """
+    Convert several PowerPoint files to PDF in parallel.
+    
+    Args:
+        inputs: (input_path, output_path) pairs
+        max_workers: Conversions running at once
+        
+    Returns:
+        List[bool]: convert_ppt_to_pdf result for each pair, in order
+    """
+    if not inputs:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(inputs))) as pool:
+        return list(pool.map(lambda pair: convert_ppt_to_pdf(*pair), inputs))
+
+
 def is_libreoffice_available() -> bool:
     """Check if LibreOffice is available for conversion."""
-    return bool(shutil.which("soffice") or shutil.which("libreoffice"))
+    return bool(_SOFFICE)
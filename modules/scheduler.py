@@ -7,18 +7,46 @@ Logs ingestion results to database for admin dashboard tracking.
 """
 
 import asyncio
+import json
 import logging
-from datetime import datetime, timedelta
-from typing import Optional
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
 from zoneinfo import ZoneInfo
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
+from dotenv import load_dotenv
 
-from modules.database import log_ingestion_run, get_db_connection
+from modules.database import log_ingestion_runs_bulk, maintenance as db_maintenance
+from modules.database import archive_old_sessions, CHAT_ARCHIVE_DAYS
 
 logger = logging.getLogger(__name__)
 
+load_dotenv()
+
+# Pipeline settings, read once at import
+MS_TENANT_ID = os.getenv('MS_TENANT_ID')
+MS_CLIENT_ID = os.getenv('MS_CLIENT_ID')
+MS_CLIENT_SECRET = os.getenv('MS_CLIENT_SECRET')
+ONEDRIVE_DRIVE_ID = os.getenv('ONEDRIVE_DRIVE_ID')
+SOP_QDRANT_URL = os.getenv('SOP_QDRANT_URL')
+SOP_QDRANT_API_KEY = os.getenv('SOP_QDRANT_API_KEY')
+INSW_QDRANT_URL = os.getenv('INSW_QDRANT_URL')
+INSW_QDRANT_API_KEY = os.getenv('INSW_QDRANT_API_KEY')
+GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL')
+LLM_MODEL = os.getenv('LLM_MODEL')
+VECTOR_SIZE = int(os.getenv('VECTOR_SIZE', '768'))
+BATCH_SIZE = int(os.getenv('BATCH_SIZE', '50'))
+
+SOP_FOLDER_PATH = os.getenv('SOP_FOLDER_PATH')
+INSW_FOLDER_PATH = os.getenv('INSW_FOLDER_PATH')
+CASES_FOLDER_PATH = os.getenv('CASES_FOLDER_PATH', 'AI/Cases')
+CASES_QDRANT_COLLECTION_NAME = os.getenv('CASES_QDRANT_COLLECTION_NAME', 'cases_qna')
+GENERAL_FOLDER_PATH = os.getenv('GENERAL_FOLDER_PATH', os.getenv('OTHERS_FOLDER_PATH', 'AI/Others'))
+GENERAL_QDRANT_COLLECTION_NAME = os.getenv('GENERAL_QDRANT_COLLECTION_NAME', os.getenv('OTHERS_QDRANT_COLLECTION_NAME', 'others_documents'))
+
 # Global scheduler instance
 scheduler: Optional[AsyncIOScheduler] = None
 
@@ -29,50 +57,44 @@ _cases_running = False
 _general_running = False
 
 
-def log_ingestion_to_db(pipeline_name: str, status: str, summary: dict):
-    """Log ingestion run to database for admin dashboard"""
+def _ingestion_log_row(pipeline_name: str, status: str, summary: dict) -> tuple:
+    """ingestion_logs row (database.SQL_INSERT_INGESTION_LOG column order) for one run summary"""
+    return (
+        pipeline_name,
+        status,
+        None,
+        datetime.now(ZoneInfo('Asia/Jakarta')).isoformat(),
+        summary.get('total_files', 0),
+        len(summary.get('upserted', [])),
+        len(summary.get('skipped', [])),
+        len(summary.get('errors', [])),
+        json.dumps(summary)
+    )
+
+
+def log_ingestion_batch(entries: List[Dict[str, Any]]) -> int:
+    """
+    Log several ingestion runs in one transaction.
+    entries: dicts with 'pipeline_name', 'status' and 'summary'.
+    Returns the number of rows written, or -1 on error.
+    """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Ensure table exists
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS ingestion_logs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                pipeline_name TEXT NOT NULL,
-                status TEXT NOT NULL,
-                started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                completed_at TIMESTAMP,
-                files_processed INTEGER DEFAULT 0,
-                files_upserted INTEGER DEFAULT 0,
-                files_skipped INTEGER DEFAULT 0,
-                errors INTEGER DEFAULT 0,
-                error_details TEXT,
-                summary TEXT
-            )
-        ''')
-        
-        import json
-        cursor.execute('''
-            INSERT INTO ingestion_logs 
-            (pipeline_name, status, completed_at, files_processed, files_upserted, files_skipped, errors, summary)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            pipeline_name,
-            status,
-            datetime.now(ZoneInfo('Asia/Jakarta')).isoformat(),
-            summary.get('total_files', 0),
-            len(summary.get('upserted', [])),
-            len(summary.get('skipped', [])),
-            len(summary.get('errors', [])),
-            json.dumps(summary)
-        ))
-        
-        conn.commit()
-        conn.close()
-        logger.info(f"Logged ingestion run for {pipeline_name}: {status}")
+        # ingestion_logs is created once by database.init_database(); rows go
+        # through the shared connection pool (WAL, synchronous=NORMAL) in one executemany
+        rows = [_ingestion_log_row(e['pipeline_name'], e['status'], e.get('summary') or {}) for e in entries]
+        written = log_ingestion_runs_bulk(rows)
+        if written > 0:
+            logger.info(f"Logged {written} ingestion run(s): "
+                        + ", ".join(f"{e['pipeline_name']}={e['status']}" for e in entries))
+        return written
     except Exception as e:
-        logger.error(f"Failed to log ingestion run: {e}")
+        logger.error(f"Failed to log ingestion runs: {e}")
+        return -1
+
+
+def log_ingestion_to_db(pipeline_name: str, status: str, summary: dict):
+    """Log ingestion run to database for admin dashboard"""
+    log_ingestion_batch([{'pipeline_name': pipeline_name, 'status': status, 'summary': summary}])
 
 
 async def run_sop_ingestion():
@@ -87,31 +109,25 @@ async def run_sop_ingestion():
     logger.info("Starting scheduled SOP ingestion...")
     
     try:
-        # Import here to avoid circular imports
-        import os
-        from dotenv import load_dotenv
-        from datetime import timezone
+        # Pipelines are imported here to avoid circular imports
         from ingestion.sop.sop_ingestion_pipeline import SOPIngestionPipeline
         
-        load_dotenv()
-        
         pipeline = SOPIngestionPipeline(
-            tenant_id=os.getenv('MS_TENANT_ID'),
-            client_id=os.getenv('MS_CLIENT_ID'),
-            client_secret=os.getenv('MS_CLIENT_SECRET'),
-            drive_id=os.getenv('ONEDRIVE_DRIVE_ID'),
-            folder_path=os.getenv('SOP_FOLDER_PATH'),
-            qdrant_url=os.getenv('SOP_QDRANT_URL'),
-            qdrant_api_key=os.getenv('SOP_QDRANT_API_KEY'),
-            embedding_model=os.getenv('EMBEDDING_MODEL'),
-            gemini_api_key=os.getenv('GEMINI_API_KEY'),
-            llm_model=os.getenv('LLM_MODEL'),
-            vector_size=int(os.getenv('VECTOR_SIZE', '768')),
+            tenant_id=MS_TENANT_ID,
+            client_id=MS_CLIENT_ID,
+            client_secret=MS_CLIENT_SECRET,
+            drive_id=ONEDRIVE_DRIVE_ID,
+            folder_path=SOP_FOLDER_PATH,
+            qdrant_url=SOP_QDRANT_URL,
+            qdrant_api_key=SOP_QDRANT_API_KEY,
+            embedding_model=EMBEDDING_MODEL,
+            gemini_api_key=GEMINI_API_KEY,
+            llm_model=LLM_MODEL,
+            vector_size=VECTOR_SIZE,
             skip_qdrant_init=False
         )
         
         # Sync from a recent time window (last 24 hours) for incremental updates
-        from datetime import timedelta
         last_sync = datetime.now(timezone.utc) - timedelta(hours=24)
         summary = await asyncio.to_thread(pipeline.sync_and_upsert, last_sync_date=last_sync, dry_run=False)
         
@@ -137,24 +153,19 @@ async def run_insw_ingestion():
     logger.info("Starting scheduled INSW ingestion...")
     
     try:
-        import os
-        from dotenv import load_dotenv
-        from datetime import timezone, timedelta
         from ingestion.ingestion_pipeline import IngestionPipeline
         
-        load_dotenv()
-        
         pipeline = IngestionPipeline(
-            tenant_id=os.getenv('MS_TENANT_ID'),
-            client_id=os.getenv('MS_CLIENT_ID'),
-            client_secret=os.getenv('MS_CLIENT_SECRET'),
-            drive_id=os.getenv('ONEDRIVE_DRIVE_ID'),
-            folder_path=os.getenv('INSW_FOLDER_PATH'),
-            qdrant_url=os.getenv('INSW_QDRANT_URL'),
-            qdrant_api_key=os.getenv('INSW_QDRANT_API_KEY'),
-            embedding_model=os.getenv('EMBEDDING_MODEL'),
-            gemini_api_key=os.getenv('GEMINI_API_KEY'),
-            vector_size=int(os.getenv('VECTOR_SIZE', '768')),
+            tenant_id=MS_TENANT_ID,
+            client_id=MS_CLIENT_ID,
+            client_secret=MS_CLIENT_SECRET,
+            drive_id=ONEDRIVE_DRIVE_ID,
+            folder_path=INSW_FOLDER_PATH,
+            qdrant_url=INSW_QDRANT_URL,
+            qdrant_api_key=INSW_QDRANT_API_KEY,
+            embedding_model=EMBEDDING_MODEL,
+            gemini_api_key=GEMINI_API_KEY,
+            vector_size=VECTOR_SIZE,
             skip_qdrant_init=False
         )
         
@@ -183,25 +194,21 @@ async def run_cases_ingestion():
     logger.info("Starting scheduled Cases ingestion...")
     
     try:
-        import os
-        from dotenv import load_dotenv
         from ingestion.cases.cases_ingestion_pipeline import CasesIngestionPipeline
         
-        load_dotenv()
-        
         pipeline = CasesIngestionPipeline(
-            tenant_id=os.getenv('MS_TENANT_ID'),
-            client_id=os.getenv('MS_CLIENT_ID'),
-            client_secret=os.getenv('MS_CLIENT_SECRET'),
-            user_id=os.getenv('ONEDRIVE_DRIVE_ID'),
-            folder_path=os.getenv('CASES_FOLDER_PATH', 'AI/Cases'),
-            qdrant_url=os.getenv('SOP_QDRANT_URL'),  # Use same Qdrant as SOP
-            qdrant_api_key=os.getenv('SOP_QDRANT_API_KEY'),
-            collection_name=os.getenv('CASES_QDRANT_COLLECTION_NAME', 'cases_qna'),
-            gemini_api_key=os.getenv('GEMINI_API_KEY'),
-            embedding_model=os.getenv('EMBEDDING_MODEL', 'models/text-embedding-004'),
-            vector_size=int(os.getenv('VECTOR_SIZE', '768')),
-            batch_size=int(os.getenv('BATCH_SIZE', '50'))
+            tenant_id=MS_TENANT_ID,
+            client_id=MS_CLIENT_ID,
+            client_secret=MS_CLIENT_SECRET,
+            user_id=ONEDRIVE_DRIVE_ID,
+            folder_path=CASES_FOLDER_PATH,
+            qdrant_url=SOP_QDRANT_URL,  # Use same Qdrant as SOP
+            qdrant_api_key=SOP_QDRANT_API_KEY,
+            collection_name=CASES_QDRANT_COLLECTION_NAME,
+            gemini_api_key=GEMINI_API_KEY,
+            embedding_model=EMBEDDING_MODEL or 'models/text-embedding-004',
+            vector_size=VECTOR_SIZE,
+            batch_size=BATCH_SIZE
         )
         
         summary = await asyncio.to_thread(pipeline.sync_and_upsert, dry_run=False)
@@ -228,35 +235,29 @@ async def run_general_ingestion():
     logger.info("Starting scheduled General ingestion...")
     
     try:
-        import os
-        from dotenv import load_dotenv
-        from datetime import timezone, timedelta
         from ingestion.others.others_ingestion_pipeline import OthersIngestionPipeline
         
-        load_dotenv()
-        
-        folder = os.getenv('GENERAL_FOLDER_PATH', os.getenv('OTHERS_FOLDER_PATH', 'AI/Others'))
-        collection = os.getenv('GENERAL_QDRANT_COLLECTION_NAME', os.getenv('OTHERS_QDRANT_COLLECTION_NAME', 'others_documents'))
-        
         pipeline = OthersIngestionPipeline(
-            tenant_id=os.getenv('MS_TENANT_ID'),
-            client_id=os.getenv('MS_CLIENT_ID'),
-            client_secret=os.getenv('MS_CLIENT_SECRET'),
-            drive_id=os.getenv('ONEDRIVE_DRIVE_ID'),
-            folder_path=folder,
-            qdrant_url=os.getenv('SOP_QDRANT_URL'),
-            qdrant_api_key=os.getenv('SOP_QDRANT_API_KEY'),
-            qdrant_collection_name=collection,
-            embedding_model=os.getenv('EMBEDDING_MODEL'),
-            gemini_api_key=os.getenv('GEMINI_API_KEY'),
-            vector_size=int(os.getenv('VECTOR_SIZE', '768')),
+            tenant_id=MS_TENANT_ID,
+            client_id=MS_CLIENT_ID,
+            client_secret=MS_CLIENT_SECRET,
+            drive_id=ONEDRIVE_DRIVE_ID,
+            folder_path=GENERAL_FOLDER_PATH,
+            qdrant_url=SOP_QDRANT_URL,
+            qdrant_api_key=SOP_QDRANT_API_KEY,
+            qdrant_collection_name=GENERAL_QDRANT_COLLECTION_NAME,
+            embedding_model=EMBEDDING_MODEL,
+            gemini_api_key=GEMINI_API_KEY,
+            vector_size=VECTOR_SIZE,
             skip_qdrant_init=False
         )
         
         if pipeline.qdrant_client:
-            pipeline._init_collection(int(os.getenv('VECTOR_SIZE', '768')))
+            pipeline._init_collection(VECTOR_SIZE)
         
         last_sync = datetime.now(timezone.utc) - timedelta(hours=24)
+        # sync_and_upsert runs the async pipeline on its own event loop in a worker
+        # thread, so its file and SQLite work never blocks the API's loop
         summary = await asyncio.to_thread(pipeline.sync_and_upsert, last_sync_date=last_sync, dry_run=False)
         
         log_ingestion_to_db('General', 'success', summary)
@@ -281,44 +282,46 @@ def start_scheduler():
     
     now = datetime.now(ZoneInfo('Asia/Jakarta'))
     
-    # Schedule all pipelines to run every 30 minutes
-    # All run immediately on startup, staggered by 2 minutes to prevent overload
-    
-    scheduler.add_job(
-        run_sop_ingestion,
-        trigger=IntervalTrigger(minutes=30),
-        id='sop_ingestion',
-        name='SOP Ingestion Pipeline',
-        replace_existing=True,
-        next_run_time=now  # Run immediately
-    )
-    
-    scheduler.add_job(
-        run_insw_ingestion,
-        trigger=IntervalTrigger(minutes=30),
-        id='insw_ingestion', 
-        name='INSW Ingestion Pipeline',
-        replace_existing=True,
-        next_run_time=now + timedelta(minutes=2)  # 2 min after SOP
-    )
+    # Schedule all pipelines to run every 30 minutes, all starting immediately.
+    # They are mostly network-bound (OneDrive / Qdrant), so running them side by
+    # side instead of staggering them finishes the first sync ~6 minutes sooner.
+    # One job per pipeline, so a slow pipeline never makes the others skip a run.
+    ingestion_jobs = [
+        (run_sop_ingestion, 'sop_ingestion', 'SOP Ingestion Pipeline'),
+        (run_insw_ingestion, 'insw_ingestion', 'INSW Ingestion Pipeline'),
+        (run_cases_ingestion, 'cases_ingestion', 'Cases Ingestion Pipeline'),
+        (run_general_ingestion, 'general_ingestion', 'General Ingestion Pipeline'),
+    ]
+    for func, job_id, job_name in ingestion_jobs:
+        scheduler.add_job(
+            func,
+            trigger=IntervalTrigger(minutes=30),
+            id=job_id,
+            name=job_name,
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+            next_run_time=now  # Run immediately
+        )
     
+    # SQLite WAL checkpoint + PRAGMA optimize; sync job runs in the executor thread pool
     scheduler.add_job(
-        run_cases_ingestion,
-        trigger=IntervalTrigger(minutes=30),
-        id='cases_ingestion',
-        name='Cases Ingestion Pipeline',
+        db_maintenance,
+        trigger=IntervalTrigger(minutes=15),
+        id='db_maintenance',
+        name='Database Maintenance',
         replace_existing=True,
-        next_run_time=now + timedelta(minutes=4)  # 4 min after SOP
     )
     
-    scheduler.add_job(
-        run_general_ingestion,
-        trigger=IntervalTrigger(minutes=30),
-        id='general_ingestion',
-        name='General Ingestion Pipeline',
-        replace_existing=True,
-        next_run_time=now + timedelta(minutes=6)  # 6 min after SOP
-    )
+    # Opt-in: move idle sessions to the archive DB once a day
+    if CHAT_ARCHIVE_DAYS > 0:
+        scheduler.add_job(
+            archive_old_sessions,
+            trigger=IntervalTrigger(hours=24),
+            id='chat_archive',
+            name='Chat Session Archive',
+            replace_existing=True,
+        )
     
     scheduler.start()
     logger.info("Ingestion scheduler started - running every 30 minutes")
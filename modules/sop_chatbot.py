@@ -2,6 +2,7 @@ from modules import database, chatbot_utils, app_logger
 from datetime import datetime
 from zoneinfo import ZoneInfo
 import os
+import asyncio
 from typing import List, Dict, Any
 from dotenv import load_dotenv
 from qdrant_client import QdrantClient
@@ -10,6 +11,16 @@ from functools import lru_cache
 
 load_dotenv()
 
+# Configuration resolved once at import
+LLM_MODEL = os.getenv('LLM_MODEL', 'gemini-2.5-flash')
+SOP_QDRANT_URL = os.getenv('SOP_QDRANT_URL')
+SOP_QDRANT_API_KEY = os.getenv('SOP_QDRANT_API_KEY')
+SOP_COLLECTION_NAME = os.getenv('SOP_QDRANT_COLLECTION_NAME', 'sop_documents')
+OTHERS_COLLECTION_NAME = os.getenv('OTHERS_QDRANT_COLLECTION_NAME', 'others_documents')
+CASES_COLLECTION_NAME = os.getenv('CASES_QDRANT_COLLECTION_NAME', 'cases_qna')
+SOP_MAX_RETRIES = int(os.getenv('SOP_MAX_RETRIES', '1'))
+_JAKARTA_TZ = ZoneInfo("Asia/Jakarta")
+
 # Initialize Gemini Client
 client = chatbot_utils.init_gemini_client()
 
@@ -20,13 +31,11 @@ llm_logger = app_logger.setup_llm_logger()
 # Developer dashboard logger (stores to database)
 from modules.llm_logger import llm_logger as dashboard_logger, LLMCallTimer
 def get_qdrant_client():
-    url = os.getenv('SOP_QDRANT_URL')
-    api_key = os.getenv('SOP_QDRANT_API_KEY')
-    return QdrantClient(url=url, api_key=api_key)
+    return QdrantClient(url=SOP_QDRANT_URL, api_key=SOP_QDRANT_API_KEY)
 
 def _search_sop_collection(query_vector: List[float], query_text: str, limit: int = 3, session_id: str = None) -> List[Dict[str, Any]]:
     """Search SOP documents collection with hybrid search"""
-    collection_name = os.getenv('SOP_QDRANT_COLLECTION_NAME', 'sop_documents')
+    collection_name = SOP_COLLECTION_NAME
     
     qdrant_client = get_qdrant_client()
     sparse_vector = chatbot_utils.create_sparse_vector(query_text)
@@ -74,7 +83,7 @@ def _search_sop_collection(query_vector: List[float], query_text: str, limit: in
 
 def _search_others_collection(query_vector: List[float], query_text: str, limit: int = 3) -> List[Dict[str, Any]]:
     """Search Others (unstructured) documents collection"""
-    collection_name = os.getenv('OTHERS_QDRANT_COLLECTION_NAME', 'others_documents')
+    collection_name = OTHERS_COLLECTION_NAME
     
     qdrant_client = get_qdrant_client()
     
@@ -103,7 +112,7 @@ def _search_others_collection(query_vector: List[float], query_text: str, limit:
 
 def _search_cases_collection(query_vector: List[float], query_text: str, limit: int = 2) -> List[Dict[str, Any]]:
     """Search cases Q&A collection with hybrid search"""
-    collection_name = os.getenv('CASES_QDRANT_COLLECTION_NAME', 'cases_qna')
+    collection_name = CASES_COLLECTION_NAME
     
     qdrant_client = get_qdrant_client()
     sparse_vector = chatbot_utils.create_sparse_vector(query_text)
@@ -204,7 +213,7 @@ def _build_context(sop_results: List[Dict], case_results: List[Dict], others_res
 
 def _generate_llm_response(user_query: str, context: str) -> str:
     """Generate response using Gemini LLM"""
-    llm_model = os.getenv('LLM_MODEL', 'gemini-2.5-flash')
+    llm_model = LLM_MODEL
     
     system_prompt = """Anda adalah Asisten SOP EXIM untuk operasi ekspor-impor.
 
@@ -252,7 +261,7 @@ Pertanyaan Pengguna: {user_query}
 Berikan jawaban yang komprehensif berdasarkan konteks di atas."""
 
     try:
-        start_time = datetime.now(ZoneInfo("Asia/Jakarta"))
+        start_time = datetime.now(_JAKARTA_TZ)
         response = client.models.generate_content(
             model=llm_model,
             contents=[
@@ -261,7 +270,7 @@ Berikan jawaban yang komprehensif berdasarkan konteks di atas."""
                 {"role": "user", "parts": [{"text": user_message}]}
             ]
         )
-        end_time = datetime.now(ZoneInfo("Asia/Jakarta"))
+        end_time = datetime.now(_JAKARTA_TZ)
         duration = (end_time - start_time).total_seconds()
         
         # Log LLM analytics
@@ -283,7 +292,7 @@ def _judge_document_relevance(user_input: str, context: str) -> dict:
     Judge if retrieved documents are relevant to answer the user query.
     Returns: {"is_relevant": bool, "reason": str}
     """
-    llm_model = os.getenv('LLM_MODEL', 'gemini-2.5-flash')
+    llm_model = LLM_MODEL
 
     prompt = f"""Evaluasi apakah dokumen yang ditemukan relevan untuk menjawab pertanyaan pengguna.
 
@@ -306,12 +315,12 @@ Berikan jawaban dalam format JSON:
 Hanya output JSON, tanpa teks tambahan."""
 
     try:
-        start_time = datetime.now(ZoneInfo("Asia/Jakarta"))
+        start_time = datetime.now(_JAKARTA_TZ)
         response = client.models.generate_content(
             model=llm_model,
             contents=[{"role": "user", "parts": [{"text": prompt}]}]
         )
-        end_time = datetime.now(ZoneInfo("Asia/Jakarta"))
+        end_time = datetime.now(_JAKARTA_TZ)
         duration = (end_time - start_time).total_seconds()
 
         # Log LLM analytics
@@ -345,7 +354,7 @@ def _filter_relevant_cases(user_input: str, cases: List[Dict]) -> List[Dict]:
     if not cases:
         return []
 
-    llm_model = os.getenv('LLM_MODEL', 'gemini-2.5-flash')
+    llm_model = LLM_MODEL
 
     # Prepare cases for prompt
     cases_text = ""
@@ -369,12 +378,12 @@ Output JSON list berisi ID kasus yang relevan. Contoh: ["10", "12"]. Jika tidak
 Hanya output JSON."""
 
     try:
-        start_time = datetime.now(ZoneInfo("Asia/Jakarta"))
+        start_time = datetime.now(_JAKARTA_TZ)
         response = client.models.generate_content(
             model=llm_model,
             contents=[{"role": "user", "parts": [{"text": prompt}]}]
         )
-        end_time = datetime.now(ZoneInfo("Asia/Jakarta"))
+        end_time = datetime.now(_JAKARTA_TZ)
         duration = (end_time - start_time).total_seconds()
 
         # Log LLM analytics
@@ -412,7 +421,7 @@ def _check_intent(user_input: str) -> dict:
     Expanded to separate SOP vs GREETING vs IRRELEVANT.
     Returns: {"category": "SOP" | "GREETING" | "IRRELEVANT", "reason": str}
     """
-    llm_model = os.getenv('LLM_MODEL', 'gemini-2.5-flash')
+    llm_model = LLM_MODEL
     
     prompt = f"""Analisis jenis pertanyaan berikut.
 
@@ -432,12 +441,12 @@ Berikan jawaban dalam format JSON:
 Hanya output JSON, tanpa teks tambahan."""
 
     try:
-        start_time = datetime.now(ZoneInfo("Asia/Jakarta"))
+        start_time = datetime.now(_JAKARTA_TZ)
         response = client.models.generate_content(
             model=llm_model,
             contents=[{"role": "user", "parts": [{"text": prompt}]}]
         )
-        end_time = datetime.now(ZoneInfo("Asia/Jakarta"))
+        end_time = datetime.now(_JAKARTA_TZ)
         duration = (end_time - start_time).total_seconds()
         
         # Log LLM analytics
@@ -465,7 +474,7 @@ Hanya output JSON, tanpa teks tambahan."""
 
 def _generate_greeting_response(user_input: str) -> str:
     """Generate friendly response for greetings"""
-    llm_model = os.getenv('LLM_MODEL', 'gemini-2.5-flash')
+    llm_model = LLM_MODEL
     system_prompt = "Anda adalah Asisten SOP EXIM. Jawab sapaan pengguna dengan sopan, singkat, dan profesional. Tawarkan bantuan terkait SOP Ekspor Impor."
     try:
         response = client.models.generate_content(model=llm_model, contents=[{"role": "user", "parts": [{"text": system_prompt}, {"text": user_input}]}])
@@ -476,6 +485,13 @@ def _generate_greeting_response(user_input: str) -> str:
 def _generate_irrelevant_response() -> str:
     return "Maaf, saya hanya dapat menjawab pertanyaan terkait SOP, Regulasi, dan Prosedur Ekspor Impor internal perusahaan. Silakan tanyakan hal yang relevan."
 
+async def _intent_and_embedding(user_input: str):
+    """Run the intent check and the query embedding concurrently (independent network calls)"""
+    return await asyncio.gather(
+        asyncio.to_thread(_check_intent, user_input),
+        chatbot_utils.create_embedding_async(client, user_input),
+    )
+
 def search_sop_exim(user_input: str, session_id: str = None) -> str:
     """
     Main function for SOP Chatbot with HYBRID pipeline.
@@ -486,8 +502,8 @@ def search_sop_exim(user_input: str, session_id: str = None) -> str:
         if not user_input or len(user_input.strip()) < 2:
             return "Mohon masukkan kata kunci yang lebih spesifik."
         
-        # Step 2: Intent classification (LOCAL)
-        intent_result = _check_intent(user_input)
+        # Step 2: Intent classification (LOCAL), overlapped with the query embedding
+        intent_result, query_vector = asyncio.run(_intent_and_embedding(user_input))
         category = intent_result.get("category", "SOP")
         logger.info(f"SOP Intent Check: {category} for query '{user_input}'")
         
@@ -501,12 +517,13 @@ def search_sop_exim(user_input: str, session_id: str = None) -> str:
 
         # --- BRANCH: SOP INPUT ---
         # Implementation of REMOTE Logic (Retry Loop + Relevance Check)
-        max_retries = int(os.getenv('SOP_MAX_RETRIES', '1'))
+        max_retries = SOP_MAX_RETRIES
         retry_count = 0
 
         while retry_count <= max_retries:
-            # Create embedding
-            query_vector = chatbot_utils.create_embedding(client, user_input)
+            # Create embedding (the first attempt reuses the one made alongside the intent check)
+            if retry_count > 0:
+                query_vector = chatbot_utils.create_embedding(client, user_input)
             
             # Search collections (Hybrid: SOP + Cases + Others)
             sop_results = _search_sop_collection(query_vector, user_input, limit=3, session_id=session_id)
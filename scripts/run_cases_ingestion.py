@@ -11,11 +11,14 @@ from datetime import datetime
 from dotenv import load_dotenv
 
 from ingestion.cases.cases_ingestion_pipeline import CasesIngestionPipeline
+from modules import database
 
 
 def main():
     # Load environment variables
     load_dotenv()
+    # OCR results are cached in the app database
+    database.init_database()
     
     # Configuration
     config = {
@@ -6,8 +6,11 @@ from dotenv import load_dotenv
 from datetime import datetime, timezone
 from zoneinfo import ZoneInfo
 import json
+from modules import database
 
 load_dotenv()
+# OCR results are cached in the app database
+database.init_database()
 
 print("="*80)
 print("OTHERS INGESTION PIPELINE")
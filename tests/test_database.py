@@ -0,0 +1,247 @@
+import importlib.util
+import os
+import threading
+
+import pytest
+
+# Load the real module under a private name: test_chatbots replaces
+# sys.modules['modules.database'] with a MagicMock at import time.
+_DB_MODULE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "modules", "database.py")
+_spec = importlib.util.spec_from_file_location("_database_under_test", _DB_MODULE_PATH)
+database = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(database)
+
+
+@pytest.fixture(autouse=True)
+def temp_db(tmp_path, monkeypatch):
+    """Point the module at a fresh database file for every test"""
+    database.close_pool()
+    database.clear_caches()
+    monkeypatch.setattr(database, "SQLITE_DB_PATH", str(tmp_path / "chat_history.db"))
+    database.init_database()
+    yield
+    database.close_pool()
+
+
+def test_pooled_connection_uses_wal():
+    with database.conn_ctx() as conn:
+        mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        mmap_size = conn.execute("PRAGMA mmap_size").fetchone()[0]
+    assert mode == "wal"
+    assert mmap_size == 268435456
+
+
+def test_connections_are_reused():
+    with database.conn_ctx() as first:
+        pass
+    with database.conn_ctx() as second:
+        pass
+    assert first is second
+
+
+def test_failed_write_is_rolled_back():
+    with pytest.raises(RuntimeError):
+        with database.conn_ctx(write=True) as conn:
+            conn.execute("INSERT INTO users (username, password_hash) VALUES ('ghost', 'x')")
+            raise RuntimeError("boom")
+    assert database.get_user_by_username("ghost") is None
+
+
+def test_user_round_trip():
+    assert database.add_user("alice", "hash", "admin")
+    assert not database.add_user("alice", "hash")
+    user = database.get_user_by_username("alice")
+    assert user["role"] == "admin"
+    assert [u["username"] for u in database.get_all_users()] == ["alice"]
+
+
+def test_session_and_messages():
+    session_id = database.create_session("alice", "SOP")
+    database.save_message("alice", "SOP", "user", "hello", session_id)
+    database.save_message("alice", "SOP", "assistant", "hi there", session_id)
+
+    history = database.load_chat_history("alice", "SOP", session_id)
+    assert [m["content"] for m in history] == ["hello", "hi there"]
+
+    sessions = database.get_chat_sessions("alice", "SOP")
+    assert sessions[0]["session_id"] == session_id
+    assert sessions[0]["message_count"] == 2
+
+
+def test_concurrent_writes():
+    session_id = database.create_session("alice", "SOP")
+
+    def worker(n):
+        for i in range(20):
+            database.save_message("alice", "SOP", "user", f"{n}-{i}", session_id)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(database.load_chat_history("alice", "SOP", session_id)) == 80
+
+
+def test_save_messages_bulk():
+    session_id = database.create_session("alice", "OTHERS")
+    assert database.save_messages_bulk("alice", "OTHERS", session_id, [
+        ("user", "question"),
+        ("assistant", "answer", "2024-01-01T00:00:00"),
+    ])
+
+    history = database.load_chat_history("alice", "OTHERS", session_id)
+    assert [(m["role"], m["content"]) for m in history] == [("user", "question"), ("assistant", "answer")]
+    assert database.get_session_by_id(session_id)["last_activity"] == "2024-01-01T00:00:00"
+
+
+def test_history_query_uses_session_index():
+    with database.conn_ctx() as conn:
+        plan = conn.execute("EXPLAIN QUERY PLAN " + database.SQL_SELECT_MESSAGES, ("x",)).fetchall()
+    assert any("idx_messages_session" in row[-1] for row in plan)
+
+
+def test_message_count_backfilled_on_upgrade(tmp_path, monkeypatch):
+    import sqlite3
+    legacy = tmp_path / "legacy.db"
+    conn = sqlite3.connect(legacy)
+    conn.execute("""CREATE TABLE sessions (session_id TEXT PRIMARY KEY, username TEXT NOT NULL,
+                    chatbot_type TEXT NOT NULL, title TEXT, created_at TIMESTAMP, last_activity TIMESTAMP,
+                    status TEXT DEFAULT 'idle')""")
+    conn.execute("""CREATE TABLE messages (id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL,
+                    role TEXT NOT NULL, content TEXT NOT NULL, timestamp TIMESTAMP)""")
+    conn.execute("INSERT INTO sessions (session_id, username, chatbot_type) VALUES ('s1', 'bob', 'SOP')")
+    conn.executemany("INSERT INTO messages (session_id, role, content) VALUES ('s1', ?, ?)",
+                     [("user", "a"), ("assistant", "b"), ("user", "c")])
+    conn.commit()
+    conn.close()
+
+    database.close_pool()
+    database.clear_caches()
+    monkeypatch.setattr(database, "SQLITE_DB_PATH", str(legacy))
+    database.init_database()
+
+    assert database.get_chat_sessions("bob", "SOP")[0]["message_count"] == 3
+    database.clear_chat_history("bob", "SOP", "s1")
+    assert database.get_chat_sessions("bob", "SOP")[0]["message_count"] == 0
+
+
+def test_log_ingestion_runs_bulk():
+    rows = [("SOP", "success", None, None, 3, 2, 1, 0, "{}"),
+            ("INSW", "failed", None, None, 0, 0, 0, 1, "{}")]
+    assert database.log_ingestion_runs_bulk(rows) == 2
+    with database.conn_ctx() as conn:
+        names = [r[0] for r in conn.execute("SELECT pipeline_name FROM ingestion_logs ORDER BY id")]
+    assert names == ["SOP", "INSW"]
+
+
+def test_migrations_skipped_when_schema_current(monkeypatch):
+    with database.conn_ctx() as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == database.SCHEMA_VERSION
+
+    calls = []
+    monkeypatch.setattr(database, "_migrate_schema", lambda c: calls.append(c))
+    database.init_database()
+    assert calls == []
+
+
+def test_approve_pending_user():
+    assert database.add_pending_user("carol", "carol@example.com", "hash")
+    assert not database.add_pending_user("carol", "carol@example.com", "hash")
+    pending_id = database.get_pending_users()[0]["id"]
+
+    assert database.approve_pending_user(pending_id)
+    assert database.get_user_by_username("carol")["requested_at"] is not None
+    assert database.get_pending_users() == []
+    assert not database.approve_pending_user(12345)
+
+
+def test_save_message_recreates_missing_session():
+    database.save_message("dave", "INSW", "user", "hs code 0101", "orphan-session")
+    database.save_message("dave", "INSW", "assistant", "answer", "orphan-session")
+    session = database.get_session_by_id("orphan-session")
+    assert session["title"] == "New Chat"
+    assert session["message_count"] == 2
+
+
+def test_cached_lookups_are_invalidated_by_writes():
+    database.add_user("erin", "old-hash")
+    user = database.get_user_by_username("erin")
+    user["role"] = "tampered"
+    assert database.get_user_by_username("erin")["role"] == "user"
+
+    database.update_user_password("erin", "new-hash")
+    assert database.get_user_by_username("erin")["password_hash"] == "new-hash"
+
+    session_id = database.create_session("erin", "SOP")
+    assert database.get_session_by_id(session_id)["title"] == "New Chat"
+    database.update_session_title(session_id, "Renamed")
+    assert database.get_session_by_id(session_id)["title"] == "Renamed"
+    database.save_message("erin", "SOP", "user", "hi", session_id)
+    assert database.get_session_by_id(session_id)["message_count"] == 1
+
+
+def test_session_ids_are_time_ordered():
+    ids = [database.create_session("frank", "SOP") for _ in range(5)]
+    assert all(len(i) == 36 and i[14] == "7" for i in ids)
+    assert [i[:13] for i in ids] == sorted(i[:13] for i in ids)
+
+
+def test_maintenance_truncates_wal():
+    database.save_message("gina", "SOP", "user", "hello", "maint-session")
+    assert database.maintenance()
+    assert os.path.getsize(database.SQLITE_DB_PATH + "-wal") == 0
+
+
+def test_session_updates_leave_other_fields_alone():
+    session_id = database.create_session("hank", "INSW", title="Tariffs")
+    database.set_session_status(session_id, "processing")
+    session = database.get_session_by_id(session_id)
+    assert (session["title"], session["status"]) == ("Tariffs", "processing")
+
+
+def test_reads_run_outside_transactions():
+    with database.conn_ctx() as conn:
+        conn.execute(database.SQL_SELECT_USER, ("nobody",)).fetchall()
+        assert not conn.in_transaction
+    with database.conn_ctx(write=True) as conn:
+        assert conn.in_transaction
+
+
+def test_archive_and_restore_session():
+    session_id = database.create_session("ivy", "SOP")
+    database.save_message("ivy", "SOP", "user", "old question", session_id, timestamp="2020-01-01T10:00:00")
+    fresh_id = database.create_session("ivy", "SOP")
+
+    assert database.archive_old_sessions(days=90) == 1
+    assert [s["session_id"] for s in database.get_chat_sessions("ivy", "SOP")] == [fresh_id]
+
+    # Unknown IDs are answered from a read-only look at the archive
+    assert database.get_session_by_id("no-such-session") is None
+
+    # Opening the archived session brings it and its messages back
+    assert database.get_session_by_id(session_id)["message_count"] == 1
+    assert [m["content"] for m in database.load_chat_history("ivy", "SOP", session_id)] == ["old question"]
+    assert len(database.get_chat_sessions("ivy", "SOP")) == 2
+
+
+def test_long_messages_are_stored_compressed():
+    session_id = database.create_session("jack", "INSW")
+    long_answer = "HS 0101.21.00 - Kuda bibit murni. " * 100
+    database.save_message("jack", "INSW", "assistant", long_answer, session_id)
+    database.save_message("jack", "INSW", "user", "short", session_id)
+
+    with database.conn_ctx() as conn:
+        stored = [r[0] for r in conn.execute("SELECT content FROM messages ORDER BY id")]
+    assert isinstance(stored[0], bytes) and len(stored[0]) < len(long_answer)
+    assert stored[1] == "short"
+    history = database.load_chat_history("jack", "INSW", session_id)
+    assert [m["content"] for m in history] == [long_answer, "short"]
+
+
+def test_ocr_cache_round_trip():
+    assert database.get_cached_ocr("abc", "gemini-2.5-flash") is None
+    assert database.cache_ocr_result("abc", "gemini-2.5-flash", "page text")
+    assert database.get_cached_ocr("abc", "gemini-2.5-flash") == "page text"
+    assert database.get_cached_ocr("abc", "other-model") is None
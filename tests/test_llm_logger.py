@@ -0,0 +1,81 @@
+import importlib.util
+import os
+
+import pytest
+
+# Load the real modules under private names: test_chatbots replaces
+# sys.modules['modules.database'] with a MagicMock at import time.
+_MODULES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "modules")
+
+
+def _load(name, filename):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(_MODULES_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+database = _load("_llm_logger_database", "database.py")
+llm_logger_module = _load("_llm_logger_under_test", "llm_logger.py")
+llm_logger_module.database = database
+llm_logger = llm_logger_module.llm_logger
+
+
+@pytest.fixture(autouse=True)
+def temp_db(tmp_path, monkeypatch):
+    """Point the logger at a fresh database file for every test"""
+    database.close_pool()
+    monkeypatch.setattr(database, "SQLITE_DB_PATH", str(tmp_path / "chat_history.db"))
+    database.init_database()
+    yield
+    llm_logger.flush()
+    database.close_pool()
+
+
+def test_successful_calls_are_buffered_until_flush():
+    for i in range(3):
+        assert llm_logger.log_call("s1", "alice", "SOP", "answered", 10, 20, 100, query=f"q{i}")
+    llm_logger.flush()
+
+    logs = llm_logger.get_logs()
+    assert sorted(log["query"] for log in logs) == ["q0", "q1", "q2"]
+    assert llm_logger.get_stats()["total"] == 3
+
+
+def test_errors_are_written_immediately():
+    llm_logger.log_call("s1", "alice", "INSW", "error", error_message="boom")
+    logs = llm_logger.get_logs(status_filter="error")
+    assert [log["error_message"] for log in logs] == ["boom"]
+
+
+def test_stats_come_from_daily_rollup():
+    llm_logger.log_call("s1", "alice", "SOP", "answered", 10, 20, 100)
+    llm_logger.log_call("s1", "alice", "SOP", "answered", 5, 5, 300)
+    llm_logger.log_call("s2", "bob", "INSW", "error", latency_ms=50)
+    llm_logger.flush()
+
+    with database.conn_ctx() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM llm_logs_daily").fetchone()[0] == 2
+    stats = llm_logger.get_stats()
+    assert (stats["total"], stats["answered"], stats["errors"]) == (3, 2, 1)
+    assert stats["total_input_tokens"] == 15
+    assert stats["avg_latency_ms"] == 150
+    assert [d["calls"] for d in stats["daily_stats"]] == [3]
+
+
+def test_keyset_pagination():
+    for i in range(5):
+        llm_logger.log_call("s1", "alice", "SOP", "answered", query=f"q{i}")
+    llm_logger.flush()
+
+    first = llm_logger.get_logs(limit=2)
+    second = llm_logger.get_logs(limit=2, before_id=first[-1]["id"])
+    rest = llm_logger.get_logs(limit=2, before_id=second[-1]["id"])
+    assert [log["query"] for log in first + second + rest] == ["q4", "q3", "q2", "q1", "q0"]
+
+
+def test_logged_text_is_capped_in_bytes():
+    assert llm_logger_module._trunc("short") == "short"
+    capped = llm_logger_module._trunc("é" * 400)
+    assert len(capped.encode("utf-8")) <= llm_logger_module.LOG_TEXT_MAX_BYTES
+    assert capped == "é" * 250